@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import datetime
+import threading
+import contextlib
+
+METRICS_ENVIRONMENT_VARIABLE = 'CUSTOMEOS_METRICS_FILE'
+
+
+class StageMetrics:
+    """Running counts and timings of one stage of a campaign
+
+    Attributes:
+        name (string): Name of the stage
+        n_active (int): Samples currently inside this stage
+        n_completed (int): Samples this stage finished
+        n_failed (int): Samples this stage raised an exception on
+        busy_time (float): Seconds spent inside this stage, summed over all workers
+        start_time (float): time.monotonic() when the first sample entered this stage
+
+    """
+    def __init__(self, name) -> None:
+        self.name = name
+        self.n_active = 0
+        self.n_completed = 0
+        self.n_failed = 0
+        self.busy_time = 0.0
+        self.start_time = None
+
+    def snapshot(self, now):
+        """Counts, throughput and mean duration of this stage as a dictionary"""
+        elapsed = 0.0 if self.start_time is None else now - self.start_time
+        n_finished = self.n_completed + self.n_failed
+        return {
+            'active': self.n_active,
+            'completed': self.n_completed,
+            'failed': self.n_failed,
+            'busy_time_s': self.busy_time,
+            'throughput_per_s': self.n_completed / elapsed if elapsed > 0 else 0.0,
+            'mean_duration_s': self.busy_time / n_finished if n_finished else None,
+        }
+
+
+class CampaignMetrics:
+    """Live progress of a sampling campaign, periodically written to a local file
+
+    Note:
+        The file is rewritten every flush_interval seconds by a background thread, and once more on stop.
+        Each write goes to a temporary file that then replaces the metrics file, so a reader never sees a partial
+        file. A filename ending in .prom is written in the Prometheus text exposition format, so it can be served by
+        the node_exporter textfile collector. Any other filename is written as JSON.
+
+    Attributes:
+        filename (string): Metrics file
+        n_total (int): Number of samples in the campaign, used for the ETA, or None if unknown
+        flush_interval (float): Seconds between writes of the metrics file
+        format (string): One of json or prometheus
+        queue_depths (callable): Returns the number of samples waiting in front of each stage, keyed by stage name
+        stages (dict): Keys are stage names, values are StageMetrics
+        n_started (int): Samples that entered the campaign
+        n_completed (int): Samples that finished every stage
+        n_failed (int): Samples that failed in any stage
+
+    """
+    def __init__(self, filename='campaign_metrics.json', n_total=None, flush_interval=10.0, format=None,
+                 queue_depths=None) -> None:
+        self.filename = os.path.abspath(filename)
+        self.n_total = n_total
+        self.flush_interval = flush_interval
+        if format is None:
+            format = 'prometheus' if filename.endswith('.prom') else 'json'
+        if format not in ('json', 'prometheus'):
+            raise ValueError(f'Unrecognized metrics format: {format!r}. Options are json or prometheus')
+        self.format = format
+        self.queue_depths = queue_depths
+        self.stages = {}
+        self.n_started = 0
+        self.n_completed = 0
+        self.n_failed = 0
+
+        self._start = time.monotonic()
+        self._start_date = datetime.datetime.now()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def n_in_flight(self):
+        """Samples that entered the campaign and have neither finished nor failed"""
+        return self.n_started - self.n_completed - self.n_failed
+
+    def sample_started(self):
+        """Counts a sample entering the campaign"""
+        with self._lock:
+            self.n_started += 1
+
+    def sample_finished(self, failed=False):
+        """Counts a sample leaving the campaign, having finished every stage or failed in one"""
+        with self._lock:
+            if failed:
+                self.n_failed += 1
+            else:
+                self.n_completed += 1
+
+    def stage_started(self, stage):
+        """Counts a sample entering a stage"""
+        with self._lock:
+            metrics = self.stages.setdefault(stage, StageMetrics(stage))
+            metrics.n_active += 1
+            if metrics.start_time is None:
+                metrics.start_time = time.monotonic()
+
+    def stage_finished(self, stage, duration, failed=False):
+        """Counts a sample leaving a stage after duration seconds"""
+        with self._lock:
+            metrics = self.stages[stage]
+            metrics.n_active -= 1
+            metrics.busy_time += duration
+            if failed:
+                metrics.n_failed += 1
+            else:
+                metrics.n_completed += 1
+
+    @contextlib.contextmanager
+    def track_stage(self, stage):
+        """Context manager that counts the enclosed block as one sample passing through stage"""
+        self.stage_started(stage)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.stage_finished(stage, time.monotonic() - start, failed=True)
+            raise
+        self.stage_finished(stage, time.monotonic() - start)
+
+    def snapshot(self):
+        """Current state of the campaign as a dictionary
+
+        Returns:
+            snapshot (dict): Sample counts, elapsed time, throughput and ETA of the campaign, and counts, throughput
+                             and queue depth of each stage
+        """
+        now = time.monotonic()
+        queue_depths = self.queue_depths() if self.queue_depths is not None else {}
+        with self._lock:
+            elapsed = now - self._start
+            n_finished = self.n_completed + self.n_failed
+            throughput = n_finished / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.n_total is not None and throughput > 0:
+                eta = max(self.n_total - n_finished, 0) / throughput
+            stages = {}
+            for name, metrics in self.stages.items():
+                stages[name] = metrics.snapshot(now)
+                stages[name]['queue_depth'] = queue_depths.get(name, 0)
+
+            return {
+                'start': self._start_date.isoformat(timespec='seconds'),
+                'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+                'elapsed_s': elapsed,
+                'samples_planned': self.n_total,
+                'samples_started': self.n_started,
+                'samples_completed': self.n_completed,
+                'samples_failed': self.n_failed,
+                'samples_in_flight': self.n_in_flight,
+                'throughput_per_s': throughput,
+                'eta_s': eta,
+                'stages': stages,
+            }
+
+    def flush(self):
+        """Writes the current snapshot to the metrics file, replacing it atomically"""
+        snapshot = self.snapshot()
+        text = json.dumps(snapshot, indent=2) if self.format == 'json' else CampaignMetrics.to_prometheus(snapshot)
+        tmp_filename = f'{self.filename}.{os.getpid()}.tmp'
+        with open(tmp_filename, 'w') as f:
+            f.write(text)
+        os.replace(tmp_filename, self.filename)
+
+    def start(self):
+        """Starts the background thread that flushes the metrics file every flush_interval seconds"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_periodically, daemon=True, name='campaign-metrics')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread and writes the final state of the campaign"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:  # a full disk or a locked file should not end the campaign
+                print(f'Could not write metrics to {self.filename}: {e!r}')
+
+    @staticmethod
+    def to_prometheus(snapshot, prefix='customeos'):
+        """Formats a snapshot in the Prometheus text exposition format
+
+        Args:
+            snapshot (dict): Output of CampaignMetrics.snapshot
+            prefix (string, optional): Prefix of every metric name
+
+        Returns:
+            text (string)
+        """
+        lines = []
+
+        def add(name, metric_type, help_text, values):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for labels, value in values:
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f'{prefix}_{name}{{{label_text}}} {value}' if label_text else f'{prefix}_{name} {value}')
+
+        add('samples_started_total', 'counter', 'Samples that entered the campaign', [({}, snapshot['samples_started'])])
+        add('samples_completed_total', 'counter', 'Samples that finished every stage',
+            [({}, snapshot['samples_completed'])])
+        add('samples_failed_total', 'counter', 'Samples that failed in any stage', [({}, snapshot['samples_failed'])])
+        add('samples_in_flight', 'gauge', 'Samples currently in the campaign', [({}, snapshot['samples_in_flight'])])
+        if snapshot['samples_planned'] is not None:
+            add('samples_planned', 'gauge', 'Samples planned for the campaign', [({}, snapshot['samples_planned'])])
+        add('elapsed_seconds', 'gauge', 'Seconds since the campaign started', [({}, snapshot['elapsed_s'])])
+        add('throughput_samples_per_second', 'gauge', 'Samples finished per second',
+            [({}, snapshot['throughput_per_s'])])
+        if snapshot['eta_s'] is not None:
+            add('eta_seconds', 'gauge', 'Estimated seconds until every sample has finished', [({}, snapshot['eta_s'])])
+
+        stages = snapshot['stages']
+        add('stage_active', 'gauge', 'Samples currently inside each stage',
+            [({'stage': name}, stage['active']) for name, stage in stages.items()])
+        add('stage_completed_total', 'counter', 'Samples each stage finished',
+            [({'stage': name}, stage['completed']) for name, stage in stages.items()])
+        add('stage_failed_total', 'counter', 'Samples each stage raised an exception on',
+            [({'stage': name}, stage['failed']) for name, stage in stages.items()])
+        add('stage_busy_seconds_total', 'counter', 'Seconds spent inside each stage, summed over workers',
+            [({'stage': name}, stage['busy_time_s']) for name, stage in stages.items()])
+        add('stage_throughput_samples_per_second', 'gauge', 'Samples each stage finished per second',
+            [({'stage': name}, stage['throughput_per_s']) for name, stage in stages.items()])
+        add('stage_queue_depth', 'gauge', 'Samples waiting in front of each stage',
+            [({'stage': name}, stage['queue_depth']) for name, stage in stages.items()])
+
+        return '\n'.join(lines) + '\n'
@@ -1,45 +1,203 @@
+import os
+import queue
 import subprocess
 from EosDataGenerators.EosGenerator import EosGenerator
 from HyadesRunners.HyadesRunner import HyadesRunner
+from HyadesRunners.OutputAggregator import OutputAggregator
+from StagedPipeline import PipelineStage, StagedPipeline
+from CampaignMetrics import CampaignMetrics, METRICS_ENVIRONMENT_VARIABLE
+from process_monitor import run_monitored
+from stage_profiler import enable_profiling, get_profile_dir, profile_stage, write_report
 
 
 class EosCustomizer:
     def __init__(self, eos_generator: EosGenerator, 
                  hyades_runner:HyadesRunner,
-                 eos_id) -> None:
+                 eos_id, output_aggregator: OutputAggregator = None) -> None:
+        """
+        Args:
+            eos_generator (EosGenerator): Generates the EOS table of each sample
+            hyades_runner (HyadesRunner): Runs Hyades on an installed table
+            eos_id (int): EOS ID the tables are installed under
+            output_aggregator (OutputAggregator, optional): If given, the outputs of each run are folded into its
+                                                            running statistics, on the times and mesh of the first
+                                                            run, as the run completes instead of being kept in
+                                                            custom_hyades_output
+        """
         self.eos_generator = eos_generator
         self.hyades_runner = hyades_runner
         self.eos_id=eos_id
+        self.output_aggregator = output_aggregator
         self.custom_hyades_output=[]
 
-    def run_customized_hyades(self, n_runs=2):
-        for _ in range(n_runs):
-            # EosCustomizer.print_installed_tables_to_file()
-            # exists = EosCustomizer.check_if_eos_id_exists(eos_id=self.eos_id)
-            # EosCustomizer.remove_installed_tables_file()
+    def run_customized_hyades(self, n_runs=2, profile_dir=None, metrics_file=None):
+        """Generates, installs and simulates n_runs samples one after another
 
-            filename = self.eos_generator.run_once_and_generate_eos_file()
+        Args:
+            n_runs (int, optional): Number of samples
+            profile_dir (string, optional): Directory to write per-stage cProfile files and a hot-function report to.
+                                            Defaults to $CUSTOMEOS_PROFILE_DIR, profiling is off if neither is set
+            metrics_file (string, optional): File the live campaign metrics are written to, JSON or, for a .prom
+                                             file, Prometheus text. Defaults to $CUSTOMEOS_METRICS_FILE, no metrics
+                                             are written if neither is set
+        """
+        with enable_profiling(profile_dir):
+            metrics = EosCustomizer._start_metrics(metrics_file, n_runs)
+            for _ in range(n_runs):
+                # EosCustomizer.print_installed_tables_to_file()
+                # exists = EosCustomizer.check_if_eos_id_exists(eos_id=self.eos_id)
+                # EosCustomizer.remove_installed_tables_file()
 
-            # self.check_if_custom_eos_file_has_correct_id(filename=filename, eos_id=self.eos_id)
-            # self.add_eos_to_hyades(filename=filename)
+                if metrics is None:
+                    with profile_stage('generate'):
+                        filename = self._generate_eos_file()
+                else:
+                    metrics.sample_started()
+                    try:
+                        with metrics.track_stage('generate'), profile_stage('generate'):
+                            filename = self._generate_eos_file()
+                    except Exception:
+                        metrics.sample_finished(failed=True)
+                        metrics.stop()
+                        raise
+                    metrics.sample_finished()
 
-            # output=self.hyades_runner.run_once()
-            # self.custom_hyades_output.append(output)
+                # self.check_if_custom_eos_file_has_correct_id(filename=filename, eos_id=self.eos_id)
+                # self.add_eos_to_hyades(filename=filename)
 
-            # EosCustomizer.print_installed_tables_to_file()
-            # exists = EosCustomizer.check_if_eos_id_exists(eos_id=self.eos_id)
+                # output=self.hyades_runner.run_and_retrieve_output()
+                # self.custom_hyades_output.append(output)
+
+                # EosCustomizer.print_installed_tables_to_file()
+                # exists = EosCustomizer.check_if_eos_id_exists(eos_id=self.eos_id)
             
-            # if exists:
-            #     EosCustomizer.remove_eos_from_hyades(self.eos_id)
-            # EosCustomizer.remove_installed_tables_file()
+                # if exists:
+                #     EosCustomizer.remove_eos_from_hyades(self.eos_id)
+                # EosCustomizer.remove_installed_tables_file()
+
+            if metrics is not None:
+                metrics.stop()
+            if get_profile_dir():
+                write_report()
+
+    def run_pipelined_hyades(self, n_runs=2, n_install_workers=1, n_simulate_workers=1, queue_size=2, verbose=True,
+                             profile_dir=None, metrics_file=None):
+        """Runs the generate, install and simulate steps as overlapping pipeline stages
+
+        Note:
+            While sample k is being simulated, the tables of the following samples are already being generated.
+            Each queue between stages holds at most queue_size samples, so generation pauses when Hyades falls behind.
+            Only one table can be installed under self.eos_id at a time, so a sample is installed only after the
+            previous one has been simulated and removed from hyadlibm. The wait for the EOS ID is not counted as
+            install busy time, and simulations cannot overlap, so n_simulate_workers must be 1.
+            Tables are generated one at a time. A generator such as ReodpEosGenerator runs its samples through one
+            UQpy RunModel, with its input and output in the INDATA and OUTDATA folders of the working directory, so
+            concurrent generate workers would overwrite each other's runs.
+
+        Args:
+            n_runs (int, optional): Number of samples to push through the pipeline
+            n_install_workers (int, optional): Number of threads installing tables with hyadlibm
+            n_simulate_workers (int, optional): Number of Hyades simulations run at once, must be 1
+            queue_size (int, optional): Capacity of the queue in front of each stage
+            verbose (bool, optional): Toggle to print the per-stage throughput report
+            profile_dir (string, optional): Directory to write per-stage cProfile files and a hot-function report to.
+                                            Defaults to $CUSTOMEOS_PROFILE_DIR, profiling is off if neither is set
+            metrics_file (string, optional): File the live campaign metrics are written to, JSON or, for a .prom
+                                             file, Prometheus text. Defaults to $CUSTOMEOS_METRICS_FILE, no metrics
+                                             are written if neither is set
+
+        Returns:
+            stage_summary (list): One dictionary of throughput information per stage
+
+        Raises:
+            ValueError: If n_simulate_workers is not 1
+        """
+        if n_simulate_workers != 1:
+            raise ValueError(f'Samples share EOS ID {self.eos_id}, so only one can be simulated at a time, got '
+                             f'n_simulate_workers={n_simulate_workers}')
+        with enable_profiling(profile_dir):
+            self._free_eos_ids = queue.Queue()
+            self._free_eos_ids.put(self.eos_id)
+
+            pipeline = StagedPipeline([PipelineStage('generate', self._generate_stage),
+                                       PipelineStage('install', self._install_stage, n_install_workers,
+                                                     wait=self._wait_for_eos_id),
+                                       PipelineStage('simulate', self._simulate_stage, n_simulate_workers)],
+                                      queue_size=queue_size, metrics=EosCustomizer._start_metrics(metrics_file, n_runs))
+            try:
+                outputs = pipeline.run(range(n_runs))
+            finally:
+                if pipeline.metrics is not None:
+                    pipeline.metrics.stop()
+            if self.output_aggregator is None:
+                self.custom_hyades_output.extend(outputs)
+
+            if verbose:
+                pipeline.print_summary()
+            if get_profile_dir():
+                write_report()
+        return pipeline.summary()
+
+    @staticmethod
+    def _start_metrics(metrics_file, n_runs):
+        """Starts writing campaign metrics to metrics_file or $CUSTOMEOS_METRICS_FILE, returns None if neither is set"""
+        metrics_file = metrics_file or os.environ.get(METRICS_ENVIRONMENT_VARIABLE)
+        if not metrics_file:
+            return None
+        return CampaignMetrics(metrics_file, n_total=n_runs).start()
+
+    def _generate_stage(self, index, item):
+        """Pipeline stage that generates the EOS table of one sample"""
+        with profile_stage('generate'):
+            return self._generate_eos_file()
+
+    def _generate_eos_file(self):
+        """Runs the generator once and returns the name of the table it wrote, raising if it wrote none"""
+        filename = self.eos_generator.run_once_and_generate_eos_file()
+        if not filename:
+            raise RuntimeError(f'{type(self.eos_generator).__name__}.run_once_and_generate_eos_file returned '
+                               f'{filename!r} instead of the name of the EOS table it wrote')
+        return filename
+
+    def _wait_for_eos_id(self, index, filename):
+        """Waits, outside the timed install stage, until the EOS ID is free and hands it to the stage"""
+        return filename, self._free_eos_ids.get()
+
+    def _install_stage(self, index, entry):
+        """Pipeline stage that installs the sample's table under the EOS ID it was given with hyadlibm"""
+        filename, eos_id = entry
+        try:
+            with profile_stage('install'):
+                self.add_eos_to_hyades(filename=filename)
+        except Exception:
+            self._free_eos_ids.put(eos_id)
+            raise
+        return eos_id
+
+    def _simulate_stage(self, index, eos_id):
+        """Pipeline stage that runs Hyades on the installed table, then removes it and frees its EOS ID"""
+        try:
+            with profile_stage('simulate'):
+                time, mesh, outputs = self.hyades_runner.run_and_retrieve_output(index)
+        finally:
+            try:
+                with profile_stage('remove'):
+                    EosCustomizer.remove_eos_from_hyades(eos_id)
+            finally:  # a failed removal must not leave the install stage waiting forever for the ID
+                self._free_eos_ids.put(eos_id)
+        if self.output_aggregator is not None:
+            self.output_aggregator.add(outputs, time=time, mesh=mesh)
+            return None  # the arrays are dropped once folded in, so memory does not grow with the campaign
+        return time, mesh, outputs
 
     def print_installed_tables_to_file():
         """Uses hyadlibm command to open current """
         command = bytes('hyadlibm', 'utf-8')
-        p = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
         hyadlibm_inputs = ''.join(['1\n', '5\n', "list.txt"+'\n', '7\n'])
         input = bytes(hyadlibm_inputs, 'utf-8')
-        stdout, stderr = p.communicate(input=input)
+        completed = run_monitored(command, label='hyadlibm', input=input,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = completed.stdout, completed.stderr
 
         return stdout.decode('utf-8'), stderr.decode('utf-8')
 
@@ -83,14 +241,15 @@ class EosCustomizer:
         :return: terminal output, terminal error
         """
         command = bytes('hyadlibm', 'utf-8')  # subprocess library requires commands as bytes, not strings
-        p = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 
         path_to_eos_library = os.path.join('C:', os.sep, 'Hyades', 'EOS-Opacity', 'QEOS')  # Path to EOS library on Wicks Windows computer
         absolute_path = os.path.join(path_to_eos_library, filename)
 
         hyadlibm_inputs = ''.join(['1\n', '2\n', absolute_path+'\n', '7\n'])
         input = bytes(hyadlibm_inputs, 'utf-8')
-        stdout, stderr = p.communicate(input=input)
+        completed = run_monitored(command, label='hyadlibm', input=input,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = completed.stdout, completed.stderr
 
         return stdout, stderr
 
@@ -118,9 +277,10 @@ class EosCustomizer:
             eos_id = str(eos_id)
 
         command = bytes('hyadlibm', 'utf-8')  # subprocess library requires commands as bytes, not strings
-        p = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
         hyadlibm_inputs = ''.join(['1\n', '3\n', eos_id+'\n', '\n', '7\n'])
         input = bytes(hyadlibm_inputs, 'utf-8')
-        stdout, stderr = p.communicate(input=input)
+        completed = run_monitored(command, label='hyadlibm', input=input,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = completed.stdout, completed.stderr
 
         return stdout.decode('utf-8'), stderr.decode('utf-8')
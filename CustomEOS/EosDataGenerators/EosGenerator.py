@@ -6,4 +6,9 @@ class EosGenerator(ABC):
 
     @abstractmethod
     def run_once_and_generate_eos_file(self):
+        """Generates the EOS table of one sample and writes it
+
+        Returns:
+            filename (string): Name of the written table, as passed to hyadlibm
+        """
         pass
\ No newline at end of file
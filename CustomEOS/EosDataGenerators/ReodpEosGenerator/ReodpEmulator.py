@@ -0,0 +1,341 @@
+"""Surrogate of REODP pressure and energy tables over the 30 liquid-phase parameters
+
+An emulator is trained on a modest design of REODP outputs from REODP runs:
+    emulator = ReodpEmulator.from_model(evaluate, lower, upper, n_design=200)
+Tables from ReodpModel, which only approximates REODP, are enough to exercise it.
+Each table is compressed with PCA and the PCA weights are regressed on the parameters with a polynomial chaos
+expansion or a Gaussian process. Predicting a table is then a small matrix product, and every prediction comes with
+an error estimate, so that ReodpEosGenerator can take a sample from the emulator when the error is below a tolerance
+and run REODP only otherwise.
+"""
+import itertools
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy.stats import qmc
+
+METHODS = ('pce', 'gp')
+
+
+class ReodpEmulator:
+    """PCA plus regression emulator of pressure and energy tables
+
+    Note:
+        The pressures and energies of a table are divided by the standard deviation of each field over the training
+        design, so both count equally in the PCA, and are flattened into one vector. The smallest number of principal
+        components explaining variance_fraction of the variance is kept.
+        With method='pce' every PCA weight is a least-squares fit of orthonormal Legendre polynomials of the
+        parameters, scaled to [-1, 1] between lower and upper. Its error is the leave-one-out error of the fit, the
+        same for every parameter vector.
+        With method='gp' the weights share one Gaussian process with a squared exponential kernel, whose length
+        scales and nugget maximize the marginal likelihood. Its error is the predictive variance, which grows away
+        from the design points.
+        Both add the error of truncating the PCA, measured on the training design.
+
+    Attributes:
+        method (string): One of pce or gp
+        variance_fraction (float): Fraction of the variance kept by the PCA
+        lower (numpy.array): Shape (n_parameters,), lower bounds of the parameters
+        upper (numpy.array): Shape (n_parameters,), upper bounds of the parameters
+        densities (numpy.array): Shape (NR,), densities of the tables, None if not given
+        temperatures (numpy.array): Shape (NT,), temperatures of the tables, None if not given
+        table_shape (tuple): (NT, NR)
+        n_components (int): Number of principal components kept
+
+    """
+    def __init__(self, method='gp', variance_fraction=0.9999, degree=3, interaction_order=1) -> None:
+        """
+        Args:
+            method (string, optional): Regression of the PCA weights, gp for a Gaussian process or pce for
+                                       polynomial chaos
+            variance_fraction (float, optional): Fraction of the variance of the tables kept by the PCA
+            degree (int, optional): Total degree of the polynomial chaos expansion
+            interaction_order (int, optional): Largest number of parameters in one polynomial chaos term. 1 keeps
+                                               the number of terms linear in the number of parameters
+        """
+        if method not in METHODS:
+            raise ValueError(f'Unrecognized emulator method: {method!r}. Options are {METHODS}')
+        self.method = method
+        self.variance_fraction = variance_fraction
+        self.degree = degree
+        self.interaction_order = interaction_order
+        self.lower = self.upper = None
+        self.densities = self.temperatures = None
+        self.table_shape = None
+        self.n_components = None
+
+    @classmethod
+    def from_model(cls, evaluate, lower, upper, n_design=200, seed=None, densities=None, temperatures=None, **kwargs):
+        """Trains an emulator on a Latin hypercube design between lower and upper
+
+        Args:
+            evaluate (callable): Takes parameters of shape (n_design, n_parameters) and returns pressures and
+                                 energies of shape (n_design, NT, NR), such as a function running REODP on
+                                 each row, or lambda x: ReodpModel(x).evaluate_eos(densities, temperatures) to
+                                 exercise the emulator
+            lower (numpy.array): Shape (n_parameters,), lower bounds of the parameters
+            upper (numpy.array): Shape (n_parameters,), upper bounds of the parameters
+            n_design (int, optional): Number of training tables
+            seed (int, optional): Seed of the Latin hypercube
+            densities (numpy.array, optional): Densities of the tables, kept for reference
+            temperatures (numpy.array, optional): Temperatures of the tables, kept for reference
+            **kwargs: Passed on to ReodpEmulator
+
+        Returns:
+            emulator (ReodpEmulator)
+        """
+        lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+        design = qmc.scale(qmc.LatinHypercube(d=len(lower), seed=seed).random(n_design), lower, upper)
+        pressures, energies = evaluate(design)
+        return cls(**kwargs).fit(design, pressures, energies, lower=lower, upper=upper,
+                                 densities=densities, temperatures=temperatures)
+
+    def fit(self, parameters, pressures, energies, lower=None, upper=None, densities=None, temperatures=None):
+        """Trains the emulator on a design of tables
+
+        Args:
+            parameters (numpy.array): Shape (n_design, n_parameters)
+            pressures (numpy.array): Shape (n_design, NT, NR)
+            energies (numpy.array): Shape (n_design, NT, NR)
+            lower (numpy.array, optional): Lower bounds of the parameters, defaults to the design minimum
+            upper (numpy.array, optional): Upper bounds of the parameters, defaults to the design maximum
+            densities (numpy.array, optional): Densities of the tables, kept for reference
+            temperatures (numpy.array, optional): Temperatures of the tables, kept for reference
+
+        Returns:
+            self (ReodpEmulator)
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        pressures, energies = np.asarray(pressures, dtype=np.float64), np.asarray(energies, dtype=np.float64)
+        if pressures.shape != energies.shape or pressures.shape[0] != parameters.shape[0]:
+            raise ValueError(f'Shapes of parameters {parameters.shape}, pressures {pressures.shape} and energies '
+                             f'{energies.shape} do not match')
+        n_design = parameters.shape[0]
+        self.lower = parameters.min(axis=0) if lower is None else np.asarray(lower, dtype=np.float64)
+        self.upper = parameters.max(axis=0) if upper is None else np.asarray(upper, dtype=np.float64)
+        self.densities, self.temperatures = densities, temperatures
+        self.table_shape = pressures.shape[1:]
+
+        # PCA of the standardized, flattened tables
+        self._scales = np.array([pressures.std(), energies.std()])
+        self._scales[self._scales == 0] = 1.0
+        tables = np.concatenate([pressures.reshape(n_design, -1) / self._scales[0],
+                                 energies.reshape(n_design, -1) / self._scales[1]], axis=1)
+        self._mean = tables.mean(axis=0)
+        u, s, vt = np.linalg.svd(tables - self._mean, full_matrices=False)
+        explained = np.cumsum(s ** 2) / np.sum(s ** 2)
+        self.n_components = int(np.searchsorted(explained, self.variance_fraction) + 1)
+        self.n_components = min(self.n_components, n_design - 1, len(s))
+        self._components = vt[:self.n_components]
+        self._squared_components = self._components ** 2
+        weights = u[:, :self.n_components] * s[:self.n_components]
+        residual = tables - self._mean - weights @ self._components
+        self._truncation_variance = np.mean(residual ** 2, axis=0)
+
+        x = self._scale_parameters(parameters)
+        if self.method == 'pce':
+            self._fit_pce(x, weights)
+        else:
+            self._fit_gp(x, weights)
+        return self
+
+    def _scale_parameters(self, parameters):
+        """Maps parameters from [lower, upper] to [-1, 1]"""
+        span = np.where(self.upper > self.lower, self.upper - self.lower, 1.0)
+        return 2 * (np.atleast_2d(np.asarray(parameters, dtype=np.float64)) - self.lower) / span - 1
+
+    def _fit_pce(self, x, weights):
+        """Least-squares polynomial chaos fit of the PCA weights with leave-one-out errors"""
+        self._multi_indices = legendre_multi_indices(x.shape[1], self.degree, self.interaction_order)
+        basis = legendre_basis(x, self._multi_indices, self.degree)
+        if basis.shape[0] <= basis.shape[1]:
+            raise ValueError(f'{basis.shape[0]} design points cannot fit {basis.shape[1]} polynomial chaos terms, '
+                             f'use more points or a lower degree or interaction_order')
+        q, r = np.linalg.qr(basis)
+        self._coefficients = np.linalg.solve(r, q.T @ weights)
+        leverage = np.sum(q ** 2, axis=1)
+        loo_residual = (weights - basis @ self._coefficients) / (1 - leverage)[:, np.newaxis]
+        self._weight_variance = np.mean(loo_residual ** 2, axis=0)
+
+    def _fit_gp(self, x, weights):
+        """Gaussian process fit of the PCA weights, one kernel shared by all components"""
+        self._weight_scale = weights.std(axis=0)
+        self._weight_scale[self._weight_scale == 0] = 1.0
+        y = weights / self._weight_scale
+        n_parameters = x.shape[1]
+
+        def negative_log_likelihood(log_hyperparameters):
+            length_scales, nugget = np.exp(log_hyperparameters[:-1]), np.exp(log_hyperparameters[-1])
+            kernel = squared_exponential(x, x, length_scales) + nugget * np.eye(len(x))
+            try:
+                factor = cho_factor(kernel, lower=True)
+            except np.linalg.LinAlgError:
+                return np.inf
+            alpha = cho_solve(factor, y)
+            log_det = 2 * np.sum(np.log(np.diag(factor[0])))
+            return 0.5 * np.sum(y * alpha) + 0.5 * y.shape[1] * log_det
+
+        start = np.concatenate([np.full(n_parameters, np.log(2.0)), [np.log(1e-4)]])
+        bounds = [(np.log(0.05), np.log(100.0))] * n_parameters + [(np.log(1e-10), np.log(1.0))]
+        result = minimize(negative_log_likelihood, start, method='L-BFGS-B', bounds=bounds)
+        self._length_scales, self._nugget = np.exp(result.x[:-1]), np.exp(result.x[-1])
+
+        kernel = squared_exponential(x, x, self._length_scales) + self._nugget * np.eye(len(x))
+        self._x = x
+        self._cholesky = cho_factor(kernel, lower=True)
+        self._alpha = cho_solve(self._cholesky, y)
+
+    def predict_weights(self, parameters):
+        """PCA weights and their variances for a batch of parameter vectors
+
+        Args:
+            parameters (numpy.array): Shape (n_samples, n_parameters) or (n_parameters,)
+
+        Returns:
+            weights (numpy.array): Shape (n_samples, n_components)
+            variances (numpy.array): Shape (n_samples, n_components)
+        """
+        x = self._scale_parameters(parameters)
+        if self.method == 'pce':
+            weights = legendre_basis(x, self._multi_indices, self.degree) @ self._coefficients
+            return weights, np.broadcast_to(self._weight_variance, weights.shape)
+
+        cross = squared_exponential(x, self._x, self._length_scales)
+        weights = cross @ self._alpha * self._weight_scale
+        reduction = np.sum(cross * cho_solve(self._cholesky, cross.T).T, axis=1)
+        variance = np.clip(1 + self._nugget - reduction, 0, None)[:, np.newaxis] * self._weight_scale ** 2
+        return weights, variance
+
+    def predict(self, parameters):
+        """Pressure and energy tables for a batch of parameter vectors, with their standard errors
+
+        Args:
+            parameters (numpy.array): Shape (n_samples, n_parameters) or (n_parameters,)
+
+        Returns:
+            pressures (numpy.array): Shape (n_samples, NT, NR), in the units of the training pressures
+            energies (numpy.array): Shape (n_samples, NT, NR), in the units of the training energies
+            pressure_errors (numpy.array): Shape (n_samples, NT, NR), standard error of every pressure
+            energy_errors (numpy.array): Shape (n_samples, NT, NR), standard error of every energy
+        """
+        weights, variances = self.predict_weights(parameters)
+        tables = self._mean + weights @ self._components
+        errors = np.sqrt(variances @ self._squared_components + self._truncation_variance)
+        n_samples, n_points = len(weights), int(np.prod(self.table_shape))
+        shape = (n_samples,) + tuple(self.table_shape)
+        return (tables[:, :n_points].reshape(shape) * self._scales[0],
+                tables[:, n_points:].reshape(shape) * self._scales[1],
+                errors[:, :n_points].reshape(shape) * self._scales[0],
+                errors[:, n_points:].reshape(shape) * self._scales[1])
+
+    def relative_error(self, parameters):
+        """Error of the emulator for each parameter vector as one number
+
+        Note:
+            The RMS standard error over the table of each field, relative to the spread of that field over the
+            training design. The larger of the pressure and energy errors is returned.
+
+        Args:
+            parameters (numpy.array): Shape (n_samples, n_parameters) or (n_parameters,)
+
+        Returns:
+            relative_error (numpy.array): Shape (n_samples,)
+        """
+        weights, variances = self.predict_weights(parameters)
+        errors = variances @ self._squared_components + self._truncation_variance
+        n_points = int(np.prod(self.table_shape))
+        return np.sqrt(np.maximum(errors[:, :n_points].mean(axis=1), errors[:, n_points:].mean(axis=1)))
+
+    def predict_within_tolerance(self, parameters, tolerance):
+        """Predicts tables and flags the parameter vectors the emulator is accurate enough for
+
+        Args:
+            parameters (numpy.array): Shape (n_samples, n_parameters) or (n_parameters,)
+            tolerance (float): Largest acceptable relative_error
+
+        Returns:
+            pressures (numpy.array): Shape (n_samples, NT, NR)
+            energies (numpy.array): Shape (n_samples, NT, NR)
+            accepted (numpy.array): Shape (n_samples,), True where relative_error is at most tolerance. The
+                                    samples that are not accepted should be run with REODP
+        """
+        pressures, energies, _, _ = self.predict(parameters)
+        return pressures, energies, self.relative_error(parameters) <= tolerance
+
+    def save(self, filename):
+        """Saves the trained emulator to a .npz file"""
+        arrays = {name: value for name, value in vars(self).items()
+                  if isinstance(value, np.ndarray) or np.isscalar(value)}
+        if self.method == 'gp':
+            arrays['_cholesky'] = self._cholesky[0]
+        arrays['table_shape'] = np.asarray(self.table_shape)
+        for name in ('densities', 'temperatures'):
+            if getattr(self, name) is not None:
+                arrays[name] = np.asarray(getattr(self, name))
+        np.savez(filename, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """Loads an emulator written by ReodpEmulator.save"""
+        with np.load(filename) as data:
+            arrays = {name: data[name] for name in data.files}
+        emulator = cls(method=str(arrays.pop('method')))
+        for name, value in arrays.items():
+            setattr(emulator, name, value.item() if value.ndim == 0 else value)
+        emulator.table_shape = tuple(int(n) for n in emulator.table_shape)
+        if emulator.method == 'gp':
+            emulator._cholesky = (emulator._cholesky, True)
+        return emulator
+
+
+def squared_exponential(x1, x2, length_scales):
+    """Squared exponential kernel with one length scale per parameter, shape (len(x1), len(x2))"""
+    x1, x2 = x1 / length_scales, x2 / length_scales
+    distances = np.sum(x1 ** 2, axis=1)[:, np.newaxis] + np.sum(x2 ** 2, axis=1)[np.newaxis, :] - 2 * x1 @ x2.T
+    return np.exp(-0.5 * np.clip(distances, 0, None))
+
+
+def legendre_multi_indices(n_parameters, degree, interaction_order=1):
+    """Degrees of every parameter in each polynomial chaos term of total degree at most degree
+
+    Args:
+        n_parameters (int): Number of parameters
+        degree (int): Largest total degree of a term
+        interaction_order (int, optional): Largest number of parameters in one term
+
+    Returns:
+        multi_indices (numpy.array): Shape (n_terms, n_parameters), starting with the constant term
+    """
+    multi_indices = [np.zeros(n_parameters, dtype=int)]
+    for order in range(1, min(interaction_order, degree) + 1):
+        for variables in itertools.combinations(range(n_parameters), order):
+            for degrees in itertools.product(range(1, degree + 1), repeat=order):
+                if sum(degrees) <= degree:
+                    index = np.zeros(n_parameters, dtype=int)
+                    index[list(variables)] = degrees
+                    multi_indices.append(index)
+    return np.array(multi_indices)
+
+
+def legendre_basis(x, multi_indices, degree):
+    """Orthonormal Legendre polynomials of the parameters for every term
+
+    Args:
+        x (numpy.array): Shape (n_samples, n_parameters), parameters scaled to [-1, 1]
+        multi_indices (numpy.array): Shape (n_terms, n_parameters), from legendre_multi_indices
+        degree (int): Largest degree in multi_indices
+
+    Returns:
+        basis (numpy.array): Shape (n_samples, n_terms)
+    """
+    polynomials = np.empty((degree + 1,) + x.shape)  # P_k(x) by the three-term recurrence
+    polynomials[0] = 1.0
+    if degree > 0:
+        polynomials[1] = x
+    for k in range(1, degree):
+        polynomials[k + 1] = ((2 * k + 1) * x * polynomials[k] - k * polynomials[k - 1]) / (k + 1)
+    polynomials *= np.sqrt(2 * np.arange(degree + 1) + 1)[:, np.newaxis, np.newaxis]
+
+    # polynomials[multi_indices[t, j], :, j] for every term t and parameter j, shape (n_terms, n_parameters, n_samples)
+    factors = polynomials[multi_indices, :, np.arange(x.shape[1])]
+    return np.prod(factors, axis=1).T
@@ -6,12 +6,43 @@ from UQpy.run_model.RunModel import RunModel
 import os
 import shutil
 import numpy as np
+import pandas as pd
 from EosTablesIO.readingEOS import EOSTable
+from EosTablesIO.EosTable import EosTable
+from EosDataGenerators.ReodpEosGenerator.ReodpEmulator import ReodpEmulator
+from EosDataGenerators.ReodpEosGenerator.ReodpModel import (AMU_TO_GRAM, CARBON_ATOMIC_MASS, EV_TO_ERG,
+                                                            PARAMETER_NAMES, REODP_VOLUME_RANGE)
+from EosTablesIO.sharedEosTable import SharedEosTable, SharedEosTableHandle
+from stage_profiler import profile_stage
 
 
 class ReodpEosGenerator(EosGenerator):
-    def __init__(self, eos_table: EOSTable) -> None:
+    def __init__(self, eos_table: EOSTable, emulator: ReodpEmulator = None, tolerance=0.01, output_dir=None) -> None:
+        """
+        Args:
+            eos_table (EOSTable): Table whose density and temperature grid REODP is run on, and into which each
+                                  REODP table is spliced. May be a SharedEosTable or, in a worker process, its
+                                  SharedEosTableHandle, which is attached to in place of a copy of the table
+            emulator (ReodpEmulator, optional): Trained emulator used instead of REODP for the samples it is
+                                                accurate enough for. Its tables must be on the REODP grid, uniform
+                                                in volume from 1.0 to 5.7 A^3/atom with one point per density of
+                                                eos_table, and over the temperatures REODP is run on
+            tolerance (float, optional): Largest relative_error of the emulator at which its tables are used
+            output_dir (string, optional): Folder the tables are written to, defaults to the working directory
+        """
+        self._shared_eos_table=None
+        if isinstance(eos_table, SharedEosTableHandle):
+            self._shared_eos_table=eos_table.attach()
+        if isinstance(eos_table, SharedEosTable):
+            self._shared_eos_table=eos_table
+        if self._shared_eos_table is not None:
+            eos_table=self._shared_eos_table.eos_table
         self.eos_table=eos_table
+        self.emulator=emulator
+        self.tolerance=tolerance
+        self.output_dir=os.path.abspath(output_dir or os.getcwd())
+        self.n_emulated=0
+        self.n_reodp_runs=0
         
         self._min_temperature=min(eos_table.temperatures) if min(eos_table.temperatures)>0 else 1.0
         self._max_temperature=max(eos_table.temperatures)
@@ -20,8 +51,12 @@ class ReodpEosGenerator(EosGenerator):
         self._min_density=min(eos_table.densities)
         self._max_density=max(eos_table.densities)
         self._n_densities=len(eos_table.densities)
-        # num_points between Volume 1.0 & 5.7
-        # index of points between 1.0 & 5.7
+        # REODP runs on n_densities volumes between 1.0 & 5.7
+        self._reodp_densities=CARBON_ATOMIC_MASS * AMU_TO_GRAM * 1e24 / np.linspace(*REODP_VOLUME_RANGE,
+                                                                                  self._n_densities)
+        self._reodp_temperatures=np.linspace(self._min_temperature, self._max_temperature, self._n_temperatures)
+        if emulator is not None:
+            self._check_emulator_grid(emulator)
 
 
         # Cold parameters for Vinet EOS
@@ -117,6 +152,11 @@ class ReodpEosGenerator(EosGenerator):
         shutil.copyfile(os.path.join(folder_path,'process_output.py'), os.path.join(os.getcwd(), 'process_output.py'))
         shutil.copyfile(os.path.join(folder_path,'Initial.dat'), os.path.join(os.getcwd(), 'Initial.dat'))
         shutil.copyfile(os.path.join(folder_path,'REODP-v4.exe'), os.path.join(os.getcwd(), 'REODP-v4.exe'))
+        # reodp_runner.py imports process_monitor.py and stage_profiler.py, which live in the CustomEOS folder
+        for module in ('process_monitor.py', 'stage_profiler.py'):
+            module_path = os.path.join(os.path.dirname(os.path.dirname(folder_path)), module)
+            if os.path.abspath(module_path) != os.path.abspath(module):
+                shutil.copyfile(module_path, os.path.join(os.getcwd(), module))
         if not os.path.exists('INDATA'):
             os.mkdir('INDATA')
         if not os.path.exists('OUTDATA'):
@@ -134,17 +174,74 @@ class ReodpEosGenerator(EosGenerator):
         self.run_reodp_model = RunModel(model=reodp_model)
 
     
-    def run_once_and_generate_eos_file(self):
-        self.sampling.run(nsamples=1)
-        # Append min, max temp, density etc
-        samples = self.sampling.samples.copy()
-        samples = np.append(samples, [self._n_temperatures, self._min_temperature, self._max_temperature, self._n_densities])
-
-        self.run_reodp_model.run(samples=samples)
-
-        eos_data = self.run_reodp_model.qoi_list[-1]
-        ## Add code to write to file
-        
-
-
+    def _check_emulator_grid(self, emulator):
+        """Raises ValueError unless the tables of emulator are on the REODP grid of eos_table"""
+        shape = (self._n_temperatures, self._n_densities)
+        if emulator.table_shape is None:
+            raise ValueError('The emulator has not been fitted')
+        if tuple(emulator.table_shape) != shape:
+            raise ValueError(f'The emulator predicts tables of shape {tuple(emulator.table_shape)}, REODP is run on '
+                             f'{shape[0]} temperatures and {shape[1]} densities')
+        if emulator.lower is not None and len(emulator.lower) != len(PARAMETER_NAMES):
+            raise ValueError(f'The emulator takes {len(emulator.lower)} parameters, REODP is sampled over '
+                             f'{len(PARAMETER_NAMES)}')
+        for name, grid, reodp_grid in (('densities', emulator.densities, self._reodp_densities),
+                                       ('temperatures', emulator.temperatures, self._reodp_temperatures)):
+            if grid is not None and not np.allclose(np.sort(grid), np.sort(reodp_grid), rtol=1e-6):
+                raise ValueError(f'The emulator {name} {np.min(grid):.6g} to {np.max(grid):.6g} are not the REODP '
+                                 f'{name} {reodp_grid.min():.6g} to {reodp_grid.max():.6g}')
 
+    def run_once_and_generate_eos_file(self):
+        """Samples the liquid parameters, gets their table from the emulator or REODP and writes it
+
+        Returns:
+            filename (string): Absolute path of the written table
+        """
+        with profile_stage('reodp.sample'):
+            self.sampling.run(nsamples=1)
+            # Append min, max temp, density etc
+            samples = self.sampling.samples.copy()
+            samples = np.append(samples, [self._n_temperatures, self._min_temperature, self._max_temperature, self._n_densities])
+
+        if self.emulator is not None:
+            with profile_stage('reodp.emulate'):
+                pressures, energies, accepted = self.emulator.predict_within_tolerance(self.sampling.samples,
+                                                                                      self.tolerance)
+            if accepted[0]:
+                self.n_emulated += 1
+                densities = self._reodp_densities if self.emulator.densities is None else self.emulator.densities
+                temperatures = self._reodp_temperatures if self.emulator.temperatures is None \
+                    else self.emulator.temperatures
+                return self._write_eos_file(densities, temperatures, pressures[0], energies[0])
+
+        with profile_stage('reodp.run_model'):
+            self.run_reodp_model.run(samples=samples)
+        self.n_reodp_runs += 1
+
+        densities, temperatures, pressures, energies = self.run_reodp_model.qoi_list[-1]
+        return self._write_eos_file(densities, temperatures, pressures,
+                                    energies * EV_TO_ERG / (CARBON_ATOMIC_MASS * AMU_TO_GRAM))
+
+    def _write_eos_file(self, densities, temperatures, pressures, energies):
+        """Splices a table on the REODP grid into eos_table and writes it to output_dir
+
+        Args:
+            densities (numpy.array): Shape (NR,) in g/cc
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+            pressures (numpy.array): Shape (NT, NR) in GPa
+            energies (numpy.array): Shape (NT, NR) in erg/g
+
+        Returns:
+            filename (string): Absolute path of the written table
+        """
+        base = self.eos_table
+        if not isinstance(base, EosTable):
+            base = EosTable(material_name=base.material_name, info=dict(base.info), pressure_eos=base.pressure_eos,
+                            energy_eos=base.energy_eos, temperatures=base.temperatures, densities=base.densities)
+        sub_table = EosTable(material_name='REODP', info=dict(base.info),
+                             pressure_eos=pd.DataFrame(pressures, index=temperatures, columns=densities),
+                             energy_eos=pd.DataFrame(energies, index=temperatures, columns=densities),
+                             temperatures=temperatures, densities=densities)
+        filename = os.path.join(self.output_dir, f'reodp_eos_{self.n_emulated + self.n_reodp_runs}.dat')
+        base.splice(sub_table).write_eos(filename)
+        return filename
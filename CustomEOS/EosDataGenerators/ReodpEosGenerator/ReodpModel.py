@@ -0,0 +1,476 @@
+"""NumPy approximation of the REODP carbon model: a Vinet cold curve with breakpoints plus quasi-harmonic
+ion-thermal and electron-thermal free energies, vectorized over batches of parameter samples
+
+The REODP source is not available, so the functional forms here are not REODP's own. They are built from the
+parameter names and units of Initial.dat and fitted in form, not in parameters, to the REODP diamond tables bundled in
+EosTablesIO/data/REODP. Against REODP_diamond_eos_all_phases.txt, with the solid phases of Initial.dat, the model is
+off by 28 GPa RMS and 94 GPa at most, 14% RMS relative, see compare_to_reference. Use it to exercise and test the
+tools that consume REODP tables, not in place of REODP runs.
+
+The liquid phase is described by the same 30 parameters ReodpEosGenerator samples and writes into Initial.dat, in the
+order of PARAMETER_NAMES. The fixed parameters of the solid phases in Initial.dat are in SOLID_PHASES. No REODP output
+for the liquid is bundled, so the breakpoint terms, which only the liquid uses, are not checked against REODP.
+
+Units follow Initial.dat: volumes in A^3/atom, temperatures in Kelvin, energies in eV/atom, pressures in GPa and
+entropies in eV/atom/K. ReodpModel.to_eos_tables converts to the g/cc, GPa and erg/g of an EosTable.
+"""
+import datetime
+import numpy as np
+import pandas as pd
+from EosTablesIO.EosTable import EosTable
+from EosTablesIO.phaseAssembly import assemble_phases
+
+BOLTZMANN = 8.617333262e-5  # eV/K
+EV_PER_A3_TO_GPA = 160.21766208
+EV_TO_ERG = 1.602176634e-12
+AMU_TO_GRAM = 1.66053906660e-24
+CARBON_ATOMIC_MASS = 12.011
+CARBON_ATOMIC_NUMBER = 6.0
+
+PARAMETER_NAMES = ('phi0', 'B0', 'V0', 'Bprime',
+                   'Vb1', 'a1', 'b1', 'n1', 'Vb2', 'a2', 'b2', 'n2',
+                   'Vb3', 'a3', 'b3', 'n3', 'Vb4', 'a4', 'b4', 'n4',
+                   'Vp', 'thetA', 'AA', 'BA', 'thetB', 'AB', 'BB', 'thet1', 'A1', 'B1')
+N_BREAKPOINTS = 4
+BRANCHES = ('A', 'B', '1')  # Quasi-harmonic branches, parameters thet{branch}, A{branch} and B{branch}
+
+# Parameters a model leaves out default to a model without breakpoints and without electron-thermal terms
+_DEFAULT_PARAMETERS = {**{f'Vb{i}': 1.0 for i in range(1, N_BREAKPOINTS + 1)},
+                       **{f'a{i}': 0.0 for i in range(1, N_BREAKPOINTS + 1)},
+                       **{f'b{i}': 1.0 for i in range(1, N_BREAKPOINTS + 1)},
+                       **{f'n{i}': 1.0 for i in range(1, N_BREAKPOINTS + 1)},
+                       'Ve': 1.0, 'alpha0': 0.0, 'kapa': 0.0}
+
+# Volumes of the sh-sc, sc-BC8 and BC8-diamond interfaces and the melting temperature, copied from Initial.dat
+PHASE_INTERFACE_VOLUMES = (1.351, 1.8444, 2.85)  # A^3/atom
+MELTING_TEMPERATURE = 8000.0  # K
+# Volume range REODP accepts, from the comments of Initial.dat
+REODP_VOLUME_RANGE = (1.0, 5.7)  # A^3/atom
+
+# Fixed parameters of the solid phases, copied from Initial.dat
+SOLID_PHASES = {
+    'diamond': {'phi0': -9.066, 'B0': 432.4, 'V0': 5.7034, 'Bprime': 3.793,
+                'Vp': 5.571, 'thetA': 1887.8, 'AA': -0.316, 'BA': 0.913, 'thetB': 1887.8, 'AB': 0.168, 'BB': 0.429,
+                'thet1': 1887.8, 'A1': 0.0846, 'B1': 0.499,
+                'Ve': 5.785, 'alpha0': 3.79e-05, 'kapa': 0.0},
+    'BC8': {'phi0': -8.705, 'B0': 221.2, 'V0': 6.242, 'Bprime': 4.697,
+            'Vp': 3.176, 'thetA': 1961.9, 'AA': 0.0, 'BA': 0.0, 'thetB': 3176.3, 'AB': 0.156, 'BB': 0.532,
+            'thet1': 2800.6, 'A1': 0.112, 'B1': 0.449,
+            'Ve': 5.077, 'alpha0': 5.5e-05, 'kapa': 0.0},
+    'sc': {'phi0': -7.525, 'B0': 59.09, 'V0': 7.9899, 'Bprime': 5.763,
+           'Vp': 2.658, 'thetA': 2089.8, 'AA': 0.0, 'BA': 0.212, 'thetB': 2961.3, 'AB': 0.0, 'BB': 0.817,
+           'thet1': 2328.3, 'A1': 0.369, 'B1': 0.302,
+           'Ve': 1.0, 'alpha0': 1.37e-05, 'kapa': 0.637},
+    'sh': {'phi0': -6.5, 'B0': 22.12, 'V0': 9.6061, 'Bprime': 6.495,
+           'Vp': 1.35, 'thetA': 4183.8, 'AA': 0.4354, 'BA': 0.4034, 'thetB': 4183.8, 'AB': 0.4354, 'BB': 0.4034,
+           'thet1': 4183.8, 'A1': 0.4354, 'B1': 0.4034,
+           'Ve': 1.0, 'alpha0': 1.58e-05, 'kapa': 0.81},
+}
+
+# Solid phases in order of increasing volume, separated by PHASE_INTERFACE_VOLUMES
+SOLID_PHASE_ORDER = ('sh', 'sc', 'BC8', 'diamond')
+
+
+class ReodpModel:
+    """Free energy, pressure, internal energy and entropy of a batch of REODP parameter samples
+
+    Note:
+        F(V, T) = phi(V) + F_ion(V, T) + F_el(V, T) for every sample at once, with these terms:
+        phi(V) is the Vinet cold curve
+            phi0 + 2 B0 V0 / (B'-1)^2 * (2 - (5 + 3 B' (x-1) - 3 x) exp(-3/2 (B'-1) (x-1))), x = (V/V0)^(1/3)
+        plus one term per breakpoint, a * s^n with s = ln(1 + exp(b (1 - V/Vb))) / b, a smoothed (1 - V/Vb)^n that
+        switches on as the volume drops below Vb.
+        F_ion is three quasi-harmonic branches, each carrying one of the three vibrational degrees of freedom of an
+        atom, in the classical limit k T ln(theta/T), with a Gruneisen parameter gamma = B + A V, so that
+        theta(V) = thet (Vp/V)^B exp(A (Vp - V)).
+        F_el = -3/2 k alpha0 (V/Ve)^kapa T^2 is the electron-thermal term of the solid phases, the liquid has none.
+        The classical limit and the sign of A are the ones the bundled REODP tables support: their ion-thermal
+        energy rises by 3 k per atom and Kelvin from 300 K upwards, with no quantum freeze-out, and their thermal
+        pressure follows B + A V. Against REODP_diamond_eos_all_phases.txt the quantum branches, k theta / 2 +
+        k T ln(1 - exp(-theta/T)), are off by 0.14 eV/atom RMS in thermal energy instead of 0.12 eV/atom, and
+        gamma = B - A V by 45 GPa RMS in thermal pressure instead of 17 GPa.
+
+    Attributes:
+        parameters (dict): Keys are parameter names, values are arrays of shape (n_samples,)
+        atomic_mass (float): Average atomic mass in amu, used to convert to g/cc and erg/g
+        n_samples (int): Number of parameter samples
+
+    """
+    def __init__(self, parameters, atomic_mass=CARBON_ATOMIC_MASS) -> None:
+        """
+        Args:
+            parameters (dict or numpy.array): A dictionary of parameter names to scalars or arrays of shape
+                                              (n_samples,), such as SOLID_PHASES['diamond'], or an array of shape
+                                              (n_samples, 30) or (30,) with columns in the order of PARAMETER_NAMES,
+                                              such as the samples of ReodpEosGenerator
+            atomic_mass (float, optional): Average atomic mass in amu
+        """
+        if not isinstance(parameters, dict):
+            samples = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+            if samples.shape[1] < len(PARAMETER_NAMES):
+                raise ValueError(f'Expected {len(PARAMETER_NAMES)} parameters per sample in the order of '
+                                 f'PARAMETER_NAMES, got {samples.shape[1]}')
+            parameters = dict(zip(PARAMETER_NAMES, samples.T))
+
+        missing = [name for name in PARAMETER_NAMES if name not in parameters and name not in _DEFAULT_PARAMETERS]
+        if missing:
+            raise ValueError(f'Missing REODP parameters: {missing}')
+        parameters = {**_DEFAULT_PARAMETERS, **parameters}
+        arrays = [np.atleast_1d(np.asarray(value, dtype=np.float64)) for value in parameters.values()]
+        arrays = np.broadcast_arrays(*arrays)
+        self.parameters = {name: array for name, array in zip(parameters, arrays)}
+        self.atomic_mass = atomic_mass
+        self.n_samples = len(arrays[0])
+
+    def _column(self, name, n_dims):
+        """Parameter as an array of shape (n_samples, 1, ...) that broadcasts against grids with n_dims axes"""
+        return self.parameters[name].reshape((self.n_samples,) + (1,) * n_dims)
+
+    def cold_curve(self, volumes):
+        """Cold energy and pressure of every sample
+
+        Args:
+            volumes (numpy.array): Shape (NV,) in A^3/atom
+
+        Returns:
+            energy (numpy.array): Shape (n_samples, NV) in eV/atom
+            pressure (numpy.array): Shape (n_samples, NV) in GPa
+        """
+        volumes = np.asarray(volumes, dtype=np.float64)[np.newaxis, :]
+        p = lambda name: self._column(name, 1)
+
+        x = np.cbrt(volumes / p('V0'))
+        eta = 1.5 * (p('Bprime') - 1)
+        b0v0 = p('B0') * p('V0') / EV_PER_A3_TO_GPA  # eV/atom
+        energy = p('phi0') + 2 * b0v0 / (p('Bprime') - 1) ** 2 \
+            * (2 - (5 + 3 * p('Bprime') * (x - 1) - 3 * x) * np.exp(-eta * (x - 1)))
+        pressure = 3 * p('B0') * (1 - x) / x ** 2 * np.exp(eta * (1 - x))
+
+        for i in range(1, N_BREAKPOINTS + 1):
+            a, b, n, vb = p(f'a{i}'), p(f'b{i}'), p(f'n{i}'), p(f'Vb{i}')
+            z = b * (1 - volumes / vb)
+            s = np.logaddexp(0, z) / b
+            switch = 0.5 * (1 + np.tanh(0.5 * z))  # logistic function, the derivative of ln(1 + exp(z))
+            energy = energy + a * s ** n
+            pressure = pressure + a * n * s ** (n - 1) * switch / vb * EV_PER_A3_TO_GPA
+
+        return energy, pressure
+
+    def ion_thermal(self, volumes, temperatures):
+        """Classical quasi-harmonic ion-thermal free energy, internal energy, pressure and entropy of every sample
+
+        Args:
+            volumes (numpy.array): Shape (NV,) in A^3/atom
+            temperatures (numpy.array): Shape (NT,) in Kelvin, may include 0, where every term is 0
+
+        Returns:
+            thermal (dict): F, E (eV/atom), P (GPa) and S (eV/atom/K), each of shape (n_samples, NT, NV)
+        """
+        volumes = np.asarray(volumes, dtype=np.float64)[np.newaxis, np.newaxis, :]
+        temperatures = np.asarray(temperatures, dtype=np.float64)[np.newaxis, :, np.newaxis]
+        p = lambda name: self._column(name, 2)
+
+        shape = (self.n_samples, temperatures.shape[1], volumes.shape[2])
+        positive = temperatures > 0
+        log_temperatures = np.log(np.where(positive, temperatures, 1.0))
+        branch_energy = np.broadcast_to(BOLTZMANN * temperatures, shape)
+        free_energy, pressure, entropy = (np.zeros(shape) for _ in range(3))
+        for branch in BRANCHES:
+            gamma = p(f'B{branch}') + p(f'A{branch}') * volumes
+            log_theta = np.log(p(f'thet{branch}')) + p(f'B{branch}') * np.log(p('Vp') / volumes) \
+                + p(f'A{branch}') * (p('Vp') - volumes)
+            free_energy += branch_energy * (log_theta - log_temperatures)
+            entropy += np.where(positive, BOLTZMANN * (1 + log_temperatures - log_theta), 0.0)
+            pressure += gamma * branch_energy / volumes * EV_PER_A3_TO_GPA
+
+        return {'F': free_energy, 'E': len(BRANCHES) * branch_energy, 'P': pressure, 'S': entropy}
+
+    def electron_thermal(self, volumes, temperatures):
+        """Electron-thermal free energy, internal energy, pressure and entropy of every sample
+
+        Args:
+            volumes (numpy.array): Shape (NV,) in A^3/atom
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+
+        Returns:
+            thermal (dict): F, E (eV/atom), P (GPa) and S (eV/atom/K), each of shape (n_samples, NT, NV)
+        """
+        volumes = np.asarray(volumes, dtype=np.float64)[np.newaxis, np.newaxis, :]
+        temperatures = np.asarray(temperatures, dtype=np.float64)[np.newaxis, :, np.newaxis]
+        p = lambda name: self._column(name, 2)
+
+        beta = 1.5 * BOLTZMANN * p('alpha0') * (volumes / p('Ve')) ** p('kapa')  # eV/atom/K^2
+        energy = beta * temperatures ** 2
+        return {'F': -energy,
+                'E': energy,
+                'P': p('kapa') * energy / volumes * EV_PER_A3_TO_GPA,
+                'S': 2 * beta * temperatures}
+
+    def evaluate(self, volumes, temperatures):
+        """Total free energy, internal energy, pressure and entropy of every sample on the V x T grid
+
+        Args:
+            volumes (numpy.array): Shape (NV,) in A^3/atom
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+
+        Returns:
+            eos (dict): F, E (eV/atom), P (GPa) and S (eV/atom/K), each of shape (n_samples, NT, NV)
+        """
+        cold_energy, cold_pressure = self.cold_curve(volumes)
+        ion = self.ion_thermal(volumes, temperatures)
+        electron = self.electron_thermal(volumes, temperatures)
+        return {'F': cold_energy[:, np.newaxis, :] + ion['F'] + electron['F'],
+                'E': cold_energy[:, np.newaxis, :] + ion['E'] + electron['E'],
+                'P': cold_pressure[:, np.newaxis, :] + ion['P'] + electron['P'],
+                'S': ion['S'] + electron['S']}
+
+    def densities_to_volumes(self, densities):
+        """Converts densities in g/cc to volumes in A^3/atom, and back, since the conversion is its own inverse"""
+        return self.atomic_mass * AMU_TO_GRAM * 1e24 / np.asarray(densities, dtype=np.float64)
+
+    def evaluate_eos(self, densities, temperatures):
+        """Pressures and energies of every sample in EosTable units
+
+        Args:
+            densities (numpy.array): Shape (NR,) in g/cc
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+
+        Returns:
+            pressures (numpy.array): Shape (n_samples, NT, NR) in GPa
+            energies (numpy.array): Shape (n_samples, NT, NR) in erg/g
+        """
+        eos = self.evaluate(self.densities_to_volumes(densities), temperatures)
+        return eos['P'], eos['E'] * EV_TO_ERG / (self.atomic_mass * AMU_TO_GRAM)
+
+    def to_eos_tables(self, densities, temperatures, eos_number=90000, material_name='Carbon',
+                      atomic_number=CARBON_ATOMIC_NUMBER, ambient_density=None):
+        """One EosTable per sample on a density and temperature grid
+
+        Args:
+            densities (numpy.array): Shape (NR,) in g/cc
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+            eos_number (int, optional): Hyades EOS number written in the table header
+            material_name (string, optional): Name of the material
+            atomic_number (float, optional): Average atomic number of the material
+            ambient_density (float, optional): Ambient density in g/cc, defaults to the density at V0 of each sample
+
+        Returns:
+            eos_tables (list): EosTable objects
+        """
+        densities = np.asarray(densities, dtype=np.float64)
+        temperatures = np.asarray(temperatures, dtype=np.float64)
+        pressures, energies = self.evaluate_eos(densities, temperatures)
+        if ambient_density is None:
+            ambient_density = self.densities_to_volumes(self.parameters['V0'])
+        ambient_density = np.broadcast_to(ambient_density, (self.n_samples,))
+
+        eos_tables = []
+        for i in range(self.n_samples):
+            info = {
+                'Ambient Density': float(ambient_density[i]),
+                'Average Atomic Mass': self.atomic_mass,
+                'Average Atomic Number': atomic_number,
+                'Date Created': '{:%m/%d/%Y}'.format(datetime.date.today()),
+                'EOS Number': eos_number,
+                'Material Name': material_name,
+                'Notes': f'{material_name} REODP model sample {i}'
+            }
+            eos_tables.append(EosTable(material_name=material_name, info=info,
+                                       pressure_eos=pd.DataFrame(pressures[i], index=temperatures, columns=densities),
+                                       energy_eos=pd.DataFrame(energies[i], index=temperatures, columns=densities),
+                                       temperatures=temperatures, densities=densities))
+        return eos_tables
+
+
+def read_reodp_table(filename):
+    """Reads a fixed-width Hyades table converted from REODP output, with its columns in order of increasing density
+
+    Note:
+        REODP writes its tables on a uniform volume grid in order of increasing volume, so the columns of a converted
+        table are in order of decreasing density. The bundled tables head these columns in two ways.
+        REODP_diamond_eos_all_phases.txt heads them with the volumes in A^3/atom, a uniform grid within the volume
+        range of REODP, and such a header is converted to densities. REODP_diamond_eos.txt heads them with densities
+        sorted in increasing order, while its columns stay in order of increasing volume, and any such header is
+        paired with the columns in reverse.
+        Either way the pressures of the coldest isotherm must then rise with density.
+
+    Args:
+        filename (string): Table such as EosTablesIO/data/REODP/REODP_diamond_eos_all_phases.txt
+
+    Returns:
+        eos_table (EosTable): Table with increasing densities in g/cc
+
+    Raises:
+        ValueError: If the header is not increasing or the pressures do not rise with density once it is read
+    """
+    table = EosTable.from_fixed_width_hyades_eos(filename)
+    header = np.asarray(table.densities, dtype=np.float64)
+    pressures = table.pressure_eos.to_numpy(dtype=np.float64)
+    energies = table.energy_eos.to_numpy(dtype=np.float64)
+    if len(header) < 2 or np.any(np.diff(header) <= 0):
+        raise ValueError(f'The density header of {filename} is not increasing: {header}')
+
+    spacing = np.diff(header)
+    min_volume, max_volume = REODP_VOLUME_RANGE
+    if header[0] >= min_volume and header[-1] <= max_volume and np.allclose(spacing, spacing[0], rtol=1e-6):
+        volume_header = True
+        densities = table.info['Average Atomic Mass'] * AMU_TO_GRAM * 1e24 / header
+    else:
+        volume_header = False
+        densities = header[::-1]
+    order = np.argsort(densities)
+    densities, pressures, energies = densities[order], pressures[:, order], energies[:, order]
+
+    coldest = pressures[np.argmin(table.temperatures)]
+    if coldest[-1] <= coldest[0]:
+        raise ValueError(f'The pressures of {filename} fall from {coldest[0]} to {coldest[-1]} GPa with density on '
+                         f'the coldest isotherm once its header is read as '
+                         f'{"volumes" if volume_header else "densities"}')
+
+    temperatures = np.asarray(table.temperatures, dtype=np.float64)
+    pressure_eos = pd.DataFrame(pressures, index=pd.Index(temperatures, name=table.pressure_eos.index.name),
+                                columns=pd.Index(densities, name='Density (g/cc)'))
+    energy_eos = pd.DataFrame(energies, index=pd.Index(temperatures, name=table.energy_eos.index.name),
+                              columns=pd.Index(densities, name='Density (g/cc)'))
+    return EosTable(material_name=table.material_name, info=table.info, pressure_eos=pressure_eos,
+                    energy_eos=energy_eos, temperatures=temperatures, densities=densities)
+
+
+def solid_phase_names(volumes):
+    """Solid phase of Initial.dat whose interval between PHASE_INTERFACE_VOLUMES holds each volume
+
+    Note:
+        REODP takes the solid phase of a volume from the interface volumes of Initial.dat, sh below the sh-sc
+        interface up to diamond above the BC8-diamond interface, rather than from the least free energy.
+
+    Args:
+        volumes (numpy.array): Shape (NV,) in A^3/atom
+
+    Returns:
+        names (numpy.array): Shape (NV,), keys of SOLID_PHASES
+    """
+    return np.array(SOLID_PHASE_ORDER)[np.searchsorted(PHASE_INTERFACE_VOLUMES, volumes, side='right')]
+
+
+def compare_to_reference(filename, parameters=None, min_volume=REODP_VOLUME_RANGE[0],
+                         max_volume=REODP_VOLUME_RANGE[1]):
+    """Misfit of the model against a fixed-width Hyades EOS table converted from REODP output
+
+    Note:
+        The table is read with read_reodp_table. Only the grid points whose volume lies within the REODP volume range,
+        by default 1.0 to 5.7 A^3/atom, are compared. Energies are compared after removing the mean offset of each
+        sample, since the energy zero of a Hyades table is arbitrary.
+        The bundled tables are not consistent to better than tens of GPa themselves: the pressures of
+        REODP_diamond_eos_all_phases.txt differ from -dE/dV of its energies by up to about 100 GPa, and its 300 K
+        pressures level off at about 60 GPa towards the zero pressure volume of diamond. No smooth model fits them
+        to within that.
+
+    Args:
+        filename (string): Reference table, such as EosTablesIO/data/REODP/REODP_diamond_eos_all_phases.txt
+        parameters (dict or numpy.array, optional): Model parameters, see ReodpModel. Defaults to the phases of
+                                                    SOLID_PHASES, each over its volumes, see solid_phase_names
+        min_volume (float, optional): Smallest volume compared in A^3/atom
+        max_volume (float, optional): Largest volume compared in A^3/atom
+
+    Returns:
+        scores (pandas.DataFrame): One row per sample with rms_P and max_abs_P in GPa, rms_rel_P, rms_E in erg/g
+                                   after the offset is removed, the energy offset E_offset, and the number of
+                                   points compared
+    """
+    reference = read_reodp_table(filename)
+    atomic_mass = reference.info['Average Atomic Mass']
+    densities = np.asarray(reference.densities, dtype=np.float64)
+    temperatures = np.asarray(reference.temperatures, dtype=np.float64)
+    volumes = atomic_mass * AMU_TO_GRAM * 1e24 / densities
+    inside = (volumes >= min_volume) & (volumes <= max_volume)
+    if not inside.any():
+        raise ValueError(f'No density of {filename} lies within {min_volume} to {max_volume} A^3/atom')
+
+    if parameters is None:
+        names = solid_phase_names(volumes[inside])
+        pressures = np.empty((1, len(temperatures), inside.sum()))
+        energies = np.empty_like(pressures)
+        for name in np.unique(names):
+            model = ReodpModel(SOLID_PHASES[name], atomic_mass=atomic_mass)
+            columns = names == name
+            pressures[..., columns], energies[..., columns] = model.evaluate_eos(densities[inside][columns],
+                                                                                 temperatures)
+    else:
+        model = ReodpModel(parameters, atomic_mass=atomic_mass)
+        pressures, energies = model.evaluate_eos(densities[inside], temperatures)
+    reference_pressures = reference.pressure_eos.to_numpy(dtype=np.float64)[np.newaxis, :, inside]
+    reference_energies = reference.energy_eos.to_numpy(dtype=np.float64)[np.newaxis, :, inside]
+
+    pressure_error = pressures - reference_pressures
+    energy_offset = (energies - reference_energies).mean(axis=(1, 2))
+    energy_error = energies - reference_energies - energy_offset[:, np.newaxis, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(reference_pressures != 0, pressure_error / reference_pressures, np.nan)
+
+    return pd.DataFrame({'rms_P': np.sqrt(np.mean(pressure_error ** 2, axis=(1, 2))),
+                         'max_abs_P': np.abs(pressure_error).max(axis=(1, 2)),
+                         'rms_rel_P': np.sqrt(np.nanmean(relative ** 2, axis=(1, 2))),
+                         'rms_E': np.sqrt(np.mean(energy_error ** 2, axis=(1, 2))),
+                         'E_offset': energy_offset,
+                         'n_points': inside.sum() * len(temperatures)})
+
+
+def assemble_reodp_phases(densities, temperatures, liquid_parameters=None, phases=None, eos_number=90000,
+                          melting_temperature=MELTING_TEMPERATURE):
+    """Multi-phase carbon tables from the solid phases of Initial.dat and, optionally, a batch of liquid samples
+
+    Note:
+        Phases are laid out the way REODP lays them out: below the melting temperature every cell takes the solid
+        phase whose interval between PHASE_INTERFACE_VOLUMES holds its volume, see solid_phase_names, and at or
+        above it the liquid. Without liquid_parameters the solid phases continue above the melting temperature.
+        Volumes outside the REODP volume range take the nearest solid phase. The solid phases are shared by every
+        liquid sample. See EosTablesIO.phaseAssembly.assemble_phases for picking phases by least free energy instead.
+
+    Args:
+        densities (numpy.array): Shape (NR,) in g/cc
+        temperatures (numpy.array): Shape (NT,) in Kelvin
+        liquid_parameters (dict or numpy.array, optional): Parameters of the liquid phase, see ReodpModel, such as
+                                                           the samples of ReodpEosGenerator. No liquid if None
+        phases (dict, optional): Parameters of the solid phases, keyed like SOLID_PHASES, defaults to SOLID_PHASES
+        eos_number (int, optional): Hyades EOS number written in the table header
+        melting_temperature (float, optional): Temperature in Kelvin from which the liquid replaces the solids
+
+    Returns:
+        eos_tables (EosTable or list): One EosTable, or one per liquid sample if liquid_parameters has several
+        phase_maps (pandas.DataFrame or list): Index into phase_names of the phase in every cell
+        phase_names (list): Names of the phases, the solids followed by liquid
+    """
+    densities = np.asarray(densities, dtype=np.float64)
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    phases = {**SOLID_PHASES, **(phases or {})}
+    models = {name: ReodpModel(phases[name]) for name in SOLID_PHASE_ORDER}
+    if liquid_parameters is not None:
+        models['liquid'] = ReodpModel(liquid_parameters)
+
+    grids = {}
+    for name, model in models.items():
+        eos = model.evaluate(model.densities_to_volumes(densities), temperatures)
+        if model.n_samples == 1:  # a single sample is shared by every table
+            eos = {key: value[0] for key, value in eos.items()}
+        grids[name] = {'F': eos['F'], 'P': eos['P'], 'E': eos['E'] * EV_TO_ERG / (model.atomic_mass * AMU_TO_GRAM)}
+
+    phase_names = list(grids)
+    solid_index = np.array([phase_names.index(name) for name in
+                            solid_phase_names(models['diamond'].densities_to_volumes(densities))])
+    phase_index = np.broadcast_to(solid_index, (len(temperatures), len(densities)))
+    if liquid_parameters is not None:
+        phase_index = np.where((temperatures >= melting_temperature)[:, np.newaxis], phase_names.index('liquid'),
+                               phase_index)
+
+    diamond = ReodpModel(SOLID_PHASES['diamond'])
+    info = {
+        'Ambient Density': float(diamond.densities_to_volumes(diamond.parameters['V0'][0])),
+        'Average Atomic Mass': CARBON_ATOMIC_MASS,
+        'Average Atomic Number': CARBON_ATOMIC_NUMBER,
+        'Date Created': '{:%m/%d/%Y}'.format(datetime.date.today()),
+        'EOS Number': eos_number,
+        'Material Name': 'Carbon',
+        'Notes': 'Carbon REODP model'
+    }
+    return assemble_phases(densities, temperatures, grids, material_name='Carbon', info=info,
+                           phase_index=phase_index)
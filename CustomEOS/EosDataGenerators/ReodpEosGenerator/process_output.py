@@ -4,16 +4,31 @@ import fire
 
 
 def read_output(index):
-    with open(f'./OutputFiles/TotalEOS_{index}.dat') as f:
-        lines = f.readlines()
+    """Reads the total pressures and energies REODP wrote to OutputFiles/TotalEOS_{index}.dat
 
-    index_volume_point = 0
+    Note:
+        TotalEOS.dat has 10 header lines, then one line per volume and temperature with the volume [A^3/atom],
+        density [g/cm^3], temperature [K], free energy [eV/atom], internal energy [eV/atom], pressure [GPa] and
+        entropy [eV/K]. The lines are gathered into tables by their density and temperature, whatever their order.
 
-    volume=float(lines[10+index_volume_point].split()[0])
-    total_free_energy=float(lines[10+index_volume_point].split()[3])
-    total_internal_energy=float(lines[10+index_volume_point].split()[4])
-    total_pressure=float(lines[10+index_volume_point].split()[5])
-    total_entropy=float(lines[10+index_volume_point].split()[6])
-    print(f"volume: {volume}, free_energy: {total_free_energy}, internal_energy: {total_internal_energy}, pressure: {total_pressure}, total_entropy:{total_entropy}")
+    Returns:
+        densities (numpy.array): Shape (NR,) in g/cc, increasing
+        temperatures (numpy.array): Shape (NT,) in Kelvin, increasing
+        pressures (numpy.array): Shape (NT, NR) in GPa
+        energies (numpy.array): Shape (NT, NR) in eV/atom
+    """
+    filename = f'./OutputFiles/TotalEOS_{index}.dat'
+    data = np.atleast_2d(np.loadtxt(filename, skiprows=10, usecols=(1, 2, 4, 5)))
+    densities, density_index = np.unique(data[:, 0], return_inverse=True)
+    temperatures, temperature_index = np.unique(data[:, 1], return_inverse=True)
+    if len(data) != len(densities) * len(temperatures):
+        raise ValueError(f'{filename} has {len(data)} points, not one for each of its {len(densities)} densities '
+                         f'and {len(temperatures)} temperatures')
 
-    return total_pressure
\ No newline at end of file
+    pressures = np.empty((len(temperatures), len(densities)))
+    energies = np.empty_like(pressures)
+    pressures[temperature_index, density_index] = data[:, 3]
+    energies[temperature_index, density_index] = data[:, 2]
+    print(f"{filename}: {len(densities)} densities, {len(temperatures)} temperatures")
+
+    return densities, temperatures, pressures, energies
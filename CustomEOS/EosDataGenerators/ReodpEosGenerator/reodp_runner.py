@@ -4,7 +4,10 @@ from os.path import dirname
 import os.path
 from os import path
 import subprocess
+from process_monitor import run_monitored
+from stage_profiler import profiled
 
+@profiled('reodp_run')
 def reodp_run(index):
     ## Copy REODP Input file to the correct folder
     name_ = 'Initial_' + str(index) + '.dat'
@@ -23,7 +26,7 @@ def reodp_run(index):
 
     ## Execute REODP 
     print(f"Executing run #{index}")
-    subprocess.call('REODP-v4.exe')
+    run_monitored('REODP-v4.exe', label='REODP')
     # os.system("./REODP-v4.out")
 
     os.makedirs("OutputFiles", exist_ok=True)
@@ -105,10 +105,11 @@ class EosTable:
             6 not used
 
         Returns:
+            material_name (string), info (dict)
 
         """
         with open(filename) as f:
-            lines = f.readlines()
+            lines = [f.readline(), f.readline()]  # the information is all in the two header lines
 
         info = {
             'Ambient Density': np.nan,
@@ -208,6 +209,109 @@ class EosTable:
         return temperatures, densities, df_pressure, df_energy
 
 
+    def splice(self, sub_table, density_range=None, temperature_range=None, blend_fraction=0.1, align_energy=True):
+        """Overlays a sub-table, such as a REODP diamond table, onto this table over a density and temperature window
+
+        Note:
+            The sub-table is interpolated onto the grid of this table inside the window with regrid_eos, and blended
+            in with a weight that rises smoothly from 0 at the window edge to 1 inside it, so the spliced table has
+            no step at the boundary. The weight is a product of quintic smoothsteps in log density and log
+            temperature, each rising over blend_fraction of the window on that axis. A side of the window that
+            reaches the edge of this table is not blended, since there is nothing outside it to blend with.
+            Tables from different models rarely share an energy zero, so by default the energies of sub_table are
+            shifted by their mean difference from this table along the coldest row of the window before blending.
+            The grid and info of this table are kept, so the result is ready for write_eos.
+
+        Args:
+            sub_table (EosTable or EOSTable): Table to overlay
+            density_range (tuple, optional): (min, max) density of the window in g/cc, defaults to the range of
+                                             sub_table
+            temperature_range (tuple, optional): (min, max) temperature of the window in Kelvin, defaults to the
+                                                 range of sub_table
+            blend_fraction (float, optional): Fraction of the window, per axis and in log space, over which
+                                              sub_table is blended in
+            align_energy (bool, optional): Toggle to shift the energies of sub_table onto the energy zero of this
+                                           table
+
+        Returns:
+            eos_table (EosTable): New table on the grid of this table
+        """
+        from EosTablesIO.regridEOS import regrid_eos  # regridEOS imports EosTable
+
+        sub_densities = np.asarray(sub_table.pressure_eos.columns, dtype=np.float64)
+        sub_temperatures = np.asarray(sub_table.pressure_eos.index, dtype=np.float64)
+        if density_range is None:
+            density_range = (sub_densities.min(), sub_densities.max())
+        if temperature_range is None:
+            temperature_range = (sub_temperatures.min(), sub_temperatures.max())
+        density_range = (max(density_range[0], sub_densities.min()), min(density_range[1], sub_densities.max()))
+        temperature_range = (max(temperature_range[0], sub_temperatures.min()),
+                             min(temperature_range[1], sub_temperatures.max()))
+
+        densities = np.asarray(self.pressure_eos.columns, dtype=np.float64)
+        temperatures = np.asarray(self.pressure_eos.index, dtype=np.float64)
+        in_density = (densities >= density_range[0]) & (densities <= density_range[1])
+        in_temperature = (temperatures >= temperature_range[0]) & (temperatures <= temperature_range[1])
+        if not in_density.any() or not in_temperature.any():
+            raise ValueError(f'The window {density_range} g/cc x {temperature_range} K contains no point of the grid')
+
+        weights = EosTable.splice_weights(densities, temperatures, density_range, temperature_range, blend_fraction)
+        overlay = regrid_eos(sub_table, densities[in_density], temperatures[in_temperature])
+        window = np.ix_(in_temperature, in_density)
+        w = weights[window]
+        pressures = self.pressure_eos.to_numpy(dtype=np.float64, copy=True)
+        energies = self.energy_eos.to_numpy(dtype=np.float64, copy=True)
+        overlay_energies = overlay.energy_eos.to_numpy()
+        if align_energy:
+            overlay_energies = overlay_energies + np.mean(energies[window][0] - overlay_energies[0])
+        pressures[window] = (1 - w) * pressures[window] + w * overlay.pressure_eos.to_numpy()
+        energies[window] = (1 - w) * energies[window] + w * overlay_energies
+
+        info = dict(self.info)
+        info['Notes'] = f"{info['Notes']} spliced with {sub_table.material_name} over " \
+                        f"{density_range[0]:.4g}-{density_range[1]:.4g} g/cc, " \
+                        f"{temperature_range[0]:.4g}-{temperature_range[1]:.4g} K".strip()
+        return EosTable(material_name=self.material_name, info=info,
+                        pressure_eos=pd.DataFrame(pressures, index=self.pressure_eos.index,
+                                                  columns=self.pressure_eos.columns),
+                        energy_eos=pd.DataFrame(energies, index=self.energy_eos.index,
+                                                columns=self.energy_eos.columns),
+                        temperatures=temperatures, densities=densities)
+
+    @staticmethod
+    def splice_weights(densities, temperatures, density_range, temperature_range, blend_fraction=0.1):
+        """Weight of the overlaid table at every grid point of a splice, see EosTable.splice
+
+        Args:
+            densities (numpy.array): Shape (NR,) in g/cc
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+            density_range (tuple): (min, max) density of the window in g/cc
+            temperature_range (tuple): (min, max) temperature of the window in Kelvin
+            blend_fraction (float, optional): Fraction of the window, per axis and in log space, blended over
+
+        Returns:
+            weights (numpy.array): Shape (NT, NR), 0 outside the window and 1 deep inside it
+        """
+        from EosTablesIO.regridEOS import _log_shift  # regridEOS imports EosTable
+
+        shift = _log_shift(temperatures)  # log(T + T1) with a 0 K row
+        density_shift = _log_shift(densities)  # log(rho + rho1) with a 0 g/cc column
+
+        def ramp(grid, window):
+            x, low, high = np.log(grid), np.log(window[0]), np.log(window[1])
+            width = blend_fraction * (high - low)
+            inside = (x >= low) & (x <= high)
+            if width <= 0:
+                return inside.astype(np.float64)
+            rise = np.ones_like(x) if window[0] <= grid.min() else np.clip((x - low) / width, 0, 1)
+            fall = np.ones_like(x) if window[1] >= grid.max() else np.clip((high - x) / width, 0, 1)
+            t = rise * fall
+            return np.where(inside, t ** 3 * (10 - 15 * t + 6 * t ** 2), 0.0)  # quintic smoothstep
+
+        return ramp(temperatures + shift, (temperature_range[0] + shift, temperature_range[1] + shift))[:, np.newaxis] \
+            * ramp(densities + density_shift, (density_range[0] + density_shift,
+                                               density_range[1] + density_shift))[np.newaxis, :]
+
     def write_eos(self, output_filename, verbose=False):
         """Function to read in one EOS file and output a new EOS formatted for use with Hyades
 
@@ -256,7 +360,8 @@ class EosTable:
                     f"according to Appendix III of the Hyades User Guide."
         assert len(str(self.info['EOS Number'])) <= 5, error_string
         error_string = f"The total number of data points {total_data_length} is too large. It must be " \
-                    f"5 digits (99999 data points) or fewer according to Appendix III of the Hyades User Guide."
+                    f"5 digits (99999 data points) or fewer according to Appendix III of the Hyades User Guide. " \
+                    f"EosTablesIO.regridEOS.regrid_eos can resample the table onto a grid that fits."
         assert len(str(total_data_length)) <= 5, error_string
         formatted_eos_number = str(self.info['EOS Number']).rjust(5, ' ')
         formatted_material_properties = f" {self.info['Average Atomic Number']:.8E}" \
@@ -0,0 +1,264 @@
+"""PCA-compressed ensemble of EOS tables: a mean table, k principal components and k coefficients per sample
+
+The tables of a perturbed-parameter ensemble are highly correlated, so a few components reproduce every table to within
+a set error. Samples that the components do not reproduce to within that error keep their full residual, so the bound
+holds for every sample, not only on average. Tables are reconstructed one at a time, on access.
+"""
+import json
+import numpy as np
+from EosTablesIO.ensembleStore import FIELDS, json_info, table_from_arrays
+
+
+class CompressedEosEnsemble:
+    """Ensemble of pressure and energy tables on one grid, stored as a mean plus principal components
+
+    Note:
+        The error of a cell is its absolute reconstruction error divided by the scale of its field, the largest
+        magnitude of that field in the mean table. The tolerance bounds the largest error over every cell of every
+        sample.
+
+    Attributes:
+        densities (numpy.array): Shape (NR,) in g/cc
+        temperatures (numpy.array): Shape (NT,) in Kelvin
+        tolerance (float): Bound on the scaled reconstruction error of any cell
+        n_components (int): Number of principal components kept
+        coefficients (numpy.array): Shape (n_samples, n_components)
+        errors (numpy.array): Shape (n_samples,), largest scaled error of each sample from the components alone
+        parameters (numpy.array): Shape (n_samples, n_parameters), may have no columns
+        parameter_names (list): Names of the parameters, may be empty
+        info (dict): Info of the tables, used by to_eos_table
+
+    """
+    def __init__(self, densities, temperatures, mean, components, coefficients, scales, tolerance,
+                 residual_indices=None, residuals=None, errors=None, parameters=None, parameter_names=None,
+                 info=None) -> None:
+        self.densities = np.asarray(densities, dtype=np.float64)
+        self.temperatures = np.asarray(temperatures, dtype=np.float64)
+        self._mean = np.asarray(mean, dtype=np.float64)
+        self._components = np.asarray(components, dtype=np.float64)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self._scales = np.asarray(scales, dtype=np.float64)
+        self.tolerance = tolerance
+        self.n_components = len(self._components)
+        n_features = self._mean.size
+        self._residual_indices = np.zeros(0, dtype=np.int64) if residual_indices is None \
+            else np.asarray(residual_indices, dtype=np.int64)
+        self._residuals = np.zeros((0, n_features)) if residuals is None else np.asarray(residuals, dtype=np.float64)
+        self._residual_rows = {int(index): row for row, index in enumerate(self._residual_indices)}
+        self.errors = np.zeros(len(self.coefficients)) if errors is None else np.asarray(errors, dtype=np.float64)
+        self.parameters = np.empty((len(self.coefficients), 0)) if parameters is None \
+            else np.asarray(parameters, dtype=np.float64).reshape(len(self.coefficients), -1)
+        self.parameter_names = list(parameter_names) if parameter_names is not None else []
+        self.info = json_info(info)
+
+    @classmethod
+    def from_arrays(cls, densities, temperatures, pressures, energies, parameters=None, tolerance=1e-3,
+                    max_components=None, **kwargs):
+        """Compresses an ensemble held in memory
+
+        Args:
+            densities (numpy.array): Shape (NR,) in g/cc
+            temperatures (numpy.array): Shape (NT,) in Kelvin
+            pressures (numpy.array): Shape (n_samples, NT, NR) in GPa
+            energies (numpy.array): Same shape as pressures, in erg/g
+            parameters (numpy.array, optional): Shape (n_samples, n_parameters)
+            tolerance (float, optional): Bound on the scaled reconstruction error of any cell
+            max_components (int, optional): Largest number of components, defaults to no limit
+            **kwargs: parameter_names and info
+
+        Returns:
+            ensemble (CompressedEosEnsemble)
+        """
+        pressures = np.asarray(pressures, dtype=np.float64)
+        energies = np.asarray(energies, dtype=np.float64).reshape(pressures.shape)
+        mean, components, scales = _fit_components(pressures, energies, tolerance, max_components)
+        ensemble = cls(densities, temperatures, mean, components, np.zeros((0, len(components))), scales, tolerance,
+                       **kwargs)
+        ensemble._extend(pressures, energies)
+        ensemble.parameters = np.empty((len(pressures), 0)) if parameters is None \
+            else np.asarray(parameters, dtype=np.float64).reshape(len(pressures), -1)
+        return ensemble
+
+    @classmethod
+    def from_store(cls, store, tolerance=1e-3, max_components=None, n_fit=1000, seed=None):
+        """Compresses an EosEnsembleStore one chunk at a time
+
+        Note:
+            The components are fit to a random subset of n_fit samples, then every sample is projected onto them
+            chunk by chunk. Samples the components do not reproduce to within tolerance keep their full residual.
+
+        Args:
+            store (EosEnsembleStore): Store to compress
+            tolerance (float, optional): Bound on the scaled reconstruction error of any cell
+            max_components (int, optional): Largest number of components, defaults to no limit
+            n_fit (int, optional): Number of samples the components are fit to
+            seed (int, optional): Seed of the choice of fitting samples
+
+        Returns:
+            ensemble (CompressedEosEnsemble)
+        """
+        if not len(store):
+            raise ValueError('The ensemble store is empty')
+        rng = np.random.default_rng(seed)
+        fit_indices = np.sort(rng.choice(len(store), size=min(n_fit, len(store)), replace=False))
+        samples = [store.read(int(index)) for index in fit_indices]
+        mean, components, scales = _fit_components(np.stack([sample[0] for sample in samples]),
+                                                   np.stack([sample[1] for sample in samples]),
+                                                   tolerance, max_components)
+        del samples
+        ensemble = cls(store.densities, store.temperatures, mean, components, np.zeros((0, len(components))),
+                       scales, tolerance, parameter_names=store.parameter_names, info=store.info)
+        for (_, pressures), (_, energies) in zip(store.iter_chunks('pressures'), store.iter_chunks('energies')):
+            ensemble._extend(np.asarray(pressures), np.asarray(energies))
+        ensemble.parameters = store.parameters()
+        return ensemble
+
+    def _extend(self, pressures, energies):
+        """Projects a batch of tables onto the components and appends their coefficients and residuals"""
+        tables = self._flatten(pressures, energies) - self._mean
+        coefficients = tables @ self._components.T
+        residuals = tables - coefficients @ self._components
+        errors = np.abs(residuals).max(axis=1) if residuals.size else np.zeros(len(tables))
+        errors = np.where(np.isnan(errors), np.inf, errors)
+        exceeded = np.flatnonzero(errors > self.tolerance)
+        start = len(self.coefficients)
+        for row, index in enumerate(exceeded, start=len(self._residual_indices)):
+            self._residual_rows[int(start + index)] = row
+        self._residual_indices = np.concatenate([self._residual_indices, start + exceeded])
+        self._residuals = np.concatenate([self._residuals, residuals[exceeded]])
+        self.coefficients = np.concatenate([self.coefficients, coefficients])
+        self.errors = np.concatenate([self.errors, errors])
+
+    def _flatten(self, pressures, energies):
+        n_cells = len(self.temperatures) * len(self.densities)
+        return np.concatenate([np.reshape(pressures, (-1, n_cells)) / self._scales[0],
+                               np.reshape(energies, (-1, n_cells)) / self._scales[1]], axis=1)
+
+    def __len__(self):
+        return len(self.coefficients)
+
+    @property
+    def n_residuals(self):
+        """Number of samples stored with their full residual"""
+        return len(self._residual_indices)
+
+    @property
+    def compression_ratio(self):
+        """Size of the full float64 tables over the size of the compressed arrays"""
+        n_features = self._mean.size
+        full = len(self) * n_features
+        compressed = n_features * (1 + self.n_components) + self.coefficients.size + self._residuals.size
+        return full / compressed
+
+    def reconstruct(self, indices):
+        """Pressures and energies of several samples
+
+        Args:
+            indices (list or numpy.array): Sample indices
+
+        Returns:
+            pressures (numpy.array): Shape (len(indices), NT, NR) in GPa
+            energies (numpy.array): Shape (len(indices), NT, NR) in erg/g
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if np.any((indices < -len(self)) | (indices >= len(self))):
+            raise IndexError(f'Sample indices out of range for an ensemble of {len(self)} samples')
+        indices = indices % len(self)
+        tables = self._mean + self.coefficients[indices] @ self._components
+        for row, index in enumerate(indices):
+            if int(index) in self._residual_rows:
+                tables[row] += self._residuals[self._residual_rows[int(index)]]
+        shape = (len(indices), len(self.temperatures), len(self.densities))
+        n_cells = shape[1] * shape[2]
+        return (tables[:, :n_cells].reshape(shape) * self._scales[0],
+                tables[:, n_cells:].reshape(shape) * self._scales[1])
+
+    def read(self, index):
+        """Pressures, energies and parameters of one sample, like EosEnsembleStore.read"""
+        pressures, energies = self.reconstruct([index])
+        return pressures[0], energies[0], self.parameters[index] if self.parameters.shape[1] else None
+
+    def __getitem__(self, index):
+        return self.to_eos_table(index)
+
+    def to_eos_table(self, index, material_name=None):
+        """One sample as an EosTable, with the info of the ensemble"""
+        pressures, energies, _ = self.read(index)
+        return table_from_arrays(self.densities, self.temperatures, pressures, energies, self.info, material_name)
+
+    def mean_std(self, field='pressures'):
+        """Mean and standard deviation over the ensemble of every cell, from the coefficients
+
+        Note:
+            Only the components enter, so the residuals of samples outside the tolerance are left out and the values
+            are within the tolerance of those of the full ensemble for every sample the components reproduce.
+
+        Returns:
+            mean (numpy.array): Shape (NT, NR)
+            std (numpy.array): Shape (NT, NR), sample standard deviation, NaN with fewer than two samples
+        """
+        if field not in FIELDS:
+            raise ValueError(f'Unrecognized field: {field!r}. Options are {FIELDS}')
+        shape = (len(self.temperatures), len(self.densities))
+        n_cells = shape[0] * shape[1]
+        cells = slice(0, n_cells) if field == 'pressures' else slice(n_cells, 2 * n_cells)
+        scale = self._scales[FIELDS.index(field)]
+        components = self._components[:, cells]
+        mean = (self._mean[cells] + self.coefficients.mean(axis=0) @ components) * scale
+        if len(self) < 2:
+            return mean.reshape(shape), np.full(shape, np.nan)
+        covariance = np.atleast_2d(np.cov(self.coefficients, rowvar=False))
+        variance = np.einsum('if,ij,jf->f', components, covariance, components)
+        return mean.reshape(shape), (np.sqrt(np.maximum(variance, 0)) * scale).reshape(shape)
+
+    def save(self, filename):
+        """Saves the compressed ensemble to a .npz file"""
+        np.savez(filename, densities=self.densities, temperatures=self.temperatures, mean=self._mean,
+                 components=self._components, coefficients=self.coefficients, scales=self._scales,
+                 tolerance=self.tolerance, residual_indices=self._residual_indices, residuals=self._residuals,
+                 errors=self.errors, parameters=self.parameters, parameter_names=np.asarray(self.parameter_names),
+                 info=json.dumps(self.info, default=str))
+
+    @classmethod
+    def load(cls, filename):
+        """Loads an ensemble written by CompressedEosEnsemble.save"""
+        with np.load(filename) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(arrays['densities'], arrays['temperatures'], arrays['mean'], arrays['components'],
+                   arrays['coefficients'], arrays['scales'], arrays['tolerance'].item(),
+                   residual_indices=arrays['residual_indices'], residuals=arrays['residuals'],
+                   errors=arrays['errors'], parameters=arrays['parameters'],
+                   parameter_names=arrays['parameter_names'].tolist(), info=json.loads(arrays['info'].item()))
+
+
+def _fit_components(pressures, energies, tolerance, max_components=None):
+    """Mean, principal components and field scales of the fewest components that reproduce every fitting sample
+
+    Returns:
+        mean (numpy.array): Shape (2 NT NR,), scaled mean table, pressures then energies
+        components (numpy.array): Shape (n_components, 2 NT NR)
+        scales (numpy.array): Shape (2,), largest magnitude of the mean pressure and mean energy
+    """
+    n_samples = len(pressures)
+    scales = np.array([np.nanmax(np.abs(pressures.mean(axis=0))), np.nanmax(np.abs(energies.mean(axis=0)))])
+    scales[~(scales > 0)] = 1.0
+    tables = np.concatenate([pressures.reshape(n_samples, -1) / scales[0],
+                             energies.reshape(n_samples, -1) / scales[1]], axis=1)
+    mean = tables.mean(axis=0)
+    u, s, vt = np.linalg.svd(tables - mean, full_matrices=False)
+    largest = len(s) if max_components is None else min(max_components, len(s))
+
+    def max_error(k):
+        return np.abs(tables - mean - (u[:, :k] * s[:k]) @ vt[:k]).max()
+
+    # Binary search for the fewest components within tolerance, the error falls (nearly) monotonically with k
+    low, high = 0, largest
+    if max_error(high) > tolerance:
+        low = high
+    while low < high:
+        middle = (low + high) // 2
+        if max_error(middle) <= tolerance:
+            high = middle
+        else:
+            low = middle + 1
+    return mean, vt[:high], scales
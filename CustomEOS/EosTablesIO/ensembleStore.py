@@ -0,0 +1,284 @@
+"""Chunked, memory-mapped on-disk store of an ensemble of EOS tables and the parameter vectors that generated them
+
+A store is a directory holding a manifest.json and, for every chunk of chunk_size samples, raw .npy files
+pressures_{chunk}.npy and energies_{chunk}.npy of shape (chunk_size, NT, NR) and parameters_{chunk}.npy of shape
+(chunk_size, n_parameters). The .npy files are opened as memory maps, so appending a table writes only that table and
+statistics read one block at a time, never the whole ensemble.
+"""
+import os
+import json
+import threading
+import numpy as np
+import pandas as pd
+from EosTablesIO.EosTable import EosTable
+
+MANIFEST_FILENAME = 'manifest.json'
+FIELDS = ('pressures', 'energies')
+
+
+class EosEnsembleStore:
+    """Appendable ensemble of pressure and energy tables on one density and temperature grid
+
+    Attributes:
+        directory (string): Directory of the store
+        densities (numpy.array): Shape (NR,) in g/cc
+        temperatures (numpy.array): Shape (NT,) in Kelvin
+        n_parameters (int): Length of the parameter vector stored with every table, 0 for none
+        parameter_names (list): Names of the parameters, may be empty
+        chunk_size (int): Samples per chunk file
+        info (dict): Info of the tables, used by to_eos_table
+        n_samples (int): Number of tables in the store
+
+    """
+    def __init__(self, directory, densities=None, temperatures=None, n_parameters=0, parameter_names=None,
+                 chunk_size=256, info=None) -> None:
+        """
+        Args:
+            directory (string): Directory of the store. An existing store is opened, otherwise one is created
+            densities (numpy.array, optional): Shape (NR,) in g/cc, needed to create a store
+            temperatures (numpy.array, optional): Shape (NT,) in Kelvin, needed to create a store
+            n_parameters (int, optional): Length of the parameter vector stored with every table
+            parameter_names (list, optional): Names of the parameters, sets n_parameters if given
+            chunk_size (int, optional): Samples per chunk file
+            info (dict, optional): Info of the tables, such as the info of the template EosTable
+        """
+        self.directory = os.path.abspath(directory)
+        self._lock = threading.Lock()
+        self._open_chunks = {}
+        manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            self.densities = np.array(manifest['densities'])
+            self.temperatures = np.array(manifest['temperatures'])
+            self.n_parameters = manifest['n_parameters']
+            self.parameter_names = manifest['parameter_names']
+            self.chunk_size = manifest['chunk_size']
+            self.info = manifest['info']
+            self.n_samples = manifest['n_samples']
+            return
+
+        if densities is None or temperatures is None:
+            raise ValueError(f'{self.directory} holds no ensemble store, densities and temperatures are needed to '
+                             f'create one')
+        os.makedirs(self.directory, exist_ok=True)
+        self.densities = np.asarray(densities, dtype=np.float64)
+        self.temperatures = np.asarray(temperatures, dtype=np.float64)
+        self.parameter_names = list(parameter_names) if parameter_names is not None else []
+        self.n_parameters = len(self.parameter_names) if parameter_names is not None else n_parameters
+        self.chunk_size = chunk_size
+        self.info = json_info(info)
+        self.n_samples = 0
+        self._write_manifest()
+
+    @classmethod
+    def from_eos_table(cls, directory, eos_table, **kwargs):
+        """Creates a store on the grid of an EosTable, keeping its info"""
+        return cls(directory, densities=np.asarray(eos_table.pressure_eos.columns, dtype=np.float64),
+                   temperatures=np.asarray(eos_table.pressure_eos.index, dtype=np.float64),
+                   info=dict(eos_table.info), **kwargs)
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def table_shape(self):
+        return len(self.temperatures), len(self.densities)
+
+    def _write_manifest(self):
+        """Writes manifest.json atomically, so a reader never sees a partial manifest"""
+        manifest = {
+            'densities': self.densities.tolist(),
+            'temperatures': self.temperatures.tolist(),
+            'n_parameters': self.n_parameters,
+            'parameter_names': self.parameter_names,
+            'chunk_size': self.chunk_size,
+            'info': self.info,
+            'n_samples': self.n_samples,
+        }
+        manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+        tmp_path = f'{manifest_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        os.replace(tmp_path, manifest_path)
+
+    def _chunk_path(self, name, chunk):
+        return os.path.join(self.directory, f'{name}_{chunk:05d}.npy')
+
+    def _chunk(self, name, chunk, mode='r'):
+        """Memory map of one chunk file, created full size on first write"""
+        path = self._chunk_path(name, chunk)
+        if mode == 'r+' and not os.path.exists(path):
+            shape = (self.chunk_size,) + (self.table_shape if name in FIELDS else (self.n_parameters,))
+            array = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=shape)
+            array[:] = np.nan
+            return array
+        return np.load(path, mmap_mode=mode)
+
+    def append(self, pressures, energies, parameters=None):
+        """Appends one table or a batch of tables
+
+        Args:
+            pressures (numpy.array): Shape (NT, NR) or (n_tables, NT, NR) in GPa
+            energies (numpy.array): Same shape as pressures, in erg/g
+            parameters (numpy.array, optional): Shape (n_parameters,) or (n_tables, n_parameters)
+
+        Returns:
+            indices (range): Sample indices of the appended tables
+        """
+        pressures = np.asarray(pressures, dtype=np.float64).reshape((-1,) + self.table_shape)
+        energies = np.asarray(energies, dtype=np.float64).reshape(pressures.shape)
+        n_tables = len(pressures)
+        if self.n_parameters:
+            if parameters is None:
+                raise ValueError(f'This store keeps {self.n_parameters} parameters with every table')
+            parameters = np.asarray(parameters, dtype=np.float64).reshape(n_tables, self.n_parameters)
+
+        with self._lock:
+            start = self.n_samples
+            written = 0
+            while written < n_tables:
+                chunk, offset = divmod(start + written, self.chunk_size)
+                count = min(self.chunk_size - offset, n_tables - written)
+                arrays = [('pressures', pressures), ('energies', energies)]
+                if self.n_parameters:
+                    arrays.append(('parameters', parameters))
+                for name, values in arrays:
+                    target = self._chunk(name, chunk, mode='r+')
+                    target[offset:offset + count] = values[written:written + count]
+                    target.flush()
+                    del target
+                written += count
+            self.n_samples += n_tables
+            self._write_manifest()
+        return range(start, start + n_tables)
+
+    def append_table(self, eos_table, parameters=None):
+        """Appends an EosTable on the grid of the store, returns its sample index"""
+        if eos_table.pressure_eos.shape != self.table_shape \
+                or not np.allclose(np.asarray(eos_table.pressure_eos.columns, dtype=np.float64), self.densities) \
+                or not np.allclose(np.asarray(eos_table.pressure_eos.index, dtype=np.float64), self.temperatures):
+            raise ValueError('The EOS table is not on the density and temperature grid of the store')
+        return self.append(eos_table.pressure_eos.to_numpy(dtype=np.float64),
+                           eos_table.energy_eos.to_numpy(dtype=np.float64), parameters)[0]
+
+    def read(self, index):
+        """Pressures, energies and parameters of one sample
+
+        Returns:
+            pressures (numpy.array): Shape (NT, NR) in GPa
+            energies (numpy.array): Shape (NT, NR) in erg/g
+            parameters (numpy.array): Shape (n_parameters,), None if the store keeps no parameters
+        """
+        if not -self.n_samples <= index < self.n_samples:
+            raise IndexError(f'Sample {index} is out of range for a store of {self.n_samples} samples')
+        chunk, offset = divmod(index % self.n_samples, self.chunk_size)
+        pressures = np.array(self._chunk('pressures', chunk)[offset])
+        energies = np.array(self._chunk('energies', chunk)[offset])
+        parameters = np.array(self._chunk('parameters', chunk)[offset]) if self.n_parameters else None
+        return pressures, energies, parameters
+
+    def to_eos_table(self, index, material_name=None):
+        """One sample as an EosTable, with the info of the store"""
+        pressures, energies, _ = self.read(index)
+        return table_from_arrays(self.densities, self.temperatures, pressures, energies, self.info, material_name)
+
+    def parameters(self):
+        """Parameter vectors of every sample, shape (n_samples, n_parameters). Small enough to load at once"""
+        n_chunks = -(-self.n_samples // self.chunk_size)
+        if not self.n_parameters or not n_chunks:
+            return np.empty((self.n_samples, self.n_parameters))
+        return np.concatenate([self._chunk('parameters', chunk) for chunk in range(n_chunks)])[:self.n_samples]
+
+    def iter_chunks(self, field='pressures'):
+        """Yields (start index, read-only memory map of shape (n, NT, NR)) for the filled part of every chunk"""
+        if field not in FIELDS:
+            raise ValueError(f'Unrecognized field: {field!r}. Options are {FIELDS}')
+        for start in range(0, self.n_samples, self.chunk_size):
+            yield start, self._chunk(field, start // self.chunk_size)[:min(self.chunk_size, self.n_samples - start)]
+
+    def mean_std(self, field='pressures'):
+        """Mean and standard deviation over the ensemble of every cell, merged chunk by chunk
+
+        Note:
+            Each chunk's mean and sum of squared deviations are combined with Chan's parallel update, so only one
+            chunk is in memory at a time and there is no loss of precision from summing squares.
+
+        Returns:
+            mean (numpy.array): Shape (NT, NR)
+            std (numpy.array): Shape (NT, NR), sample standard deviation, NaN with fewer than two samples
+        """
+        count, mean, m2 = 0, np.zeros(self.table_shape), np.zeros(self.table_shape)
+        for _, values in self.iter_chunks(field):
+            n = len(values)
+            chunk_mean = values.mean(axis=0)
+            chunk_m2 = ((values - chunk_mean) ** 2).sum(axis=0)
+            delta = chunk_mean - mean
+            total = count + n
+            mean = mean + delta * n / total
+            m2 = m2 + chunk_m2 + delta ** 2 * count * n / total
+            count = total
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(m2 / (count - 1)) if count > 1 else np.full(self.table_shape, np.nan)
+        return mean, std
+
+    def percentiles(self, field='pressures', q=(5, 50, 95), max_bytes=256 * 2 ** 20):
+        """Exact percentile bands over the ensemble of every cell, computed over blocks of density columns
+
+        Note:
+            A percentile needs every sample of a cell, so the table is split into blocks of density columns small
+            enough that the samples of one block fit in max_bytes, and each block is read from every chunk in turn.
+
+        Args:
+            field (string, optional): pressures or energies
+            q (tuple, optional): Percentiles between 0 and 100
+            max_bytes (int, optional): Memory budget of one block
+
+        Returns:
+            percentiles (numpy.array): Shape (len(q), NT, NR)
+        """
+        n_temperatures, n_densities = self.table_shape
+        if not self.n_samples:
+            raise ValueError('The ensemble store is empty')
+        columns_per_block = max(1, int(max_bytes // (8 * self.n_samples * n_temperatures)))
+        result = np.empty((len(q),) + self.table_shape)
+        for first in range(0, n_densities, columns_per_block):
+            block = slice(first, min(first + columns_per_block, n_densities))
+            values = np.concatenate([np.asarray(chunk[:, :, block]) for _, chunk in self.iter_chunks(field)])
+            result[:, :, block] = np.nanpercentile(values, q, axis=0)
+        return result
+
+    def statistics(self, field='pressures', q=(5, 50, 95), max_bytes=256 * 2 ** 20):
+        """Mean, standard deviation and percentile bands of every cell as DataFrames indexed like an EosTable
+
+        Returns:
+            statistics (dict): Keys mean, std and p{q} for each percentile, values are DataFrames of shape (NT, NR)
+        """
+        mean, std = self.mean_std(field)
+        bands = self.percentiles(field, q=q, max_bytes=max_bytes)
+        frames = {'mean': mean, 'std': std, **{f'p{value:g}': band for value, band in zip(q, bands)}}
+        return {name: pd.DataFrame(data=values, columns=self.densities, index=self.temperatures)
+                for name, values in frames.items()}
+
+
+def table_from_arrays(densities, temperatures, pressures, energies, info, material_name=None):
+    """EosTable of one pressure and energy grid, with info as kept in a JSON manifest (None for NaN)"""
+    material_name = material_name or info.get('Material Name') or 'Ensemble'
+    df_pressure = pd.DataFrame(data=pressures, columns=densities, index=temperatures)
+    df_pressure.index.rename('Temperature (K)', inplace=True)
+    df_pressure.columns.rename('Density (g/cc)', inplace=True)
+    df_energy = pd.DataFrame(data=energies, columns=densities, index=temperatures)
+    df_energy.index.rename('Temperatures (K)', inplace=True)
+    df_energy.columns.rename('Density (g/cc)', inplace=True)
+    info = {key: (np.nan if value is None else value) for key, value in info.items()}
+    return EosTable(material_name=material_name, info=info, pressure_eos=df_pressure, energy_eos=df_energy,
+                    temperatures=temperatures, densities=densities)
+
+
+def json_info(info):
+    """Copy of a table info dictionary that JSON can hold, numpy scalars as Python scalars and NaN as None"""
+    result = {}
+    for key, value in (info or {}).items():
+        value = value.item() if isinstance(value, np.generic) else value
+        result[key] = None if isinstance(value, float) and np.isnan(value) else value
+    return result
@@ -0,0 +1,143 @@
+"""Thermodynamic consistency screening of EOS tables, for rejecting bad samples before they reach Hyades"""
+import numpy as np
+import pandas as pd
+from EosTablesIO.hugoniotScoring import stack_tables, GPA_TO_ERG_PER_CC
+
+CHECKS = ('non_finite', 'compressibility', 'heat_capacity', 'maxwell')
+EXEMPT = 'expanded'
+
+
+def screen_eos_arrays(densities, temperatures, pressures, energies, maxwell_tolerance=0.1, rtol=0.0):
+    """Per-cell consistency checks of a stack of tables sharing one grid
+
+    Note:
+        Every mask of a check is True where the check fails.
+        expanded: the cell lies at or below the zero pressure density of the table, found by walking the coldest
+        isotherm up from its lowest density: the isotherm has to start in tension, its first non-zero pressure
+        negative, and the zero pressure density is the last density before its pressure turns non-negative. Real
+        tables have tension regions and liquid-vapour loops there, whose spinodal branches have dP/drho < 0, and
+        finite differences across them break the Maxwell relation, so the compressibility and maxwell checks skip
+        these cells. A table whose coldest isotherm starts at a positive pressure, such as a table generated in
+        compression only, or never turns non-negative has no expanded cells, so its negative pressures are screened
+        like any other cell.
+        non_finite: the pressure or the energy is NaN or infinite.
+        compressibility: the pressure falls with density, dP/drho < 0, between this cell and a neighbour along the
+        density axis, and neither cell is expanded. Both cells of a falling interval are flagged.
+        heat_capacity: the energy falls with temperature, dE/dT < 0, between this cell and a neighbour along the
+        temperature axis. Equal energies are allowed, as tables often repeat them at low temperatures where the heat
+        capacity vanishes.
+        maxwell: the relative residual of the Maxwell relation (dE/dV)_T = T (dP/dT)_V - P, written with densities as
+        rho^2 dE/drho = P - T dP/dT, exceeds maxwell_tolerance and the cell is not expanded. The derivatives are
+        second order finite differences on the table grid, and the residual is divided by |rho^2 dE/drho| + |P| +
+        |T dP/dT|.
+
+    Args:
+        densities (numpy.array): Shape (NR,) in g/cc, increasing
+        temperatures (numpy.array): Shape (NT,) in Kelvin, increasing
+        pressures (numpy.array): Shape (n_tables, NT, NR) or (NT, NR) in GPa
+        energies (numpy.array): Shape (n_tables, NT, NR) or (NT, NR) in erg/g
+        maxwell_tolerance (float, optional): Largest allowed relative Maxwell residual
+        rtol (float, optional): Falls in pressure or energy smaller than rtol times the largest magnitude of the
+                                table are not counted as failures
+
+    Returns:
+        masks (dict): Keys are CHECKS, any and EXEMPT, values are boolean arrays of shape (n_tables, NT, NR)
+        maxwell_residual (numpy.array): Shape (n_tables, NT, NR), relative Maxwell residual of every cell
+    """
+    densities = np.asarray(densities, dtype=np.float64)
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    pressures = np.asarray(pressures, dtype=np.float64).reshape((-1, len(temperatures), len(densities)))
+    energies = np.asarray(energies, dtype=np.float64).reshape(pressures.shape)
+
+    non_finite = ~(np.isfinite(pressures) & np.isfinite(energies))
+    with np.errstate(invalid='ignore'):
+        expanded = np.broadcast_to(np.arange(len(densities)) <= _zero_pressure_index(pressures[:, 0]),
+                                   pressures.shape)
+        pressure_scale = rtol * np.nanmax(np.abs(pressures), axis=(1, 2), keepdims=True)
+        energy_scale = rtol * np.nanmax(np.abs(energies), axis=(1, 2), keepdims=True)
+        falling = (np.diff(pressures, axis=2) < -pressure_scale) & ~expanded[:, :, 1:] & ~expanded[:, :, :-1]
+        compressibility = _flag_both_cells(falling, axis=2)
+        heat_capacity = _flag_both_cells(np.diff(energies, axis=1) < -energy_scale, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        p = pressures * GPA_TO_ERG_PER_CC  # erg/cm^3
+        de_drho = np.gradient(energies, densities, axis=2)
+        dp_dt = np.gradient(p, temperatures, axis=1)
+        energy_term = densities[np.newaxis, np.newaxis, :] ** 2 * de_drho
+        thermal_term = temperatures[np.newaxis, :, np.newaxis] * dp_dt
+        scale = np.abs(energy_term) + np.abs(p) + np.abs(thermal_term)
+        maxwell_residual = np.where(scale > 0, np.abs(energy_term - p + thermal_term) / scale, 0.0)
+    maxwell = ~(maxwell_residual <= maxwell_tolerance) & ~expanded  # NaN residuals fail
+
+    masks = {'non_finite': non_finite, 'compressibility': compressibility, 'heat_capacity': heat_capacity,
+             'maxwell': maxwell}
+    masks['any'] = non_finite | compressibility | heat_capacity | maxwell
+    masks[EXEMPT] = expanded
+    return masks, maxwell_residual
+
+
+def screen_tables(eos_tables, maxwell_tolerance=0.1, max_maxwell_fraction=0.05, rtol=0.0):
+    """Screens one table or a stack of tables and flags the ones that should not be run in Hyades
+
+    Note:
+        A table passes when it has no non-finite cells, no compressibility or heat capacity failures, and at most
+        max_maxwell_fraction of the cells that are not expanded fail the Maxwell check. Finite differences across a
+        phase transition break the Maxwell relation on a few cells, which this fraction allows for. Expanded cells,
+        see screen_eos_arrays, are not screened for compressibility or the Maxwell relation, so the SESAME tables in
+        EosTablesIO/data and tables spliced into them pass with the default arguments.
+
+    Args:
+        eos_tables (EosTable, EOSTable or list): One table, or tables sharing one density and temperature grid
+        maxwell_tolerance (float, optional): Largest allowed relative Maxwell residual of a cell
+        max_maxwell_fraction (float, optional): Largest fraction of cells of a passing table that fail the Maxwell
+                                                check
+        rtol (float, optional): Falls in pressure or energy smaller than rtol times the largest magnitude of the
+                                table are not counted as failures
+
+    Returns:
+        summary (pandas.DataFrame): One row per table with the number of failing cells of each check, the number of
+                                    expanded cells, the largest and median relative Maxwell residual of the other
+                                    cells, and a passed flag
+        masks (dict): Keys are CHECKS, any and EXEMPT, values are boolean arrays of shape (n_tables, NT, NR)
+    """
+    if not isinstance(eos_tables, (list, tuple)):
+        eos_tables = [eos_tables]
+    densities, temperatures, pressures, energies = stack_tables(eos_tables)
+    masks, maxwell_residual = screen_eos_arrays(densities, temperatures, pressures, energies,
+                                                maxwell_tolerance=maxwell_tolerance, rtol=rtol)
+
+    summary = pd.DataFrame({check: masks[check].sum(axis=(1, 2)) for check in CHECKS + (EXEMPT,)})
+    finite_residual = np.where(np.isfinite(maxwell_residual) & ~masks[EXEMPT], maxwell_residual, np.nan)
+    with np.errstate(invalid='ignore'):
+        summary['max_maxwell_residual'] = np.nanmax(finite_residual, axis=(1, 2))
+        summary['median_maxwell_residual'] = np.nanmedian(finite_residual, axis=(1, 2))
+    summary['passed'] = (summary['non_finite'] == 0) & (summary['compressibility'] == 0) \
+        & (summary['heat_capacity'] == 0) \
+        & (summary['maxwell'] <= max_maxwell_fraction * (masks['any'][0].size - summary[EXEMPT]))
+    summary.index.rename('table', inplace=True)
+    return summary, masks
+
+
+def passes_screening(eos_table, **kwargs):
+    """True if a single table passes screen_tables, which takes the same keyword arguments"""
+    summary, _ = screen_tables(eos_table, **kwargs)
+    return bool(summary['passed'].iloc[0])
+
+
+def _flag_both_cells(interval_mask, axis):
+    """Per-cell mask from a mask of the intervals between neighbouring cells along axis"""
+    shape = list(interval_mask.shape)
+    shape[axis] = 1
+    pad = np.zeros(shape, dtype=bool)
+    return np.concatenate([interval_mask, pad], axis=axis) | np.concatenate([pad, interval_mask], axis=axis)
+
+
+def _zero_pressure_index(cold_pressures):
+    """Index of the zero pressure density of each coldest isotherm of shape (n_tables, NR), -1 where there is none"""
+    n_tables, n_densities = cold_pressures.shape
+    columns = np.arange(n_densities)
+    first_nonzero = np.argmax(cold_pressures != 0, axis=1)
+    in_tension = cold_pressures[np.arange(n_tables), first_nonzero] < 0
+    recovered = (columns > first_nonzero[:, np.newaxis]) & (cold_pressures >= 0)
+    zero_pressure_index = np.argmax(recovered, axis=1) - 1
+    return np.where(in_tension & recovered.any(axis=1), zero_pressure_index, -1)[:, np.newaxis, np.newaxis]
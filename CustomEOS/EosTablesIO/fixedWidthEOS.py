@@ -0,0 +1,348 @@
+"""Random-access reads and in-place patches of fixed-width Hyades EOS tables, without parsing the whole file"""
+import os
+import mmap
+import shutil
+import numpy as np
+import pandas as pd
+from EosTablesIO.EosTable import EosTable
+
+FIELD_WIDTH = 15  # characters per float, ' 0.12345678E+00'
+FIELDS_PER_LINE = 5
+TEMPERATURE_UNIT_CONVERSION = 11605 * 1000  # Convert KeV to Kelvin
+PRESSURE_UNIT_CONVERSION = 1e-10  # Convert dynes/cm^2 to Gigapascals
+FICLONE = 0x40049409  # Linux ioctl that makes a copy-on-write clone of a file on btrfs, XFS and other reflink filesystems
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def copy_table(base_filename, filename, reflink=True):
+    """Copies a base EOS table, as a copy-on-write reflink where the filesystem supports it
+
+    Note:
+        A reflink shares the data blocks of the base table until they are written, so the copy is nearly free and a
+        patched sample only costs the blocks it changes. Elsewhere the table is copied with shutil.
+
+    Args:
+        base_filename (string): Table to copy
+        filename (string): Name of the copy
+        reflink (bool, optional): Toggle to try a reflink before falling back to a regular copy
+
+    Returns:
+        filename (string)
+    """
+    if reflink and fcntl is not None:
+        try:
+            with open(base_filename, 'rb') as source, open(filename, 'wb') as destination:
+                fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+            return filename
+        except OSError:  # not supported by this filesystem, or the files are on different filesystems
+            pass
+    shutil.copyfile(base_filename, filename)
+    return filename
+
+
+def format_field(value):
+    """Formats a float as a 15-character fixed-width EOS field, ' 0.12345678E+00' or '-0.12345678E+00'
+
+    Raises:
+        ValueError: If the value is not finite or needs a 3-digit exponent, neither fits in 15 characters
+    """
+    field = f'{value:.8E}'
+    if not field.startswith('-'):  # the sign character of positive values is a space
+        field = ' ' + field
+    if len(field) != FIELD_WIDTH or not np.isfinite(value):
+        raise ValueError(f'{value!r} cannot be written as a {FIELD_WIDTH}-character EOS field, values must be finite '
+                         f'with magnitudes between 1E-99 and 1E+100')
+    return field.encode('ascii')
+
+
+def patch_eos_file(base_filename, filename, temperature_range=None, density_range=None, pressures=None,
+                   energies=None, reflink=True):
+    """Copies a base table and overwrites the pressures and energies of one window in place
+
+    Args:
+        base_filename (string): Baseline fixed-width EOS table
+        filename (string): Name of the patched table
+        temperature_range (tuple, optional): (minimum, maximum) temperature in Kelvin, inclusive
+        density_range (tuple, optional): (minimum, maximum) density in g/cc, inclusive
+        pressures (array or callable, optional): New pressures in GPa, with the shape of the window, or a function
+                                                 mapping the current pressure DataFrame of the window to new values
+        energies (array or callable, optional): New energies in erg/g, like pressures
+        reflink (bool, optional): Toggle to try a copy-on-write reflink of the base table
+
+    Returns:
+        filename (string)
+
+    Raises:
+        ValueError: If the window is empty or the new values do not fit it, in which case no copy is left behind
+    """
+    copy_table(base_filename, filename, reflink=reflink)
+    try:
+        with FixedWidthEosFile(filename, writable=True) as table:
+            table.patch_window(temperature_range, density_range, pressures=pressures, energies=energies)
+    except BaseException:
+        os.remove(filename)
+        raise
+    return filename
+
+
+class FixedWidthEosFile:
+    """Memory-maps a fixed-width Hyades EOS table and reads or overwrites any window of it by computing byte offsets
+
+    Note:
+        After the two header lines every word of the table is a 15-character field, 5 per line, so word w of the data
+        starts at data_start + (w // 5) * line_length + (w % 5) * 15, where line_length is 75 plus the 1 or 2 bytes of
+        the LF or CRLF line ending. Only the lines holding the requested words are touched.
+        The word layout is the one read_fixed_width_eos describes: NR, NT, the NR densities, the NT temperatures,
+        then the NT x NR pressures and the NT x NR energies, each stored one temperature row at a time.
+        Windows are returned in the same units as read_fixed_width_eos: Kelvin, g/cc, GPa and erg/g.
+        A writable file can have its pressures and energies overwritten in place, every field keeps its 15 characters
+        so nothing else in the file moves. The densities, temperatures and header cannot be patched.
+
+    Attributes:
+        filename (string): Name and location of the EOS file
+        number_of_densities (int): NR
+        number_of_temperatures (int): NT
+        densities (numpy.array): All densities in the table in g/cc
+        temperatures (numpy.array): All temperatures in the table in Kelvin
+        writable (bool): Whether the table can be patched
+
+    """
+    def __init__(self, filename, writable=False) -> None:
+        self.filename = filename
+        self.writable = writable
+        self._file = open(filename, 'r+b' if writable else 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            self._file.close()
+            raise ValueError(f'{filename} is empty')
+
+        # The data starts after the second newline, the line ending is whatever ends the first data line
+        second_line_start = self._map.find(b'\n') + 1
+        self._data_start = self._map.find(b'\n', second_line_start) + 1
+        if second_line_start == 0 or self._data_start == 0:
+            self.close()
+            raise ValueError(f'{filename} does not have the two header lines of a fixed-width EOS')
+        first_line_end = self._map.find(b'\n', self._data_start)
+        newline_length = 2 if self._map[first_line_end - 1:first_line_end] == b'\r' else 1
+        if first_line_end - (newline_length - 1) - self._data_start != FIELD_WIDTH * FIELDS_PER_LINE:
+            self.close()
+            raise ValueError(f'The first data line of {filename} is not {FIELDS_PER_LINE} fields of '
+                             f'{FIELD_WIDTH} characters, it is not a fixed-width EOS')
+        self._line_length = FIELD_WIDTH * FIELDS_PER_LINE + newline_length
+
+        self.number_of_densities = int(self.read_words(0, 1)[0])
+        self.number_of_temperatures = int(self.read_words(1, 1)[0])
+        self.densities = self.read_words(2, self.number_of_densities)
+        self.temperatures = self.read_words(2 + self.number_of_densities,
+                                            self.number_of_temperatures) * TEMPERATURE_UNIT_CONVERSION
+
+        self._pressure_start = 2 + self.number_of_densities + self.number_of_temperatures
+        self._energy_start = self._pressure_start + self.number_of_densities * self.number_of_temperatures
+        last_word = self._energy_start + self.number_of_densities * self.number_of_temperatures - 1
+        if self._word_offset(last_word) + FIELD_WIDTH > len(self._map):
+            self.close()
+            raise ValueError(f'{filename} is shorter than its NR={self.number_of_densities} and '
+                             f'NT={self.number_of_temperatures} require')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """Writes any patches back, unmaps and closes the file"""
+        if not self._map.closed:
+            if self.writable:
+                self._map.flush()
+            self._map.close()
+        self._file.close()
+
+    def _word_offset(self, word):
+        """Byte offset of the first character of a data word"""
+        line, field = divmod(word, FIELDS_PER_LINE)
+        return self._data_start + line * self._line_length + field * FIELD_WIDTH
+
+    def read_words(self, start, count):
+        """Parses count consecutive words of the data, beginning with word number start
+
+        Args:
+            start (int): Index of the first word, NR is word 0
+            count (int): Number of words
+
+        Returns:
+            values (numpy.array): The words as floats, in the units of the file
+        """
+        if count <= 0:
+            return np.empty(0)
+        first_line, first_field = divmod(start, FIELDS_PER_LINE)
+        last_line = (start + count - 1) // FIELDS_PER_LINE
+        block = self._map[self._data_start + first_line * self._line_length:
+                          self._data_start + (last_line + 1) * self._line_length]
+        fields = block.replace(b'\r', b'').replace(b'\n', b'')
+        fields = fields[first_field * FIELD_WIDTH:(first_field + count) * FIELD_WIDTH]
+        return np.frombuffer(fields, dtype=f'S{FIELD_WIDTH}').astype(np.float64)
+
+    def read_window(self, temperature_range=None, density_range=None):
+        """Reads the pressures and energies of every cell inside a temperature and density window
+
+        Args:
+            temperature_range (tuple, optional): (minimum, maximum) temperature in Kelvin, inclusive. All temperatures
+                                                 if not given
+            density_range (tuple, optional): (minimum, maximum) density in g/cc, inclusive. All densities if not given
+
+        Returns:
+            temperatures (numpy array), densities (numpy array), pressures (Pandas DataFrame), energies (Pandas DataFrame)
+        """
+        rows = FixedWidthEosFile._index_range(self.temperatures, temperature_range, 'temperature')
+        columns = FixedWidthEosFile._index_range(self.densities, density_range, 'density')
+        return self._read_cells(rows, columns)
+
+    def isotherm(self, temperature):
+        """Reads the table row at the temperature closest to temperature, in Kelvin
+
+        Returns:
+            pressures (pandas.Series) in GPa, energies (pandas.Series) in erg/g, both indexed by density in g/cc
+        """
+        row = int(np.argmin(np.abs(self.temperatures - temperature)))
+        temperatures, densities, pressures, energies = self._read_cells(range(row, row + 1),
+                                                                        range(self.number_of_densities))
+        return pressures.iloc[0], energies.iloc[0]
+
+    def isochore(self, density):
+        """Reads the table column at the density closest to density, in g/cc
+
+        Returns:
+            pressures (pandas.Series) in GPa, energies (pandas.Series) in erg/g, both indexed by temperature in Kelvin
+        """
+        column = int(np.argmin(np.abs(self.densities - density)))
+        temperatures, densities, pressures, energies = self._read_cells(range(self.number_of_temperatures),
+                                                                        range(column, column + 1))
+        return pressures.iloc[:, 0], energies.iloc[:, 0]
+
+    def write_words(self, start, values):
+        """Overwrites consecutive words of the data in place, beginning with word number start
+
+        Args:
+            start (int): Index of the first word, NR is word 0
+            values (iterable): Floats in the units of the file
+        """
+        self._write_fields(start, [format_field(value) for value in values])  # format everything before writing
+
+    def _write_fields(self, start, fields):
+        """Overwrites consecutive words with fields that format_field already produced"""
+        if not self.writable:
+            raise ValueError(f'{self.filename} was opened read-only, open it with writable=True to patch it')
+        for word, field in enumerate(fields, start):
+            offset = self._word_offset(word)
+            self._map[offset:offset + FIELD_WIDTH] = field
+
+    def patch_window(self, temperature_range=None, density_range=None, pressures=None, energies=None):
+        """Overwrites the pressures and energies of every cell inside a temperature and density window
+
+        Args:
+            temperature_range (tuple, optional): (minimum, maximum) temperature in Kelvin, inclusive
+            density_range (tuple, optional): (minimum, maximum) density in g/cc, inclusive
+            pressures (array or callable, optional): New pressures in GPa, with the shape of the window, or a function
+                                                     mapping the current pressure DataFrame of the window to new values
+            energies (array or callable, optional): New energies in erg/g, like pressures
+
+        Note:
+            Both windows are checked and formatted before the first word is written, so a wrong shape or a value
+            that does not fit in a field leaves the file untouched.
+
+        Returns:
+            n_cells (int): Number of cells in the window
+
+        Raises:
+            ValueError: If the file is read-only, the window is empty, or the new values have the wrong shape or
+                        cannot be written as fields
+        """
+        if not self.writable:
+            raise ValueError(f'{self.filename} was opened read-only, open it with writable=True to patch it')
+        rows = FixedWidthEosFile._index_range(self.temperatures, temperature_range, 'temperature')
+        columns = FixedWidthEosFile._index_range(self.densities, density_range, 'density')
+        if callable(pressures) or callable(energies):
+            temperatures, densities, current_pressures, current_energies = self._read_cells(rows, columns)
+            pressures = pressures(current_pressures) if callable(pressures) else pressures
+            energies = energies(current_energies) if callable(energies) else energies
+
+        shape = (len(rows), len(columns))
+        nr = self.number_of_densities
+        patches = []  # (first word, fields) of every row of both windows
+        for name, values, start, unit_conversion in (
+                ('pressures', pressures, self._pressure_start, 1 / PRESSURE_UNIT_CONVERSION),
+                ('energies', energies, self._energy_start, 1)):
+            if values is None:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            if values.shape != shape:
+                raise ValueError(f'The window has {shape[0]} temperatures and {shape[1]} densities, '
+                                 f'got {name} of shape {values.shape}')
+            for i, row in enumerate(rows):
+                patches.append((start + row * nr + columns.start,
+                                [format_field(value) for value in values[i] * unit_conversion]))
+
+        for start, fields in patches:
+            self._write_fields(start, fields)
+        return shape[0] * shape[1]
+
+    def read_eos_table(self, temperature_range=None, density_range=None):
+        """Reads a window of the table into an EosTable, with the material information of the full table
+
+        Args:
+            temperature_range (tuple, optional): (minimum, maximum) temperature in Kelvin, inclusive
+            density_range (tuple, optional): (minimum, maximum) density in g/cc, inclusive
+
+        Returns:
+            eos_table (EosTable)
+        """
+        material_name, info = EosTable.get_fixed_width_eos_info(self.filename)
+        temperatures, densities, pressure_eos, energy_eos = self.read_window(temperature_range, density_range)
+        return EosTable(material_name=material_name, info=info,
+                        pressure_eos=pressure_eos, energy_eos=energy_eos,
+                        temperatures=temperatures, densities=densities)
+
+    def _read_cells(self, rows, columns):
+        """Reads the pressures and energies of a contiguous block of temperature rows and density columns"""
+        nr = self.number_of_densities
+        n_rows, n_columns = len(rows), len(columns)
+        pressures = np.empty((n_rows, n_columns))
+        energies = np.empty((n_rows, n_columns))
+        if n_columns > nr // 2:  # wide windows: read the whole rows in one go and drop the unwanted columns
+            for values, start in ((pressures, self._pressure_start), (energies, self._energy_start)):
+                block = self.read_words(start + rows.start * nr, n_rows * nr).reshape(n_rows, nr)
+                values[:] = block[:, columns.start:columns.stop]
+        else:  # narrow windows: read only the wanted columns of each row
+            for i, row in enumerate(rows):
+                for values, start in ((pressures, self._pressure_start), (energies, self._energy_start)):
+                    values[i] = self.read_words(start + row * nr + columns.start, n_columns)
+
+        temperatures = self.temperatures[rows.start:rows.stop]
+        densities = self.densities[columns.start:columns.stop]
+        df_pressure = pd.DataFrame(data=pressures * PRESSURE_UNIT_CONVERSION, columns=densities, index=temperatures)
+        df_pressure.index.rename('Temperature (K)', inplace=True)
+        df_pressure.columns.rename('Density (g/cc)', inplace=True)
+        df_energy = pd.DataFrame(data=energies, columns=densities, index=temperatures)
+        df_energy.index.rename('Temperatures (K)', inplace=True)
+        df_energy.columns.rename('Density (g/cc)', inplace=True)
+
+        return temperatures, densities, df_pressure, df_energy
+
+    @staticmethod
+    def _index_range(grid, value_range, name):
+        """Contiguous range of the indices of grid whose values fall inside value_range"""
+        if value_range is None:
+            return range(len(grid))
+        low, high = value_range
+        inside = np.flatnonzero((grid >= low) & (grid <= high))
+        if inside.size == 0:
+            raise ValueError(f'No {name} of the table lies in [{low}, {high}], '
+                             f'the table spans [{grid.min()}, {grid.max()}]')
+        return range(inside[0], inside[-1] + 1)
@@ -0,0 +1,197 @@
+"""Batched principal Hugoniots of stacks of EOS tables and their misfit against reference Hugoniot data"""
+import numpy as np
+import pandas as pd
+from EosTablesIO.readingHugoniot import read_hugoniots
+
+GPA_TO_ERG_PER_CC = 1e10  # P*V in erg/g when P is in erg/cm^3 and V in cm^3/g
+
+
+def stack_tables(eos_tables):
+    """Stacks the pressures and energies of EOS tables that share one density and temperature grid
+
+    Args:
+        eos_tables (list): EosTable or EOSTable objects, such as the samples of one ReodpEosGenerator
+
+    Returns:
+        densities (numpy.array): Shape (NR,) in g/cc
+        temperatures (numpy.array): Shape (NT,) in Kelvin
+        pressures (numpy.array): Shape (n_tables, NT, NR) in GPa
+        energies (numpy.array): Shape (n_tables, NT, NR) in erg/g
+    """
+    if not eos_tables:
+        raise ValueError('No EOS tables to stack')
+    densities = np.asarray(eos_tables[0].pressure_eos.columns, dtype=np.float64)
+    temperatures = np.asarray(eos_tables[0].pressure_eos.index, dtype=np.float64)
+    for i, table in enumerate(eos_tables[1:], 1):
+        if table.pressure_eos.shape != (len(temperatures), len(densities)) \
+                or not np.allclose(table.pressure_eos.columns, densities) \
+                or not np.allclose(table.pressure_eos.index, temperatures):
+            raise ValueError(f'EOS table #{i} does not share the density and temperature grid of table #0')
+    if np.any(np.diff(densities) <= 0) or np.any(np.diff(temperatures) <= 0):
+        raise ValueError('Densities and temperatures must be strictly increasing')
+
+    pressures = np.stack([table.pressure_eos.to_numpy(dtype=np.float64) for table in eos_tables])
+    energies = np.stack([table.energy_eos.to_numpy(dtype=np.float64) for table in eos_tables])
+    return densities, temperatures, pressures, energies
+
+
+def interpolate_state(densities, temperatures, values, density, temperature):
+    """Bilinear interpolation of a stack of tables at one (density, temperature) point per table
+
+    Args:
+        densities (numpy.array): Shape (NR,)
+        temperatures (numpy.array): Shape (NT,)
+        values (numpy.array): Shape (n_tables, NT, NR)
+        density (float or numpy.array): Scalar or shape (n_tables,)
+        temperature (float or numpy.array): Scalar or shape (n_tables,)
+
+    Returns:
+        values (numpy.array): Shape (n_tables,)
+    """
+    n_tables = values.shape[0]
+    density = np.broadcast_to(np.asarray(density, dtype=np.float64), (n_tables,))
+    temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64), (n_tables,))
+    j = np.clip(np.searchsorted(densities, density) - 1, 0, len(densities) - 2)
+    i = np.clip(np.searchsorted(temperatures, temperature) - 1, 0, len(temperatures) - 2)
+    wr = (density - densities[j]) / (densities[j + 1] - densities[j])
+    wt = (temperature - temperatures[i]) / (temperatures[i + 1] - temperatures[i])
+    k = np.arange(n_tables)
+    return ((1 - wt) * (1 - wr) * values[k, i, j] + (1 - wt) * wr * values[k, i, j + 1]
+            + wt * (1 - wr) * values[k, i + 1, j] + wt * wr * values[k, i + 1, j + 1])
+
+
+def principal_hugoniots(eos_tables, initial_temperature=298.0, initial_density=None):
+    """Computes the principal Hugoniot of every table in one batched array computation
+
+    Note:
+        Along each density column of each table the Rankine-Hugoniot energy residual
+        H(T) = E(T) - E0 - (P(T) + P0) * (V0 - V) / 2 is evaluated for every temperature at once. The Hugoniot state is
+        where H first changes sign, located by linear interpolation between the two bracketing temperatures.
+        P0 and E0 are the table values at the initial density and temperature. Columns at or below the initial
+        density, or without a sign change, are NaN.
+        The shock and particle velocities follow from Us = V0 * sqrt((P - P0) / (V0 - V)) and
+        Up = sqrt((P - P0) * (V0 - V)).
+
+    Args:
+        eos_tables (list): EosTable or EOSTable objects sharing one density and temperature grid
+        initial_temperature (float, optional): Temperature of the unshocked material in Kelvin
+        initial_density (float or numpy.array, optional): Density of the unshocked material in g/cc, one per table or
+                                                          shared. Defaults to the Ambient Density of each table
+
+    Returns:
+        hugoniots (dict): Rho has shape (NR,) in g/cc. Pres (GPa), Enrgy (erg/g), Temp (K), Up and Us (km/s) have
+                          shape (n_tables, NR). Rho0, P0 and E0 have shape (n_tables,)
+    """
+    densities, temperatures, pressures, energies = stack_tables(eos_tables)
+    n_tables = pressures.shape[0]
+    if initial_density is None:
+        initial_density = np.array([table.info['Ambient Density'] for table in eos_tables], dtype=np.float64)
+    rho0 = np.broadcast_to(np.asarray(initial_density, dtype=np.float64), (n_tables,))
+    p0 = interpolate_state(densities, temperatures, pressures, rho0, initial_temperature)
+    e0 = interpolate_state(densities, temperatures, energies, rho0, initial_temperature)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v0 = 1 / rho0
+        compression = v0[:, np.newaxis] - 1 / densities[np.newaxis, :]  # V0 - V, shape (n_tables, NR)
+        residual = (energies - e0[:, np.newaxis, np.newaxis]
+                    - 0.5 * (pressures + p0[:, np.newaxis, np.newaxis]) * GPA_TO_ERG_PER_CC
+                    * compression[:, np.newaxis, :])
+
+    # First temperature interval of each column where the residual changes sign
+    crossing = (np.sign(residual[:, :-1, :]) != np.sign(residual[:, 1:, :])) & np.isfinite(residual[:, :-1, :]) \
+        & np.isfinite(residual[:, 1:, :])
+    found = crossing.any(axis=1) & (compression > 0)
+    i = np.argmax(crossing, axis=1)  # shape (n_tables, NR)
+    k, j = np.meshgrid(np.arange(n_tables), np.arange(len(densities)), indexing='ij')
+    h_low, h_high = residual[k, i, j], residual[k, i + 1, j]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(h_high != h_low, h_low / (h_low - h_high), 0.0)
+
+    def along_hugoniot(values):
+        low, high = values[k, i, j], values[k, i + 1, j]
+        return np.where(found, low + w * (high - low), np.nan)
+
+    pressure = along_hugoniot(pressures)
+    temperature = np.where(found, temperatures[i] + w * (temperatures[i + 1] - temperatures[i]), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        jump = (pressure - p0[:, np.newaxis]) * GPA_TO_ERG_PER_CC  # erg/cm^3
+        up = np.sqrt(jump * compression) * 1e-5  # cm/s to km/s
+        us = v0[:, np.newaxis] * np.sqrt(jump / compression) * 1e-5
+
+    return {'Rho': densities, 'Pres': pressure, 'Enrgy': along_hugoniot(energies), 'Temp': temperature,
+            'Up': up, 'Us': us, 'Rho0': rho0, 'P0': p0, 'E0': e0}
+
+
+def score_hugoniots(eos_tables, references, variables=('Pres', 'Us', 'Up'), initial_temperature=298.0,
+                    initial_density=None):
+    """Misfit of the principal Hugoniot of every table against one or more reference Hugoniots
+
+    Note:
+        Each candidate Hugoniot is known on the density grid of the tables, so it is interpolated to the reference
+        densities with weights computed once and shared by every table. Reference points outside the part of a
+        candidate Hugoniot that exists are left out of that candidate's metrics and lower its coverage.
+
+    Args:
+        eos_tables (list): EosTable or EOSTable objects sharing one density and temperature grid
+        references (string, list, dict or pandas.DataFrame): Hugoniot filenames, a dictionary of run keys to
+                                                             filenames, or a DataFrame from read_hugoniot or
+                                                             read_hugoniots
+        variables (tuple, optional): Hugoniot variables to compare, from Pres, Us, Up, Temp
+        initial_temperature (float, optional): Temperature of the unshocked material in Kelvin
+        initial_density (float or numpy.array, optional): Density of the unshocked material in g/cc, defaults to the
+                                                          Ambient Density of each table
+
+    Returns:
+        scores (pandas.DataFrame): One row per table and reference, indexed by (table, reference). For each variable
+                                   there is an rms_{var} in the units of the variable and an rms_rel_{var} relative
+                                   to the reference, plus the coverage, the fraction of reference points compared
+    """
+    references = _reference_frame(references)
+    hugoniots = principal_hugoniots(eos_tables, initial_temperature=initial_temperature,
+                                    initial_density=initial_density)
+    densities = hugoniots['Rho']
+    n_tables = len(eos_tables)
+
+    frames = []
+    for name, reference in references.groupby('run', sort=False):
+        rho = reference['Rho'].to_numpy()
+        j = np.clip(np.searchsorted(densities, rho) - 1, 0, len(densities) - 2)
+        w = (rho - densities[j]) / (densities[j + 1] - densities[j])
+        inside = (rho >= densities[0]) & (rho <= densities[-1])
+
+        scores = {}
+        covered = np.zeros((n_tables, len(rho)), dtype=bool)
+        for var in variables:
+            candidate = (1 - w) * hugoniots[var][:, j] + w * hugoniots[var][:, j + 1]  # shape (n_tables, n_points)
+            target = reference[var].to_numpy()[np.newaxis, :]
+            valid = np.isfinite(candidate) & np.isfinite(target) & inside[np.newaxis, :]
+            covered |= valid
+            error = np.where(valid, candidate - target, np.nan)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                relative = np.where(valid & (target != 0), error / target, np.nan)
+                n_valid = valid.sum(axis=1)
+                scores[f'rms_{var}'] = np.where(n_valid > 0, np.sqrt(np.nansum(error ** 2, axis=1) / n_valid), np.nan)
+                n_relative = np.isfinite(relative).sum(axis=1)
+                scores[f'rms_rel_{var}'] = np.where(n_relative > 0,
+                                                    np.sqrt(np.nansum(relative ** 2, axis=1) / n_relative), np.nan)
+        scores['coverage'] = covered.mean(axis=1) if len(rho) else np.zeros(n_tables)
+
+        frame = pd.DataFrame(scores)
+        frame.insert(0, 'reference', name)
+        frame.insert(0, 'table', np.arange(n_tables))
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True).set_index(['table', 'reference'])
+
+
+def _reference_frame(references):
+    """Long-form DataFrame with a run column from any of the reference forms score_hugoniots accepts"""
+    if isinstance(references, pd.DataFrame):
+        if 'run' in references.columns:
+            return references
+        references = references.copy()
+        references.insert(0, 'run', 'reference')
+        return references
+    if isinstance(references, str):
+        references = [references]
+    return read_hugoniots(references)
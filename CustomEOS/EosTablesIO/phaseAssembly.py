@@ -0,0 +1,130 @@
+"""Assembly of a multi-phase EOS table from per-phase tables by picking the phase of least free energy in every cell"""
+import datetime
+import numpy as np
+import pandas as pd
+from EosTablesIO.EosTable import EosTable
+
+
+def select_phases(free_energies, pressures, energies):
+    """Stable phase of every cell and the pressure and energy of that phase
+
+    Note:
+        At fixed volume and temperature the stable phase has the least Helmholtz free energy. Cells are decided one at
+        a time, so the mixed-phase states of a common tangent construction across a first order transition are not
+        built, the table jumps from one phase to the next at the cell where their free energies cross.
+
+    Args:
+        free_energies (numpy.array): Shape (n_phases, ...), such as (n_phases, NT, NR) or (n_phases, n_samples, NT,
+                                     NR). Any units, shared by all phases
+        pressures (numpy.array): Same shape as free_energies
+        energies (numpy.array): Same shape as free_energies
+
+    Returns:
+        phase_index (numpy.array): Shape free_energies.shape[1:], index of the stable phase in every cell
+        pressures (numpy.array): Shape free_energies.shape[1:], pressure of the stable phase
+        energies (numpy.array): Shape free_energies.shape[1:], energy of the stable phase
+    """
+    free_energies = np.asarray(free_energies, dtype=np.float64)
+    pressures = np.broadcast_to(np.asarray(pressures, dtype=np.float64), free_energies.shape)
+    energies = np.broadcast_to(np.asarray(energies, dtype=np.float64), free_energies.shape)
+    # NaN marks a phase that is not defined in a cell, so it can never be selected there
+    phase_index = np.argmin(np.where(np.isnan(free_energies), np.inf, free_energies), axis=0)
+    selected = phase_index[np.newaxis]
+    return (phase_index, np.take_along_axis(pressures, selected, axis=0)[0],
+            np.take_along_axis(energies, selected, axis=0)[0])
+
+
+def assemble_phases(densities, temperatures, phases, material_name='Material', info=None, phase_index=None):
+    """Combines per-phase free energy, pressure and energy grids into EOS tables with a phase map
+
+    Args:
+        densities (numpy.array): Shape (NR,) in g/cc, in any order, such as the decreasing densities of a uniform
+                                 REODP volume grid
+        temperatures (numpy.array): Shape (NT,) in Kelvin, increasing
+        phases (dict): Keys are phase names, values are dictionaries with F (free energy in any units shared by all
+                       phases), P (GPa) and E (erg/g), each of shape (NT, NR) or (n_samples, NT, NR). Phases of shape
+                       (NT, NR) are shared by every sample
+        material_name (string, optional): Name of the material
+        info (dict, optional): Info of the tables, such as the info of a base table. Defaults to empty values
+        phase_index (numpy.array, optional): Index into the phases of the phase of every cell, of shape (NT, NR) or
+                                             (n_samples, NT, NR), in place of the phase of least free energy
+
+    Returns:
+        eos_tables (EosTable or list): One EosTable, or one per sample if any phase has a sample axis
+        phase_maps (pandas.DataFrame or list): Index into phase_names of the stable phase in every cell, indexed
+                                               like the tables, one per table
+        phase_names (list): Names of the phases in the order of the phase indices
+    """
+    phase_names = list(phases)
+    if not phase_names:
+        raise ValueError('No phases to assemble')
+    densities = np.asarray(densities, dtype=np.float64)
+    temperatures = np.asarray(temperatures, dtype=np.float64)
+    shape = (len(temperatures), len(densities))
+    sample_counts = [np.shape(phases[name]['F'])[0] for name in phase_names if np.ndim(phases[name]['F']) == 3]
+    n_samples = max(sample_counts) if sample_counts else None
+    stack_shape = shape if n_samples is None else (n_samples,) + shape
+
+    stacks = {key: np.stack([np.broadcast_to(np.asarray(phases[name][key], dtype=np.float64), stack_shape)
+                             for name in phase_names]) for key in ('F', 'P', 'E')}
+    if phase_index is None:
+        phase_index, pressures, energies = select_phases(stacks['F'], stacks['P'], stacks['E'])
+        rule = 'least free energy'
+    else:
+        phase_index = np.broadcast_to(np.asarray(phase_index, dtype=np.int64), stack_shape)
+        if phase_index.min() < 0 or phase_index.max() >= len(phase_names):
+            raise ValueError(f'Phase indices must lie between 0 and {len(phase_names) - 1}')
+        selected = phase_index[np.newaxis]
+        pressures = np.take_along_axis(stacks['P'], selected, axis=0)[0]
+        energies = np.take_along_axis(stacks['E'], selected, axis=0)[0]
+        rule = 'given phase map'
+
+    order = np.argsort(densities)
+    densities = densities[order]
+    phase_index, pressures, energies = phase_index[..., order], pressures[..., order], energies[..., order]
+
+    if info is None:
+        info = {
+            'Ambient Density': np.nan,
+            'Average Atomic Mass': np.nan,
+            'Average Atomic Number': np.nan,
+            'Date Created': '{:%m/%d/%Y}'.format(datetime.date.today()),
+            'EOS Number': np.nan,
+            'Material Name': material_name,
+            'Notes': ''
+        }
+    notes = f"{info['Notes']} phases by {rule}: {', '.join(phase_names)}".strip()
+
+    def table(p, e, i):
+        df_pressure = pd.DataFrame(data=p, columns=densities, index=temperatures)
+        df_pressure.index.rename('Temperature (K)', inplace=True)
+        df_pressure.columns.rename('Density (g/cc)', inplace=True)
+        df_energy = pd.DataFrame(data=e, columns=densities, index=temperatures)
+        df_energy.index.rename('Temperatures (K)', inplace=True)
+        df_energy.columns.rename('Density (g/cc)', inplace=True)
+        phase_map = pd.DataFrame(data=i, columns=df_pressure.columns, index=df_pressure.index)
+        return EosTable(material_name=material_name, info={**info, 'Notes': notes}, pressure_eos=df_pressure,
+                        energy_eos=df_energy, temperatures=temperatures, densities=densities), phase_map
+
+    if n_samples is None:
+        eos_table, phase_map = table(pressures, energies, phase_index)
+        return eos_table, phase_map, phase_names
+    tables, phase_maps = zip(*(table(pressures[k], energies[k], phase_index[k]) for k in range(n_samples)))
+    return list(tables), list(phase_maps), phase_names
+
+
+def phase_fractions(phase_maps, phase_names):
+    """Fraction of the cells of each table in which each phase is stable
+
+    Args:
+        phase_maps (pandas.DataFrame or list): Phase maps from assemble_phases
+        phase_names (list): Phase names from assemble_phases
+
+    Returns:
+        fractions (pandas.DataFrame): One row per table, one column per phase
+    """
+    if isinstance(phase_maps, pd.DataFrame):
+        phase_maps = [phase_maps]
+    indices = np.stack([phase_map.to_numpy() for phase_map in phase_maps]).reshape(len(phase_maps), -1)
+    counts = np.stack([np.bincount(row, minlength=len(phase_names)) for row in indices])
+    return pd.DataFrame(counts / indices.shape[1], columns=phase_names)
@@ -5,6 +5,73 @@ import datetime
 import numpy as np
 import pandas as pd
 
+SNIFF_BYTES = 1024  # enough for the two header lines and the first data lines of every supported format
+HYADLIBM_BANNER = 'The HYADES Equation-of-State Library'
+
+# Keys are file types, values are (reader, sniffer, mode). Filled in by register_reader
+READERS = {}
+
+
+def register_reader(file_type, sniffer=None, mode='r'):
+    """Decorator that adds a reader for a new EOS file format to EOSTable
+
+    Note:
+        The reader is called as reader(eos_table, f) with the file opened once in mode, and must set the
+        pressure_eos and energy_eos attributes of eos_table, plus info and material_name if the format has them.
+        Sniffers are tried in the order the readers were registered.
+
+    Args:
+        file_type (string): Name of the format, as passed to EOSTable(filename, file_type=...)
+        sniffer (callable, optional): Called as sniffer(filename, head), where head is the start of the file decoded
+                                      as text, returns True if the file is in this format. Without a sniffer the
+                                      format must be requested by name
+        mode (string, optional): Mode the file is opened in for the reader, 'r' or 'rb'
+
+    Returns:
+        decorator (callable)
+    """
+    def decorator(reader):
+        READERS[file_type] = (reader, sniffer, mode)
+        return reader
+    return decorator
+
+
+def sniff_file_type(filename, n_bytes=SNIFF_BYTES):
+    """Identifies the format of an EOS file from its name and first n_bytes
+
+    Returns:
+        file_type (string): Key of the matching reader in READERS, or None if no sniffer recognized the file
+    """
+    with open(filename, 'rb') as f:
+        head = f.read(n_bytes).decode('latin-1')
+    for file_type, (reader, sniffer, mode) in READERS.items():
+        if sniffer is not None and sniffer(filename, head):
+            return file_type
+    return None
+
+
+def _head_lines(head):
+    """Complete lines of the start of a file, with universal newlines, dropping the last line if it was cut off"""
+    lines = head.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return lines[:-1]
+
+
+def _sniff_excel(filename, head):
+    """xlsx files are zip archives, xls files are OLE2 compound documents"""
+    return filename.lower().endswith(('.xlsx', '.xls')) or head.startswith(('PK\x03\x04', '\xd0\xcf\x11\xe0'))
+
+
+def _sniff_hyadlibm(filename, head):
+    """hyadlibm prints its banner on the third line"""
+    lines = _head_lines(head)
+    return len(lines) > 2 and lines[2].strip() == HYADLIBM_BANNER
+
+
+def _sniff_fixed_width(filename, head):
+    """After the two header lines every full line of a fixed-width table holds five 15-character fields"""
+    data_lines = _head_lines(head)[2:10]
+    return len(data_lines) > 0 and all(len(line) == 75 for line in data_lines)
+
 
 class EOSTable:
     """Store all the data required by a Hyades EOS table in a single class
@@ -54,54 +121,24 @@ class EOSTable:
         self.temperatures = None
         self.densities = None
 
-        # Attempt to identify file format
-        if not file_type:  # Check for Excel file type
-            if self.filename.endswith('.xlsx') or self.filename.endswith('.xls'):
-                file_type = 'excel'
-
-        if not file_type:  # Check if file came from hyadlibm print EOS function
-            with open(self.filename) as f:
-                lines = f.readlines()
-            if lines[2].strip() == 'The HYADES Equation-of-State Library':
-                file_type = 'hyadlibm'
-
-        if not file_type:  # Check if file is fixed-width Hyades format
-            with open(self.filename) as f:
-                lines = f.readlines()
-            line_lengths = [len(line) for line in lines[2:10]]
-            if all([length == 76 for length in line_lengths]):  # if the first few data lines match fixed-width format
-                file_type = 'fixed width'
+        # Attempt to identify file format from the first few hundred bytes
+        if not file_type:
+            file_type = sniff_file_type(self.filename)
 
         if not file_type:
             error_string = f'Failed to identify {self.filename} as an excel EOS, hyadlibm EOS, or fixed-width EOS.' \
                            f'\nIf you believe your table is correctly formatted, try specifying the file type using' \
                            f'file_type= \'excel\', \'hyadlibm\', or \'fixed width\'.'
             raise Exception(error_string)
+        if file_type not in READERS:
+            raise ValueError(f'Unrecognized file type: {file_type!r}. Options are {", ".join(READERS)}')
 
-        # Begin read statements based on file_type
-        if file_type == 'excel':
-            p, e = self.read_excel_eos()
-            self.pressure_eos = p
-            self.energy_eos = e
-        elif file_type == 'hyadlibm':
-            raw_df = self.read_hyadlibm_eos()
-            pressure_eos = raw_df.pivot_table(values='Pressure', index='Temperature', columns='Density')
-            pressure_eos.index.rename('Temperature (K)', inplace=True)
-            pressure_eos.columns.rename('Density (g/cc)', inplace=True)
-            self.pressure_eos = pressure_eos
-            energy_eos = raw_df.pivot_table(values='Energy', index='Temperature', columns='Density')
-            energy_eos.index.rename('Temperature (K)', inplace=True)
-            energy_eos.columns.rename('Density (g/cc)', inplace=True)
-            self.energy_eos = energy_eos
-        elif file_type == 'fixed width':
-            self.get_fixed_width_eos_info()
-            temperatures, densities, df_pressure, df_energy = self.read_fixed_width_eos()
-            self.temperatures = temperatures
-            self.densities = densities
-            self.pressure_eos = df_pressure
-            self.energy_eos = df_energy
-
-        if file_type == 'excel' or file_type == 'hyadlibm':
+        # Parse the whole file from a single open file handle
+        reader, sniffer, mode = READERS[file_type]
+        with open(self.filename, mode) as f:
+            reader(self, f)
+
+        if self.temperatures is None:
             self.temperatures = self.pressure_eos.index.to_numpy()
             self.densities = self.pressure_eos.columns.to_numpy()
 
@@ -114,7 +151,7 @@ class EOSTable:
         except ValueError:
             return False
 
-    def get_hyadlibm_eos_info(self):
+    def get_hyadlibm_eos_info(self, lines=None):
         """Loads all the descriptive information from the hyadlibm printed EOS file into the class
         Todo:
             - I don't think hyadlibm files contain the material name, idk how to get
@@ -123,9 +160,13 @@ class EOSTable:
         Return:
             info (dict): Keys are variables, values are entries
 
+        Args:
+            lines (list, optional): Lines of the file, read from self.filename if not given
+
         """
-        with open(self.filename) as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(self.filename) as f:
+                lines = f.readlines()
         string = lines[7]
 
         self.info['Date Created'] = string.split()[0]
@@ -148,7 +189,7 @@ class EOSTable:
 
         return self.info
 
-    def get_fixed_width_eos_info(self):
+    def get_fixed_width_eos_info(self, lines=None):
         """Reads the material information from a fixed-width Hyades EOS format and assigns self.info dictionary
 
         Todo:
@@ -167,11 +208,16 @@ class EOSTable:
             5 not used
             6 not used
 
+        Args:
+            lines (list, optional): Lines of the file, read from self.filename if not given
+
         Returns:
+            info (dict): Keys are variables, values are entries
 
         """
-        with open(self.filename) as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(self.filename) as f:
+                lines = f.readlines()
 
         self.material_name = lines[0].split()[0]  # Material name is usually the first word in the fixed width file
 
@@ -184,7 +230,7 @@ class EOSTable:
 
         return self.info
 
-    def read_fixed_width_eos(self):
+    def read_fixed_width_eos(self, lines=None):
         """Reads the EOS table info from a fixed-width EOS table.
 
         Note:
@@ -212,11 +258,15 @@ class EOSTable:
             The above formatting ensures all floats are 15 characters long
             There are 5 floats per line, for a line width of 75 characters
 
+        Args:
+            lines (list, optional): Lines of the file, read from self.filename if not given
+
         Returns:
             temperatures (numpy array), densities (numpy array), pressures (Pandas DataFrame), energies (Pandas DataFrame)
         """
-        with open(self.filename) as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(self.filename) as f:
+                lines = f.readlines()
 
         all_data = ''.join(lines[2:])
         all_data = all_data.replace('\n', '')
@@ -260,34 +310,39 @@ class EOSTable:
 
         return temperatures, densities, df_pressure, df_energy
 
-    def read_hyadlibm_eos(self):
+    def read_hyadlibm_eos(self, lines=None):
         """Read an eos table from the Hyades hyadlibm formatting
 
+        Args:
+            lines (list, optional): Lines of the file, read from self.filename if not given
+
         Returns:
             df (Pandas DataFrame): columns for the Density, Temperature, Pressure, and Energy of the Material
 
         """
-        self.get_hyadlibm_eos_info()
-
-        with open(self.filename) as f:
-            lines = f.readlines()
+        if lines is None:
+            with open(self.filename) as f:
+                lines = f.readlines()
+        self.get_hyadlibm_eos_info(lines)
 
-        df = pd.DataFrame(columns=['Density', 'Temperature', 'Pressure', 'Energy'])
+        # Collect the rows in lists and build the DataFrame once, appending to a DataFrame copies it every time
+        densities, temperatures, pressures, energies = [], [], [], []
         mode = None
+        temps = []
         for line in lines:
-            if not line.split():  # skip blank lines
+            words = line.split()
+            if not words:  # skip blank lines
                 continue
 
-            first_word = line.split()[0]  # first_word could be a string or a float
+            first_word = words[0]  # first_word could be a string or a float
             if first_word == 'Pressure':
                 mode = 'Pressure'
             elif first_word == 'Energy':
                 mode = 'Energy'
 
-            if len(line.split()) >= 2:  # skip lines that have only one word
-                if line.split()[1] == 'T=':
-                    temps = line.split()[2:]
-                    temps = [float(i) for i in temps]
+            if len(words) >= 2:  # skip lines that have only one word
+                if words[1] == 'T=':
+                    temps = [float(i) for i in words[2:]]
 
             if self.is_float(first_word):
                 '''
@@ -297,40 +352,42 @@ class EOSTable:
                 The number before the space is the density, then every 11 characters is a new entry in the table
                 Note in some lines of the file there is no "-", there is a space to represent positive values
                 '''
-                den = [float(first_word) for i in range(len(temps))]  # copy the density 10 times
                 values = [float(line[15+i*11: 15+(i+1)*11]) for i in range(len(temps))]
-
+                densities.extend([float(first_word)] * len(temps))  # copy the density once per temperature
+                temperatures.extend(temps)
                 if mode == 'Pressure':
-                    new_data = pd.DataFrame({'Density': den,
-                                             'Temperature': temps,
-                                             'Pressure': values
-                                             })
+                    pressures.extend(values)
+                    energies.extend([np.nan] * len(temps))
                 elif mode == 'Energy':
-                    new_data = pd.DataFrame({'Density': den,
-                                             'Temperature': temps,
-                                             'Energy': values
-                                             })
-
-                df = df.append(new_data, ignore_index=True)
+                    pressures.extend([np.nan] * len(temps))
+                    energies.extend(values)
 
-        df.loc[:, 'Temperature'] = df['Temperature'] * 11605 * 1000  # convert KeV to Kelvin
-        df.loc[:, 'Pressure'] = df['Pressure'] * 1e-10  # convert hyades units to GPa
+        df = pd.DataFrame({'Density': densities,
+                           'Temperature': np.array(temperatures) * 11605 * 1000,  # convert KeV to Kelvin
+                           'Pressure': np.array(pressures) * 1e-10,  # convert hyades units to GPa
+                           'Energy': energies})
         # energy is in erg/g, I think 1 erg = 1e-10 joules but where does the gram come from
         # density is already in g/cc
 
         return df
 
-    def read_excel_eos(self):
+    def read_excel_eos(self, excel_file=None):
         """Loads the EOSTable class with eos data from a neatly formatted excel file
 
+        Args:
+            excel_file (file, optional): Workbook opened in binary mode, self.filename is opened if not given
+
         Returns:
             pressure_eos (Numpy Array), energy_eos (Numpy Array)
 
         """
-        pressure_eos = pd.read_excel(self.filename, index_col=0, sheet_name='Pressure')
-        energy_eos = pd.read_excel(self.filename, index_col=0, sheet_name='Energy')
+        if excel_file is None:
+            excel_file = self.filename
+        with pd.ExcelFile(excel_file) as workbook:  # parse every sheet from one open workbook
+            pressure_eos = workbook.parse(sheet_name='Pressure', index_col=0)
+            energy_eos = workbook.parse(sheet_name='Energy', index_col=0)
+            df_info = workbook.parse(sheet_name='Info', index_col=0)
 
-        df_info = pd.read_excel(self.filename, index_col=0, sheet_name='Info')
         self.material_name = df_info.loc['Material Name'][0]
         for k in self.info:  # Check the excel file for a row named after each key in the info dictionary
             i = df_info.loc[k][0]
@@ -343,6 +400,32 @@ class EOSTable:
 
         return pressure_eos, energy_eos
 
+    @register_reader('excel', sniffer=_sniff_excel, mode='rb')
+    def _load_excel(self, f):
+        self.pressure_eos, self.energy_eos = self.read_excel_eos(f)
+
+    @register_reader('hyadlibm', sniffer=_sniff_hyadlibm)
+    def _load_hyadlibm(self, f):
+        raw_df = self.read_hyadlibm_eos(f.readlines())
+        pressure_eos = raw_df.pivot_table(values='Pressure', index='Temperature', columns='Density')
+        pressure_eos.index.rename('Temperature (K)', inplace=True)
+        pressure_eos.columns.rename('Density (g/cc)', inplace=True)
+        self.pressure_eos = pressure_eos
+        energy_eos = raw_df.pivot_table(values='Energy', index='Temperature', columns='Density')
+        energy_eos.index.rename('Temperature (K)', inplace=True)
+        energy_eos.columns.rename('Density (g/cc)', inplace=True)
+        self.energy_eos = energy_eos
+
+    @register_reader('fixed width', sniffer=_sniff_fixed_width)
+    def _load_fixed_width(self, f):
+        lines = f.readlines()
+        self.get_fixed_width_eos_info(lines)
+        temperatures, densities, df_pressure, df_energy = self.read_fixed_width_eos(lines)
+        self.temperatures = temperatures
+        self.densities = densities
+        self.pressure_eos = df_pressure
+        self.energy_eos = df_energy
+
 
 if __name__ == '__main__':
     filename = 'data/REODP/REODP_diamond_eos-Detailed_AllPhases.xlsx'
@@ -1,32 +1,115 @@
+import io
+import re
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
 plt.style.use('ggplot')
 
 
+# Multiply the raw Hyades values to get: density in g/cc, pressure in GPa, energy in J (NOT SURE ENRGY IS IN ERGS),
+# temperature in Kelvin, and particle and shock velocities in km/s = um/ns
+UNIT_CONVERSIONS = {'Rho': 1, 'Pres': 1e-10, 'Enrgy': 1e-7, 'Temp': 11605 * 1000, 'Up': 1e-5, 'Us': 1e-5}
+
+
 def read_hugoniot(filename):
     """Read a hugoniot table formatted by the Hyades hugoniot function
 
+    Note:
+        The file is opened once. The four header lines are read from the handle and the table is parsed from the same
+        handle by the C engine of pandas, splitting on any whitespace, so negative values and short rows are handled.
+        The material id, Zbar, Abar and reference density of the header are kept in df.attrs.
+
     Args:
         filename (string): filename of hugoniot to be read
 
     Returns:
         df (Pandas.DataFrame): Pandas DataFrame with each column as a variable in the hugoniot
     """
-    
     with open(filename) as f:
-        lines = f.readlines()
-    variables = lines[3].split()  # the fourth line of the hugoniot table is the variable headers
-    # The variable headers should be Rho, Pres, Enrgy, Temp, Up, Us
-    df = pd.read_csv(filename, names=variables, skiprows=4, sep='  ', engine='python')
-
-    # density is already in g/cc
-    df['Up'] *= 1e-5  # convert cm/s to km/s = um/ns
-    df['Us'] *= 1e-5  # convert cm/s to km/s = um/ns
-    df['Pres'] *= 1e-10  # convert dynes/cm^2 to GPa
-    df['Temp'] *= (11605 * 1000)  # convert KeV to Kelvin
-    df['Enrgy'] *= 1e-7  # converts erg to Joules, NOT SURE ENRGY IS IN ERGS
+        header = [f.readline() for _ in range(4)]
+        variables = header[3].split()  # the fourth line of the hugoniot table is the variable headers
+        # The variable headers should be Rho, Pres, Enrgy, Temp, Up, Us
+        df = pd.read_csv(f, names=variables, header=None, sep=r'\s+', engine='c', dtype=np.float64)
+
+    df.attrs = read_hugoniot_header(header)
+    return convert_hugoniot_units(df)
+
+
+def convert_hugoniot_units(df):
+    """Converts every variable of a raw hugoniot DataFrame from Hyades units in place with one vectorized multiply"""
+    columns = [column for column in df.columns if column in UNIT_CONVERSIONS]
+    df[columns] = df[columns].to_numpy() * np.array([UNIT_CONVERSIONS[column] for column in columns])
+    return df
+
+
+def read_hugoniot_header(header):
+    """Reads the material id, Zbar, Abar and reference density from the first lines of a hugoniot table
+
+    Args:
+        header (list): The first lines of the hugoniot file
 
+    Returns:
+        info (dict): Keys are Material ID, Zbar, Abar and Rho, missing entries are left out
+    """
+    text = ''.join(header)
+    info = {}
+    match = re.search(r'material id:\s*(\d+)', text)
+    if match:
+        info['Material ID'] = int(match.group(1))
+    for key in ('Zbar', 'Abar', 'Rho'):
+        match = re.search(rf'{key}\s*=\s*(\S+)', text)
+        if match:
+            info[key] = float(match.group(1))
+    return info
+
+
+def read_hugoniots(paths, keys=None):
+    """Reads many hugoniot tables into one long-form DataFrame for ensemble comparisons
+
+    Note:
+        The tables of all the files are joined and parsed by a single pandas C-engine call, and the units of the whole
+        ensemble are converted at once, so the cost per file is little more than reading it.
+
+    Args:
+        paths (list or dict): Hugoniot filenames, or a dictionary of run keys to filenames
+        keys (list, optional): Run key of each filename in paths, defaults to the filename without its extension
+
+    Returns:
+        df (Pandas.DataFrame): One row per hugoniot point with a run column holding the run key, a point column
+                               numbering the points of each run from 0, then a column per variable in the hugoniot
+    """
+    if isinstance(paths, dict):
+        keys, paths = list(paths.keys()), list(paths.values())
+    else:
+        paths = list(paths)
+        if keys is None:
+            keys = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    if len(keys) != len(paths):
+        raise ValueError(f'Got {len(keys)} keys for {len(paths)} hugoniot files')
+    if len(set(keys)) != len(keys):
+        raise ValueError('Run keys must be unique, pass keys= when several files share a name')
+
+    variables = None
+    tables, n_points = [], []
+    for path in paths:
+        with open(path) as f:
+            header = [f.readline() for _ in range(4)]
+            table = f.read()
+        if variables is None:
+            variables = header[3].split()
+        elif header[3].split() != variables:
+            raise ValueError(f'{path} has the variables {header[3].split()}, the first file has {variables}')
+        if table and not table.endswith('\n'):
+            table += '\n'
+        tables.append(table)
+        n_points.append(sum(1 for line in table.splitlines() if line.strip()))  # blank lines are skipped by read_csv
+
+    df = pd.read_csv(io.StringIO(''.join(tables)), names=variables, header=None, sep=r'\s+', engine='c',
+                     dtype=np.float64)
+    convert_hugoniot_units(df)
+    df.insert(0, 'run', np.repeat(np.array(keys, dtype=object), n_points))
+    df.insert(1, 'point', np.concatenate([np.arange(n) for n in n_points]) if n_points else [])
     return df
 
 
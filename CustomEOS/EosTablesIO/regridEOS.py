@@ -0,0 +1,382 @@
+"""Resampling of EOS tables onto new density and temperature grids, including grids sized for the Hyades file limit"""
+import numpy as np
+import pandas as pd
+from scipy.interpolate import PchipInterpolator
+from EosTablesIO.EosTable import EosTable
+
+MAX_DATA_LENGTH = 99999  # The data length in the header of a Hyades EOS table is a 5 digit integer
+
+
+def data_length(n_densities, n_temperatures):
+    """Number of words after the header of a Hyades EOS table, 2*NR*NT + NR + NT + 2"""
+    return 2 * n_densities * n_temperatures + n_densities + n_temperatures + 2
+
+
+def fit_grid_size(n_densities, n_temperatures, max_data_length=MAX_DATA_LENGTH):
+    """Largest grid size with the aspect ratio of NR x NT that fits in a Hyades EOS table
+
+    Args:
+        n_densities (int): Requested number of densities, NR
+        n_temperatures (int): Requested number of temperatures, NT
+        max_data_length (int, optional): Largest allowed data_length
+
+    Returns:
+        n_densities (int), n_temperatures (int): Unchanged if they already fit
+    """
+    if data_length(n_densities, n_temperatures) <= max_data_length:
+        return n_densities, n_temperatures
+
+    # Solve 2 r NT^2 + (r + 1) NT + 2 = max_data_length for NT, with NR = r NT
+    ratio = n_densities / n_temperatures
+    a, b, c = 2 * ratio, ratio + 1, 2 - max_data_length
+    n_temperatures = int((-b + np.sqrt(b ** 2 - 4 * a * c)) / (2 * a))
+    n_densities = int(ratio * n_temperatures)
+    while data_length(n_densities, n_temperatures) > max_data_length:
+        if n_densities >= ratio * n_temperatures:
+            n_densities -= 1
+        else:
+            n_temperatures -= 1
+    return max(n_densities, 2), max(n_temperatures, 2)
+
+
+def log_grid(minimum, maximum, n_points, first_positive=None):
+    """Logarithmically spaced grid from minimum to maximum
+
+    Args:
+        minimum (float): First point, may be 0
+        maximum (float): Last point
+        n_points (int): Number of points
+        first_positive (float, optional): When minimum is 0, the grid is 0 followed by n_points - 1 log spaced
+                                          points starting at first_positive. Defaults to maximum / 1e6
+
+    Returns:
+        grid (numpy.array): Shape (n_points,)
+    """
+    if minimum > 0:
+        return np.geomspace(minimum, maximum, n_points)
+    first_positive = first_positive or maximum * 1e-6
+    return np.concatenate(([minimum], np.geomspace(first_positive, maximum, n_points - 1)))
+
+
+def hyades_grid(eos_table, n_densities=None, n_temperatures=None, max_data_length=MAX_DATA_LENGTH):
+    """Log spaced grid over the range of a table, sized to fit in a Hyades EOS table
+
+    Note:
+        Without n_densities and n_temperatures the grid keeps the number of points of the table, shrunk with the same
+        aspect ratio if the table does not fit. With only one of them, the other is as large as fits.
+
+    Args:
+        eos_table (EosTable or EOSTable): Table whose density and temperature range is covered
+        n_densities (int, optional): Number of densities
+        n_temperatures (int, optional): Number of temperatures
+        max_data_length (int, optional): Largest allowed data_length
+
+    Returns:
+        densities (numpy.array): In g/cc
+        temperatures (numpy.array): In Kelvin
+    """
+    densities = np.asarray(eos_table.pressure_eos.columns, dtype=np.float64)
+    temperatures = np.asarray(eos_table.pressure_eos.index, dtype=np.float64)
+    if n_densities is None and n_temperatures is None:
+        n_densities, n_temperatures = fit_grid_size(len(densities), len(temperatures), max_data_length)
+    elif n_temperatures is None:
+        n_temperatures = (max_data_length - 2 - n_densities) // (2 * n_densities + 1)
+    elif n_densities is None:
+        n_densities = (max_data_length - 2 - n_temperatures) // (2 * n_temperatures + 1)
+    if data_length(n_densities, n_temperatures) > max_data_length:
+        raise ValueError(f'A grid of {n_densities} densities and {n_temperatures} temperatures has '
+                         f'{data_length(n_densities, n_temperatures)} data points, more than {max_data_length}')
+
+    positive_densities = densities[densities > 0]
+    positive = temperatures[temperatures > 0]
+    return (log_grid(densities.min(), densities.max(), n_densities,
+                     first_positive=positive_densities.min() if len(positive_densities) else None),
+            log_grid(temperatures.min(), temperatures.max(), n_temperatures,
+                     first_positive=positive.min() if len(positive) else None))
+
+
+def regrid_eos(eos_table, densities=None, temperatures=None, max_data_length=MAX_DATA_LENGTH, extrapolate=False):
+    """Resamples the pressures and energies of a table onto a new density and temperature grid
+
+    Note:
+        The tables are interpolated with monotone piecewise cubic Hermite polynomials (PCHIP) in log density and log
+        temperature, first along density and then along temperature. Each pass is one vectorized call over every row
+        of both the pressure and energy tables. PCHIP does not overshoot, so a table that is monotone along an axis
+        stays monotone. A table with a 0 K row is interpolated in log(T + T1) instead, where T1 is its smallest
+        positive temperature, and a table with a 0 g/cc column likewise in log(rho + rho1).
+        The source grid may be in any order, such as the decreasing densities of a uniform REODP volume grid.
+
+    Args:
+        eos_table (EosTable or EOSTable): Table to resample
+        densities (numpy.array, optional): Target densities in g/cc. Defaults to hyades_grid
+        temperatures (numpy.array, optional): Target temperatures in Kelvin. Defaults to hyades_grid
+        max_data_length (int, optional): Largest data_length of the automatically sized grid
+        extrapolate (bool, optional): Toggle to allow target points outside the range of the table
+
+    Returns:
+        eos_table (EosTable): New table on the target grid, with a copy of the info of eos_table
+    """
+    source_densities, source_temperatures, values = _sorted_tables(eos_table)
+
+    if densities is None or temperatures is None:
+        n_densities = None if densities is None else len(densities)
+        n_temperatures = None if temperatures is None else len(temperatures)
+        auto_densities, auto_temperatures = hyades_grid(eos_table, n_densities, n_temperatures, max_data_length)
+        densities = auto_densities if densities is None else densities
+        temperatures = auto_temperatures if temperatures is None else temperatures
+    densities = np.array(densities, dtype=np.float64)
+    temperatures = np.array(temperatures, dtype=np.float64)
+
+    if not extrapolate:
+        for name, target, source in (('Densities', densities, source_densities),
+                                     ('Temperatures', temperatures, source_temperatures)):
+            tolerance = 1e-9 * np.abs(source).max()
+            if target.min() < source[0] - tolerance or target.max() > source[-1] + tolerance:
+                raise ValueError(f'{name} {target.min():.6g} to {target.max():.6g} are outside the table range '
+                                 f'{source[0]:.6g} to {source[-1]:.6g}, pass extrapolate=True to allow this')
+            target.clip(source[0], source[-1], out=target)
+    density_shift = _log_shift(source_densities)
+    if densities.min() + density_shift <= 0:
+        raise ValueError('Densities must be positive to interpolate in log density, unless the table has a 0 g/cc '
+                         'column')
+
+    shift = _log_shift(source_temperatures)
+    along_density = PchipInterpolator(np.log(source_densities + density_shift), values, axis=2,
+                                      extrapolate=extrapolate)(np.log(densities + density_shift))
+    values = PchipInterpolator(np.log(source_temperatures + shift), along_density, axis=1,
+                               extrapolate=extrapolate)(np.log(temperatures + shift))
+
+    return _table_like(eos_table, densities, temperatures, values)
+
+
+def _sorted_tables(eos_table):
+    """Densities and temperatures of a table in increasing order, and its stacked pressures and energies to match
+
+    Returns:
+        densities (numpy.array): Shape (NR,)
+        temperatures (numpy.array): Shape (NT,)
+        values (numpy.array): Shape (2, NT, NR), pressures then energies
+    """
+    densities = np.asarray(eos_table.pressure_eos.columns, dtype=np.float64)
+    temperatures = np.asarray(eos_table.pressure_eos.index, dtype=np.float64)
+    density_order, temperature_order = np.argsort(densities), np.argsort(temperatures)
+    values = np.stack([eos_table.pressure_eos.to_numpy(dtype=np.float64),
+                       eos_table.energy_eos.to_numpy(dtype=np.float64)])
+    return densities[density_order], temperatures[temperature_order], values[:, temperature_order][:, :, density_order]
+
+
+def _log_shift(grid):
+    """x1 of the log(x + x1) coordinate of a grid, its smallest positive point if it has a 0 K row or 0 g/cc column"""
+    positive = grid[grid > 0]
+    return positive.min() if grid.min() <= 0 and len(positive) else 0.0
+
+
+def _table_like(eos_table, densities, temperatures, values):
+    """EosTable with the material and info of eos_table and the stacked pressures and energies in values"""
+    info = dict(eos_table.info)
+    df_pressure = pd.DataFrame(data=values[0], columns=densities, index=temperatures)
+    df_pressure.index.rename('Temperature (K)', inplace=True)
+    df_pressure.columns.rename('Density (g/cc)', inplace=True)
+    df_energy = pd.DataFrame(data=values[1], columns=densities, index=temperatures)
+    df_energy.index.rename('Temperatures (K)', inplace=True)
+    df_energy.columns.rename('Density (g/cc)', inplace=True)
+    return EosTable(material_name=eos_table.material_name, info=info, pressure_eos=df_pressure,
+                    energy_eos=df_energy, temperatures=temperatures, densities=densities)
+
+
+def adaptive_grid(eos_table, n_densities=None, n_temperatures=None, max_data_length=MAX_DATA_LENGTH, tolerance=0.0,
+                  required_densities=None, required_temperatures=None, floor=1e-6, n_candidates=3):
+    """Picks the density and temperature nodes of a fine table that best reproduce it under PCHIP interpolation
+
+    Note:
+        The error is measured on the combined grid: the table is interpolated from the current density and
+        temperature nodes back onto its full grid the way regrid_eos does, and the error of every cell is the larger
+        relative error of its pressure and energy, |interpolated - table| / (|table| + atol) with atol = floor *
+        max|table| of the field. Starting from the end points of both axes, one node is added per round. The
+        n_candidates density columns and temperature rows with the largest errors are each tried, and the one that
+        lowers the sum of the cubed cell errors the most per word of Hyades data it adds is kept. A column costs
+        2 NT + 1 words and a row 2 NR + 1, so the budget is shared between the axes according to where the table
+        needs nodes rather than split in advance. Nodes therefore cluster where the table bends or jumps, such as at
+        phase transitions, and stay sparse where it is smooth. PCHIP is local, so each try re-interpolates only the
+        few intervals next to the new node.
+        Growth stops once no further node fits the budget, or once the largest error is at most tolerance, which can
+        leave a table smaller than the budget.
+
+    Args:
+        eos_table (EosTable or EOSTable): Fine source table, the nodes are a subset of its grid
+        n_densities (int, optional): With n_temperatures, the budget is the data_length of an n_densities x
+                                     n_temperatures table. Defaults to fit_grid_size of the table
+        n_temperatures (int, optional): See n_densities. Defaults to fit_grid_size of the table
+        max_data_length (int, optional): Largest data_length of the default budget
+        tolerance (float, optional): Relative error at which the grid stops growing, 0 uses the whole budget
+        required_densities (list, optional): Densities whose nearest table densities are always nodes, such as the
+                                             phase interfaces of ReodpModel.PHASE_INTERFACE_VOLUMES converted to
+                                             densities
+        required_temperatures (list, optional): Temperatures whose nearest table temperatures are always nodes
+        floor (float, optional): Relative error floor, as a fraction of the largest magnitude of each field
+        n_candidates (int, optional): Number of columns and of rows tried in every round
+
+    Returns:
+        densities (numpy.array): In g/cc
+        temperatures (numpy.array): In Kelvin
+    """
+    densities, temperatures, values = _sorted_tables(eos_table)
+    if n_densities is None or n_temperatures is None:
+        fit_densities, fit_temperatures = fit_grid_size(len(densities), len(temperatures), max_data_length)
+        n_densities = n_densities or fit_densities
+        n_temperatures = n_temperatures or fit_temperatures
+    budget = data_length(n_densities, n_temperatures)
+    if budget > max_data_length:
+        raise ValueError(f'A grid of {n_densities} densities and {n_temperatures} temperatures has '
+                         f'{budget} data points, more than {max_data_length}')
+
+    atol = floor * np.abs(values).reshape(2, -1).max(axis=1)[:, np.newaxis, np.newaxis]
+    nodes = []
+    for grid, required in ((densities, required_densities), (temperatures, required_temperatures)):
+        nodes.append(np.union1d([0, len(grid) - 1], _nearest_nodes(grid, required)).astype(int))
+    if data_length(len(nodes[0]), len(nodes[1])) > budget:
+        raise ValueError(f'The {len(nodes[0])} required densities and {len(nodes[1])} required temperatures do not '
+                         f'fit in a data length of {budget}')
+    combined = _CombinedGridError(np.log(densities + _log_shift(densities)),
+                                  np.log(temperatures + _log_shift(temperatures)), values, atol, *nodes)
+
+    while combined.error.max() > tolerance:
+        best = None
+        for axis in (0, 1):
+            n_nodes = [len(combined.nodes[0]), len(combined.nodes[1])]
+            n_nodes[axis] += 1
+            if data_length(*n_nodes) > budget or len(combined.nodes[axis]) == combined.error.shape[1 - axis]:
+                continue
+            scores = combined.error.max(axis=axis)
+            scores[combined.nodes[axis]] = -1.0
+            for node in np.argsort(-scores)[:n_candidates]:
+                if scores[node] < 0:
+                    break
+                trial = combined.try_node(axis, node)
+                if best is None or trial[0] > best[0]:
+                    best = trial
+        if best is None:
+            break
+        combined.add_node(*best[1:])
+
+    return densities[combined.nodes[0]], temperatures[combined.nodes[1]]
+
+
+def adaptive_regrid_eos(eos_table, **kwargs):
+    """Resamples a fine table onto its adaptive_grid, taking the same keyword arguments
+
+    Returns:
+        eos_table (EosTable)
+    """
+    densities, temperatures = adaptive_grid(eos_table, **kwargs)
+    return regrid_eos(eos_table, densities, temperatures)
+
+
+def interpolation_error(fine_table, coarse_table, floor=1e-6):
+    """Largest and RMS relative error of a coarse table interpolated back onto the grid of a fine table
+
+    Args:
+        fine_table (EosTable or EOSTable): Reference table
+        coarse_table (EosTable or EOSTable): Table within the range of the reference
+        floor (float, optional): Relative error floor, as a fraction of the largest magnitude of each field
+
+    Returns:
+        errors (dict): max and rms relative errors of the pressures and energies, keyed max_P, rms_P, max_E, rms_E
+    """
+    densities, temperatures, values = _sorted_tables(fine_table)
+    approximate = _sorted_tables(regrid_eos(coarse_table, densities, temperatures))[2]
+    atol = floor * np.abs(values).reshape(2, -1).max(axis=1)[:, np.newaxis, np.newaxis]
+    relative = np.abs(approximate - values) / (np.abs(values) + atol)
+    return {'max_P': relative[0].max(), 'rms_P': np.sqrt(np.mean(relative[0] ** 2)),
+            'max_E': relative[1].max(), 'rms_E': np.sqrt(np.mean(relative[1] ** 2))}
+
+
+def _nearest_nodes(grid, points):
+    """Indices of the grid points nearest to each of points"""
+    if points is None or len(points) == 0:
+        return np.array([], dtype=int)
+    return np.unique(np.abs(grid[np.newaxis, :] - np.asarray(points, dtype=np.float64)[:, np.newaxis]).argmin(axis=1))
+
+
+class _CombinedGridError:
+    """Cell errors of a table interpolated from a subset of its density columns and temperature rows, as regrid_eos
+    interpolates, kept up to date as nodes are added
+
+    Attributes:
+        nodes (list): Indices of the density nodes and of the temperature nodes, each increasing
+        error (numpy.array): Shape (NT, NR), larger relative error of the pressure and energy of every cell
+    """
+    def __init__(self, density_coordinates, temperature_coordinates, values, atol, density_nodes,
+                 temperature_nodes) -> None:
+        self.coordinates = (density_coordinates, temperature_coordinates)
+        self.values = values
+        self.atol = atol
+        self.nodes = [np.asarray(density_nodes), np.asarray(temperature_nodes)]
+        # The density pass at the temperature nodes, shape (2, n temperature nodes, NR)
+        self.along_density = PchipInterpolator(density_coordinates[self.nodes[0]],
+                                               values[:, self.nodes[1]][:, :, self.nodes[0]],
+                                               axis=2)(density_coordinates)
+        interpolated = PchipInterpolator(temperature_coordinates[self.nodes[1]], self.along_density,
+                                         axis=1)(temperature_coordinates)
+        self.error = self._cell_error(interpolated, slice(None), slice(None))
+
+    def _cell_error(self, interpolated, rows, columns):
+        table = self.values[:, rows, columns]
+        return (np.abs(interpolated - table) / (np.abs(table) + self.atol)).max(axis=0)
+
+    @staticmethod
+    def _band(nodes, position):
+        """Local nodes whose PCHIP fit matches the full fit where a node inserted at position changes it
+
+        Returns:
+            local (slice): Positions of the nodes to fit
+            first (int), last (int): Range of source points whose interpolated values change
+        """
+        # PCHIP slopes at a node depend on its two intervals, and at an end node on the first or last two, so the
+        # new node changes the slopes of its neighbours and the intervals up to two nodes away
+        first, last = max(position - 2, 0), min(position + 2, len(nodes) - 1)
+        return slice(max(position - 3, 0), position + 4), nodes[first], nodes[last]
+
+    def try_node(self, axis, node):
+        """Interpolation with one more node along axis, 0 for a density and 1 for a temperature
+
+        Returns:
+            gain (float): Decrease of the sum of the cubed cell errors per word of Hyades data the node adds
+            axis (int), node (int), nodes (numpy.array), band (tuple), along_density (numpy.array), error
+            (numpy.array): What add_node needs to keep the node
+        """
+        nodes = self.nodes[axis]
+        position = np.searchsorted(nodes, node)
+        new_nodes = np.insert(nodes, position, node)
+        local, first, last = _CombinedGridError._band(new_nodes, position)
+        band = slice(first, last + 1)
+        density_coordinates, temperature_coordinates = self.coordinates
+        if axis == 0:
+            along_density = PchipInterpolator(density_coordinates[new_nodes[local]],
+                                              self.values[:, self.nodes[1]][:, :, new_nodes[local]],
+                                              axis=2)(density_coordinates[band])
+            interpolated = PchipInterpolator(temperature_coordinates[self.nodes[1]], along_density,
+                                             axis=1)(temperature_coordinates)
+            error = self._cell_error(interpolated, slice(None), band)
+            old_error = self.error[:, band]
+        else:
+            along_density = PchipInterpolator(density_coordinates[self.nodes[0]],
+                                              self.values[:, node, self.nodes[0]], axis=1)(density_coordinates)
+            rows = np.insert(self.along_density, position, along_density, axis=1)[:, local]
+            interpolated = PchipInterpolator(temperature_coordinates[new_nodes[local]], rows,
+                                             axis=1)(temperature_coordinates[band])
+            error = self._cell_error(interpolated, band, slice(None))
+            old_error = self.error[band]
+        words = 2 * len(self.nodes[1 - axis]) + 1
+        gain = (np.sum(old_error ** 3) - np.sum(error ** 3)) / words
+        return gain, axis, position, new_nodes, band, along_density, error
+
+    def add_node(self, axis, position, new_nodes, band, along_density, error):
+        """Keeps a node tried with try_node"""
+        self.nodes[axis] = new_nodes
+        if axis == 0:
+            self.along_density[:, :, band] = along_density
+            self.error[:, band] = error
+        else:
+            self.along_density = np.insert(self.along_density, position, along_density, axis=1)
+            self.error[band] = error
@@ -0,0 +1,204 @@
+"""EosTables backed by one multiprocessing.shared_memory segment, so worker processes read the base table in place
+
+The densities, temperatures, pressures and energies of a table are copied once into a shared memory segment. The owner
+passes a small picklable SharedEosTableHandle to each worker, which attaches to the segment without copying or
+re-parsing the table. The segment starts with a reference count of the owner and every attached worker. The process
+that releases the last reference unlinks the segment.
+
+The segment is kept out of the resource trackers of every process, including the owner's. A tracker unlinks the
+segments registered with it when its processes exit, which would pull the table from under workers that outlive the
+process that attached first. Workers started by the owner share its tracker, whose registry is a set, so
+registrations are only ever made and undone in pairs under the reference count lock.
+"""
+import os
+import sys
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker, util
+import numpy as np
+import pandas as pd
+from EosTablesIO.EosTable import EosTable
+
+HEADER_BYTES = 64  # reference count, padded so the float64 arrays that follow stay aligned
+
+
+class SharedEosTableHandle:
+    """Picklable description of a shared EOS table, attach it in a worker to get the table
+
+    Note:
+        The handle holds a multiprocessing lock guarding the reference count, so like any multiprocessing lock it
+        must reach a worker when the worker is started, as an argument of multiprocessing.Process or in the initargs
+        of a multiprocessing.Pool, not with each task.
+
+    Attributes:
+        name (string): Name of the shared memory segment
+        n_temperatures (int): Rows of the pressure and energy tables
+        n_densities (int): Columns of the pressure and energy tables
+        material_name (string): Material name of the table
+        info (dict): Info of the table
+        index_names (tuple): Names of the temperature index of the pressure and energy DataFrames
+        columns_name (string): Name of the density columns of the DataFrames
+
+    """
+    def __init__(self, name, n_temperatures, n_densities, material_name, info, index_names, columns_name,
+                 lock) -> None:
+        self.name = name
+        self.n_temperatures = n_temperatures
+        self.n_densities = n_densities
+        self.material_name = material_name
+        self.info = info
+        self.index_names = index_names
+        self.columns_name = columns_name
+        self.lock = lock
+
+    @property
+    def nbytes(self):
+        """Size of the shared memory segment"""
+        return HEADER_BYTES + 8 * (self.n_temperatures + self.n_densities
+                                   + 2 * self.n_temperatures * self.n_densities)
+
+    def attach(self):
+        """Attaches to the segment and counts one more reference to it
+
+        Returns:
+            shared_table (SharedEosTable): Read-only view of the table, release it when done
+        """
+        with self.lock:
+            shm = _open_segment(self.name)
+            count = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+            if count[0] <= 0:
+                shm.close()
+                raise RuntimeError(f'The shared EOS table {self.name} has already been released')
+            count[0] += 1
+            del count
+        return SharedEosTable(self, shm)
+
+
+class SharedEosTable:
+    """Read-only EosTable whose arrays live in a shared memory segment
+
+    Note:
+        Use SharedEosTable.create in the owner process and SharedEosTableHandle.attach in the workers. Each call
+        takes one reference, given back by release, by leaving a with block, when the object is garbage collected,
+        or when a multiprocessing worker exits normally. Workers killed by Pool.terminate, which leaving a Pool's
+        with block calls, never give their references back, so close and join the pool instead.
+        On Windows the operating system frees the segment once no process has it open, so the owner should hold its
+        reference until the workers are done.
+
+    Attributes:
+        handle (SharedEosTableHandle): Handle to pass to worker processes
+        eos_table (EosTable): Table whose DataFrames and grids are read-only views of the shared segment
+
+    """
+    def __init__(self, handle, shm) -> None:
+        self.handle = handle
+        n_temperatures, n_densities = handle.n_temperatures, handle.n_densities
+        offsets = np.cumsum([HEADER_BYTES, 8 * n_densities, 8 * n_temperatures, 8 * n_temperatures * n_densities])
+        densities = np.ndarray((n_densities,), dtype=np.float64, buffer=shm.buf, offset=offsets[0])
+        temperatures = np.ndarray((n_temperatures,), dtype=np.float64, buffer=shm.buf, offset=offsets[1])
+        pressures = np.ndarray((n_temperatures, n_densities), dtype=np.float64, buffer=shm.buf, offset=offsets[2])
+        energies = np.ndarray((n_temperatures, n_densities), dtype=np.float64, buffer=shm.buf, offset=offsets[3])
+        for array in (densities, temperatures, pressures, energies):
+            array.flags.writeable = False
+
+        frames = []
+        for values, index_name in zip((pressures, energies), handle.index_names):
+            frame = pd.DataFrame(values, index=pd.Index(temperatures, name=index_name, copy=False),
+                                 columns=pd.Index(densities, name=handle.columns_name, copy=False), copy=False)
+            frames.append(frame)
+        self.eos_table = EosTable(material_name=handle.material_name, info=dict(handle.info),
+                                  pressure_eos=frames[0], energy_eos=frames[1], temperatures=temperatures,
+                                  densities=densities)
+        self._finalizer = util.Finalize(self, _release_segment, args=(shm, handle.lock), exitpriority=10)
+
+    @classmethod
+    def create(cls, eos_table, lock=None):
+        """Copies an EosTable into a new shared memory segment, the caller holds the first reference
+
+        Args:
+            eos_table (EosTable): Table to share
+            lock (multiprocessing.Lock, optional): Lock guarding the reference count, for a lock of a specific
+                                                   multiprocessing context. Defaults to multiprocessing.Lock()
+
+        Returns:
+            shared_table (SharedEosTable): The owner's view of the table, its handle is passed to workers
+        """
+        pressures = eos_table.pressure_eos.to_numpy(dtype=np.float64)
+        energies = eos_table.energy_eos.to_numpy(dtype=np.float64)
+        temperatures = np.asarray(eos_table.pressure_eos.index, dtype=np.float64)
+        densities = np.asarray(eos_table.pressure_eos.columns, dtype=np.float64)
+        if energies.shape != pressures.shape:
+            raise ValueError(f'Pressure table of shape {pressures.shape} and energy table of shape {energies.shape} '
+                             f'do not match')
+
+        handle = SharedEosTableHandle(None, len(temperatures), len(densities), eos_table.material_name,
+                                      dict(eos_table.info),
+                                      (eos_table.pressure_eos.index.name, eos_table.energy_eos.index.name),
+                                      eos_table.pressure_eos.columns.name, lock or multiprocessing.Lock())
+        with handle.lock:
+            shm = shared_memory.SharedMemory(create=True, size=handle.nbytes)
+            _untrack(shm)
+        handle.name = shm.name
+        buffer = np.ndarray((handle.nbytes // 8,), dtype=np.float64, buffer=shm.buf)
+        np.ndarray((1,), dtype=np.int64, buffer=shm.buf)[0] = 1
+        start = HEADER_BYTES // 8
+        for values in (densities, temperatures, pressures.ravel(), energies.ravel()):
+            buffer[start:start + values.size] = values
+            start += values.size
+        del buffer
+        return cls(handle, shm)
+
+    @property
+    def reference_count(self):
+        """Number of processes currently holding a reference to the segment"""
+        with self.handle.lock:
+            shm = _open_segment(self.handle.name)
+            count = int(np.ndarray((1,), dtype=np.int64, buffer=shm.buf)[0])
+        shm.close()
+        return count
+
+    def release(self):
+        """Gives back this reference, the last reference unlinks the segment. Safe to call more than once"""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def _tracked():
+    """True if opening or creating a segment registers it with the resource tracker, as before Python 3.13"""
+    return os.name == 'posix' and sys.version_info < (3, 13)
+
+
+def _untrack(shm):
+    """Undoes the registration made when shm was opened or created. Call with the reference count lock held"""
+    if _tracked():
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _open_segment(name):
+    """Opens an existing segment without leaving it in the resource tracker. Call with the reference count lock held"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    return shm
+
+
+def _release_segment(shm, lock):
+    """Decrements the reference count and unlinks the segment if it was the last reference"""
+    with lock:
+        count = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+        count[0] -= 1
+        last = count[0] <= 0
+        del count
+        if last:
+            if _tracked():
+                resource_tracker.register(shm._name, 'shared_memory')  # unlink unregisters it again
+            shm.unlink()
+    try:
+        shm.close()
+    except BufferError:  # arrays of the table are still referenced, the mapping goes when they do
+        pass
@@ -103,7 +103,8 @@ def write_eos(filename, out_filename, verbose=False):
                    f"according to Appendix III of the Hyades User Guide."
     assert len(str(eos.info['EOS Number'])) <= 5, error_string
     error_string = f"The total number of data points {total_data_length} is too large. It must be " \
-                   f"5 digits (99999 data points) or fewer according to Appendix III of the Hyades User Guide."
+                   f"5 digits (99999 data points) or fewer according to Appendix III of the Hyades User Guide. " \
+                   f"EosTablesIO.regridEOS.regrid_eos can resample the table onto a grid that fits."
     assert len(str(total_data_length)) <= 5, error_string
     formatted_eos_number = str(eos.info['EOS Number']).rjust(5, ' ')
     formatted_material_properties = f" {eos.info['Average Atomic Number']:.8E}" \
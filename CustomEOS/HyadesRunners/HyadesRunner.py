@@ -4,5 +4,12 @@ from abc import ABC, abstractmethod
 class HyadesRunner(ABC):
     
     @abstractmethod
-    def run_and_retrieve_output():
+    def run_and_retrieve_output(self, index):
+        """Runs one simulation and returns its outputs
+
+        Returns:
+            time (numpy.array): Times of the dumps
+            mesh (numpy.array): Positions of the mesh points at the first dump
+            outputs (tuple): One array per variable, with len(time) rows and one column per mesh point or per zone
+        """
         pass
\ No newline at end of file
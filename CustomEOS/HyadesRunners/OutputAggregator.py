@@ -0,0 +1,214 @@
+import threading
+import numpy as np
+
+
+class OutputAggregator:
+    """Running ensemble statistics of Hyades outputs, updated one run at a time in constant memory
+
+    Note:
+        Every variable is a (time x zone) or (time x mesh) array. When each run's times and initial mesh positions
+        are passed to add, the first run sets the common grid, and later runs are linearly resampled onto its times
+        and onto its mesh points or zone centres, told apart by their number of columns. Without them every run must
+        have the same shape. The mean and variance of every cell are
+        updated with Welford's algorithm. Quantiles are estimated with the P-squared algorithm of Jain and Chlamtac,
+        which keeps five markers per quantile and cell, so no run is stored once it has been added. The quantile
+        estimates are exact for the first five runs and approximate afterwards.
+        add may be called from several threads, such as the simulate workers of a pipelined campaign.
+
+    Attributes:
+        variables (tuple): Abbreviated names of the variables, in the order of the outputs of a run
+        quantiles (tuple): Quantiles between 0 and 1 tracked for every cell
+        n_runs (int): Number of runs added
+        time (numpy.array): Times of the common grid, None if runs were added without times
+        mesh (numpy.array): Mesh positions of the common grid, None if runs were added without mesh positions
+        mean (dict): Keys are variables, values are the mean of every cell
+        minimum (dict): Keys are variables, values are the smallest value of every cell
+        maximum (dict): Keys are variables, values are the largest value of every cell
+
+    """
+    def __init__(self, variables=('Rho', 'Pres'), quantiles=(0.05, 0.5, 0.95)) -> None:
+        self.variables = tuple(var.capitalize() for var in variables)
+        self.quantiles = tuple(quantiles)
+        if any(not 0 < q < 1 for q in self.quantiles):
+            raise ValueError(f'Quantiles must be between 0 and 1, not {self.quantiles}')
+        self.n_runs = 0
+        self.time = None
+        self.mesh = None
+        self.mean = {}
+        self.minimum = {}
+        self.maximum = {}
+        self._m2 = {}
+        self._sketches = {}
+        self._lock = threading.Lock()
+
+    def add(self, outputs, time=None, mesh=None):
+        """Folds the outputs of one run into the statistics
+
+        Args:
+            outputs (tuple or dict): One array per variable in self.variables, or a dictionary keyed by variable, such
+                                     as the outputs returned by HyadesRunner.run_and_retrieve_output
+            time (numpy.array, optional): Times of the rows of the outputs. The first run sets the common grid, later
+                                          runs are linearly interpolated onto it
+            mesh (numpy.array, optional): Initial positions of the mesh points of the run. The first run sets the
+                                          common grid, the columns of later runs are linearly interpolated onto its
+                                          mesh points, or onto its zone centres for variables with one column fewer
+        """
+        if not isinstance(outputs, dict):
+            if len(outputs) != len(self.variables):
+                raise ValueError(f'Expected {len(self.variables)} outputs for {self.variables}, got {len(outputs)}')
+            outputs = dict(zip(self.variables, outputs))
+        arrays = {var: np.asarray(outputs[var], dtype=np.float64) for var in self.variables}
+
+        with self._lock:
+            if time is not None:
+                time = np.asarray(time, dtype=np.float64)
+                if self.time is None:
+                    self.time = time.copy()
+                elif len(time) != len(self.time) or not np.allclose(time, self.time):
+                    arrays = {var: OutputAggregator.resample(time, array, self.time) for var, array in arrays.items()}
+            if mesh is not None:
+                mesh = np.asarray(mesh, dtype=np.float64)
+                if self.mesh is None:
+                    self.mesh = mesh.copy()
+                elif len(mesh) != len(self.mesh) or not np.allclose(mesh, self.mesh):
+                    resampled = {}
+                    for var, array in arrays.items():
+                        positions, target_positions = OutputAggregator._column_positions(var, array, mesh, self.mesh)
+                        resampled[var] = OutputAggregator.resample(positions, array.T, target_positions).T
+                    arrays = resampled
+
+            if self.n_runs == 0:
+                for var, array in arrays.items():
+                    self.mean[var] = array.copy()
+                    self._m2[var] = np.zeros_like(array)
+                    self.minimum[var] = array.copy()
+                    self.maximum[var] = array.copy()
+                    self._sketches[var] = [QuantileSketch(q, array.shape) for q in self.quantiles]
+            for var, array in arrays.items():
+                if array.shape != self.mean[var].shape:
+                    raise ValueError(f'{var} has shape {array.shape}, the runs added so far have shape '
+                                     f'{self.mean[var].shape}')
+
+            self.n_runs += 1
+            for var, array in arrays.items():
+                if self.n_runs > 1:
+                    delta = array - self.mean[var]
+                    self.mean[var] += delta / self.n_runs
+                    self._m2[var] += delta * (array - self.mean[var])
+                    np.fmin(self.minimum[var], array, out=self.minimum[var])
+                    np.fmax(self.maximum[var], array, out=self.maximum[var])
+                for sketch in self._sketches[var]:
+                    sketch.add(array)
+
+    def variance(self, var):
+        """Sample variance of every cell of var, NaN with fewer than two runs"""
+        var = var.capitalize()
+        if self.n_runs < 2:
+            return np.full_like(self.mean[var], np.nan)
+        return self._m2[var] / (self.n_runs - 1)
+
+    def std(self, var):
+        """Sample standard deviation of every cell of var, NaN with fewer than two runs"""
+        return np.sqrt(self.variance(var))
+
+    def quantile(self, var, q):
+        """Estimate of quantile q of every cell of var, q must be one of self.quantiles"""
+        if q not in self.quantiles:
+            raise ValueError(f'Quantile {q} is not tracked. Options are {self.quantiles}')
+        return self._sketches[var.capitalize()][self.quantiles.index(q)].value()
+
+    def summary(self):
+        """Statistics of every variable
+
+        Returns:
+            summary (dict): Keys are variables, values are dictionaries with mean, std, min, max and q{quantile}
+        """
+        with self._lock:
+            return {var: {'mean': self.mean[var].copy(), 'std': self.std(var), 'min': self.minimum[var].copy(),
+                          'max': self.maximum[var].copy(), **{f'q{q:g}': self.quantile(var, q)
+                                                              for q in self.quantiles}}
+                    for var in self.mean}
+
+    @staticmethod
+    def resample(time, array, target_time):
+        """Linearly interpolates the rows of array from time onto target_time, holding the end values outside"""
+        index = np.clip(np.searchsorted(time, target_time, side='right') - 1, 0, len(time) - 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.clip((target_time - time[index]) / (time[index + 1] - time[index]), 0, 1)
+        weight = np.nan_to_num(weight).reshape((-1,) + (1,) * (array.ndim - 1))
+        return array[index] * (1 - weight) + array[index + 1] * weight
+
+    @staticmethod
+    def _column_positions(var, array, mesh, target_mesh):
+        """Positions of the columns of array and of the common grid, the mesh points or the zone centres between them"""
+        if array.shape[1] == len(mesh):
+            return mesh, target_mesh
+        if array.shape[1] == len(mesh) - 1:
+            return (mesh[1:] + mesh[:-1]) / 2, (target_mesh[1:] + target_mesh[:-1]) / 2
+        raise ValueError(f'{var} has {array.shape[1]} columns, neither the {len(mesh)} mesh points nor the '
+                         f'{len(mesh) - 1} zones of its run')
+
+
+class QuantileSketch:
+    """P-squared estimate of one quantile of every cell of an array, updated one observation of the array at a time
+
+    Attributes:
+        q (float): Quantile between 0 and 1
+        n_observations (int): Number of arrays added
+
+    """
+    def __init__(self, q, shape) -> None:
+        self.q = q
+        self.n_observations = 0
+        self._heights = np.empty((5,) + tuple(shape))
+        self._positions = np.tile(np.arange(5, dtype=np.float64).reshape((5,) + (1,) * len(shape)),
+                                  (1,) + tuple(shape))
+        self._desired = np.array([0, 2 * q, 4 * q, 2 + 2 * q, 4], dtype=np.float64)
+        self._increments = np.array([0, q / 2, q, (1 + q) / 2, 1], dtype=np.float64)
+
+    def add(self, values):
+        """Adds one observation of every cell"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.n_observations < 5:
+            self._heights[self.n_observations] = values
+            self.n_observations += 1
+            if self.n_observations == 5:
+                self._heights.sort(axis=0)
+            return
+        self.n_observations += 1
+        heights, positions = self._heights, self._positions
+
+        # Cell k such that heights[k] <= value < heights[k + 1], extending the end markers to the value
+        np.minimum(heights[0], values, out=heights[0])
+        np.maximum(heights[4], values, out=heights[4])
+        k = np.minimum((values >= heights[1]).astype(np.int64) + (values >= heights[2]) + (values >= heights[3]), 3)
+        positions += np.arange(5).reshape((5,) + (1,) * values.ndim) > k
+        self._desired += self._increments
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            move = ((d >= 1) & (positions[i + 1] - positions[i] > 1)) \
+                | ((d <= -1) & (positions[i - 1] - positions[i] < -1))
+            if not move.any():
+                continue
+            step = np.where(move, np.sign(d), 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                parabolic = heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i])
+                    / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1])
+                    / (positions[i] - positions[i - 1]))
+                neighbour_heights = np.where(step > 0, heights[i + 1], heights[i - 1])
+                neighbour_positions = np.where(step > 0, positions[i + 1], positions[i - 1])
+                linear = heights[i] + step * (neighbour_heights - heights[i]) / (neighbour_positions - positions[i])
+            within = (heights[i - 1] < parabolic) & (parabolic < heights[i + 1])
+            heights[i] = np.where(move, np.where(within, parabolic, linear), heights[i])
+            positions[i] += step
+
+    def value(self):
+        """Current estimate of the quantile of every cell"""
+        if self.n_observations == 0:
+            return np.full(self._heights.shape[1:], np.nan)
+        if self.n_observations < 5:
+            return np.quantile(self._heights[:self.n_observations], self.q, axis=0)
+        return self._heights[2].copy()
@@ -1,8 +1,154 @@
+import os
+import re
+import shlex
+import asyncio
 from HyadesRunners.HyadesRunner import HyadesRunner
+from HyadesRunners.StrengthRunner.hyades_reader import HyadesOutput
+from process_monitor import run_monitored_async
 
 
 class HyadesStrengthRunner(HyadesRunner):
-    
-    def run_and_retrieve_output():
-        raise NotImplementedError()
+    """Runs Hyades strength simulations as asyncio subprocesses and returns their outputs as arrays
 
+    Note:
+        Each run gets its own working directory, working_dir/run_{index}, holding its .inf, .otf and .cdf.
+        At most max_concurrent_runs simulations run at once. A simulation that outlives timeout, or whose task is
+        cancelled, has its hyades or PPF2NCDF process killed.
+
+    Attributes:
+        inf_filename (string): Hyades input file, optionally with <name> placeholders filled in by parameters
+        parameters (dict): Placeholder values used by every run, overridden by the parameters of a single run
+        variables (tuple): Abbreviated names of the variables returned for each run
+        max_concurrent_runs (int): Number of simulations allowed to run at once
+        timeout (float): Seconds allowed for hyades and PPF2NCDF together, or None for no limit
+        hyades_command (string): Command that runs Hyades
+        ppf2ncdf_command (string): Command that converts .otf to .cdf
+        working_dir (string): Directory holding the per-run directories
+
+    """
+    def __init__(self, inf_filename=None, variables=('Rho', 'Pres'), max_concurrent_runs=None, timeout=None,
+                 hyades_command='hyades', ppf2ncdf_command='PPF2NCDF', working_dir='HyadesRuns',
+                 parameters=None) -> None:
+        folder_path = os.path.dirname(os.path.abspath(__file__))
+        self.inf_filename = inf_filename or os.path.join(folder_path, 'hyades_input.inf')
+        self.parameters = dict(parameters or {})
+        self.variables = tuple(variables)
+        self.max_concurrent_runs = max_concurrent_runs or os.cpu_count()
+        self.timeout = timeout
+        self.hyades_command = hyades_command
+        self.ppf2ncdf_command = ppf2ncdf_command
+        self.working_dir = working_dir
+
+    def run_and_retrieve_output(self, index=0, parameters=None):
+        """Runs a single simulation to completion and returns its outputs
+
+        Args:
+            index (int, optional): Index of the run, used to name its working directory
+            parameters (dict, optional): Values substituted for the <name> placeholders of the .inf
+
+        Returns:
+            time (numpy.array): Times of the dumps in nanoseconds
+            mesh (numpy.array): Positions of the mesh points at the first dump, in SI units
+            outputs (tuple): One read-only numpy array per variable in self.variables, in SI units, with len(time)
+                             rows and one column per mesh point or per zone
+        """
+        return asyncio.run(self.run_async(index, parameters))
+
+    def run_many_and_retrieve_outputs(self, indices, parameters=None):
+        """Runs several simulations concurrently from synchronous code, see run_many"""
+        return asyncio.run(self.run_many(indices, parameters))
+
+    async def run_many(self, indices, parameters=None):
+        """Runs several simulations concurrently, at most max_concurrent_runs at a time
+
+        Args:
+            indices (list): Index of each run
+            parameters (list, optional): One dictionary of placeholder values per run
+
+        Returns:
+            results (list): The (time, mesh, outputs) of each run as returned by run_async, in the order of indices, or
+                            the exception that run raised
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_runs)
+        if parameters is None:
+            parameters = [None] * len(indices)
+        tasks = [asyncio.create_task(self.run_async(index, params, semaphore))
+                 for index, params in zip(indices, parameters)]
+        try:
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def run_async(self, index, parameters=None, semaphore=None):
+        """Runs hyades and PPF2NCDF for a single simulation and reads the requested variables
+
+        Args:
+            index (int): Index of the run, used to name its working directory
+            parameters (dict, optional): Values substituted for the <name> placeholders of the .inf
+            semaphore (asyncio.Semaphore, optional): Limits how many simulations run at once
+
+        Returns:
+            time (numpy.array): Times of the dumps in nanoseconds
+            mesh (numpy.array): Positions of the mesh points at the first dump, in SI units
+            outputs (tuple): One read-only numpy array per variable in self.variables, in SI units, with len(time)
+                             rows and one column per mesh point or per zone
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(1)
+
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            deadline = None if self.timeout is None else loop.time() + self.timeout
+
+            run_dir = os.path.join(self.working_dir, f'run_{index}')
+            run_name = os.path.splitext(os.path.basename(self.inf_filename))[0]
+            os.makedirs(run_dir, exist_ok=True)
+            self.write_inf(os.path.join(run_dir, run_name + '.inf'), parameters)
+
+            await self._run_subprocess(shlex.split(self.hyades_command) + ['-c', run_name], run_dir, deadline,
+                                      label='hyades')
+            await self._run_subprocess(shlex.split(self.ppf2ncdf_command) + [run_name], run_dir, deadline,
+                                      label='PPF2NCDF')
+
+            otf_name = os.path.join(run_dir, run_name + '.otf')
+            if os.path.exists(otf_name):
+                os.remove(otf_name)
+
+            cdf_name = os.path.join(run_dir, run_name + '.cdf')
+            variables = tuple(dict.fromkeys(var.capitalize() for var in self.variables + ('R',)))
+            time, outputs = await loop.run_in_executor(None, HyadesOutput.get_vars_from_cdf, cdf_name, variables)
+
+        return time, outputs['R'][0], tuple(outputs[var.capitalize()] for var in self.variables)
+
+    def write_inf(self, filename, parameters=None):
+        """Copies the .inf to filename, substituting self.parameters and parameters for its <name> placeholders
+
+        Raises:
+            ValueError: If any placeholder is left without a value, since Hyades cannot read such a deck
+        """
+        with open(self.inf_filename) as f:
+            text = f.read()
+        for name, value in {**self.parameters, **(parameters or {})}.items():
+            text = text.replace(f'<{name}>', str(value))
+        missing = re.findall(r'<\w+>', text)
+        if missing:
+            raise ValueError(f'No value given for the placeholders {missing} in {self.inf_filename}')
+        with open(filename, 'w') as f:
+            f.write(text)
+
+        return filename
+
+    @staticmethod
+    async def _run_subprocess(command, cwd, deadline=None, label=None):
+        """Runs an external command as a monitored asyncio subprocess, killing it on timeout or cancellation"""
+        loop = asyncio.get_running_loop()
+        timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+        returncode = await run_monitored_async(command, label=label, timeout=timeout, cwd=cwd,
+                                               stdout=asyncio.subprocess.DEVNULL)
+        if returncode != 0:
+            raise RuntimeError(f'{" ".join(command)} in {cwd} exited with status {returncode}')
+
+        return returncode
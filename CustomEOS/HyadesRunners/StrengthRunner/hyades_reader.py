@@ -124,6 +124,62 @@ class HyadesOutput:
         units = cdf.variables[var].units.decode('utf-8')
 
         cdf.close()
+        long_name, units, unit_conversion = HyadesOutput.get_unit_conversion(var, long_name, units)
+        output *= unit_conversion
+
+        return x, time, output, long_name, units, data_dimensions
+
+    @staticmethod
+    def get_vars_from_cdf(filename, variables, dtype=np.float64):
+        """Reads the time and several variables from a .cdf without building a HyadesOutput for each one
+
+        Note:
+            The .cdf is memory mapped, so only the requested variables are read from disk.
+            Each output is copied out of the memory map into a compact, read-only array.
+
+        Args:
+            filename (string): Name of the .cdf
+            variables (list): Abbreviated names of the variables of interest - any of Pres, Rho, U, Te, Ti, Tr, R
+            dtype (numpy dtype, optional): Float type of the returned arrays
+
+        Returns:
+            time (numpy array): Times of the simulation in nanoseconds
+            outputs (dict): Keys are the abbreviated variable names, values are read-only arrays in SI units with
+                            len(time) rows
+
+        """
+        cdf = netcdf.netcdf_file(filename, 'r', mmap=True)
+        try:
+            time = np.array(cdf.variables['DumpTimes'].data, dtype=dtype) * 1e9  # convert seconds to nanoseconds
+            time.setflags(write=False)
+            outputs = {}
+            for var in variables:
+                var = var.capitalize()
+                long_name = cdf.variables[var].long_name.decode('utf-8')
+                units = cdf.variables[var].units.decode('utf-8')
+                long_name, units, unit_conversion = HyadesOutput.get_unit_conversion(var, long_name, units)
+                output = np.array(cdf.variables[var].data, dtype=dtype)
+                output *= unit_conversion
+                output.setflags(write=False)
+                outputs[var] = output
+        finally:
+            cdf.close()
+
+        return time, outputs
+
+    @staticmethod
+    def get_unit_conversion(var, long_name, units):
+        """Gets the factor that converts a variable from the Hyades cgs units to SI units
+
+        Args:
+            var (string): Abbreviated name of variable of interest - one of Pres, Rho, U, Te, Ti, Tr, R
+            long_name (string): Full name of var according to Hyades
+            units (string): Units of var according to Hyades
+
+        Returns:
+            long_name (string), units (string), unit_conversion (float)
+
+        """
         '''
         All conversions below change the Hyades default cgs units to SI units
         Most conversions taken from https://en.wikipedia.org/wiki/Centimetre%E2%80%93gram%E2%80%93second_system_of_units
@@ -193,9 +249,8 @@ class HyadesOutput:
         else:
             raise InvalidVariable(f'HyadesOutput does not recognize variable: {var}')
 
-        output *= unit_conversion
 
-        return x, time, output, long_name, units, data_dimensions
+        return long_name, units, unit_conversion
 
     def get_closest_time(self, requested_time):
         """Get the closest time and its index output by Hyades
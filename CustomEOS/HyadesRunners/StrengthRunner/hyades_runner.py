@@ -1,61 +1,224 @@
 import os
+import sys
 import fire
 from os.path import dirname
 import os.path
 from os import path
+import time
+import shlex
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 from hyades_reader import HyadesOutput
 import numpy as np
+try:
+    from process_monitor import run_monitored
+    from stage_profiler import profiled
+except ImportError:  # both modules live in the CustomEOS folder, two levels above this script
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+    from process_monitor import run_monitored
+    from stage_profiler import profiled
 
 
+@profiled('hyades_run')
+def hyades_run(index, output_mode=None, variables=None, hyades_command=None, ppf2ncdf_command=None,
+               sandbox=None, timeout=None):
+    """Runs Hyades on InputFiles/hyades_input_{index}.inf and post-processes the results
+
+    Note:
+        The output_mode 'excel' converts the .cdf to hyades_input.xlsx, as this script always has.
+        The output_mode 'netcdf' skips Excel entirely. The .cdf is kept as the canonical output in
+        OutputFiles/hyades_input_{index}.cdf, next to a copy of the .inf, the requested variables are extracted to
+        OutputFiles/hyades_input_{index}.npz, and the intermediate .otf is deleted.
+        With sandbox=True the input, output and conversion files of the run live in HyadesRuns/run_{index},
+        so several runs can share the same working directory without overwriting each other.
+        Every keyword argument falls back on an environment variable so the mode and the external commands can be
+        chosen when UQpy RunModel launches this script as 'python hyades_runner.py index'.
+
+    Args:
+        index (int): Index of the run assigned by UQpy RunModel
+        output_mode (string, optional): One of excel or netcdf. Defaults to $HYADES_OUTPUT_MODE or excel
+        variables (list, optional): Abbreviated variable names to extract. Defaults to $HYADES_VARIABLES, a comma
+                                    separated list, or Pres, U, Rho, Te
+        hyades_command (string, optional): Command that runs Hyades. Defaults to $HYADES_COMMAND or hyades
+        ppf2ncdf_command (string, optional): Command that converts .otf to .cdf. Defaults to $PPF2NCDF_COMMAND or
+                                             PPF2NCDF
+        sandbox (bool, optional): Toggle to run in a per-index working directory. Defaults to $HYADES_SANDBOX or False
+        timeout (float, optional): Seconds allowed for Hyades and PPF2NCDF together. Defaults to $HYADES_TIMEOUT or
+                                   no limit
+
+    Returns:
+        cdf_path (string): Path of the per-run .cdf in OutputFiles
+
+    """
+    output_mode = (output_mode or os.environ.get('HYADES_OUTPUT_MODE', 'excel')).lower()
+    if output_mode not in ('excel', 'netcdf'):
+        raise ValueError(f'Unrecognized output mode: {output_mode!r}. Options are excel or netcdf')
+    if variables is None:
+        variables = os.environ.get('HYADES_VARIABLES', 'Pres,U,Rho,Te')
+    if isinstance(variables, str):
+        variables = [var.strip() for var in variables.split(',') if var.strip()]
+    hyades_command = hyades_command or os.environ.get('HYADES_COMMAND', 'hyades')
+    ppf2ncdf_command = ppf2ncdf_command or os.environ.get('PPF2NCDF_COMMAND', 'PPF2NCDF')
+    if sandbox is None:
+        sandbox = os.environ.get('HYADES_SANDBOX', '').lower() in ('1', 'true', 'yes')
+    if timeout is None and os.environ.get('HYADES_TIMEOUT'):
+        timeout = float(os.environ['HYADES_TIMEOUT'])
+    deadline = None if timeout is None else time.monotonic() + float(timeout)
 
-def hyades_run(index):
     name_before = 'hyades_input.inf'
     name_ = 'hyades_input_' + str(index) + '.inf'
+    run_name = os.path.splitext(name_before)[0]
     
     current_dir = os.getcwd()
+    run_dir = os.path.join(current_dir, 'HyadesRuns', f'run_{index}') if sandbox else current_dir
+    os.makedirs(run_dir, exist_ok=True)
     
-    initial_path = current_dir + '/InputFiles/' + name_
-    final_path = current_dir + '/' + name_before
+    initial_path = os.path.join(current_dir, 'InputFiles', name_)
+    final_path = os.path.join(run_dir, name_before)
     
-    copy_input_command = 'cp ' + initial_path + ' ' + final_path
-    os.system(copy_input_command)
+    shutil.copyfile(initial_path, final_path)
     
-    run_command1 = 'hyades -c hyades_input'
-    os.system(run_command1)
+    run_command1 = shlex.split(hyades_command) + ['-c', run_name]
+    returncode = run_command(run_command1, cwd=run_dir, timeout=remaining_time(deadline), label='hyades')
+    if returncode != 0:
+        raise RuntimeError(f'hyades exited with status {returncode} running {run_name} in {run_dir}')
     
     output_path = os.path.join(os.path.sep, current_dir, 'OutputFiles')
     os.makedirs(output_path, exist_ok=True)
-    
-    fileExt = r".otf"
-    otf_files = [_ for _ in os.listdir(current_dir) if _.endswith(fileExt)]
-    otf2cdf(otf_name=otf_files[0])
 
-    excel_variables = ['Pres', 'U', 'Rho', 'Te']
-    excel_filename = name_before.split('.')[0] + ".xlsx"
+    # Files are found by the run name, never by listing a directory that other runs may be writing to
+    returncode = otf2cdf(otf_name=run_name + '.otf', command=ppf2ncdf_command, cwd=run_dir,
+                         timeout=remaining_time(deadline))
+    if returncode != 0:
+        raise RuntimeError(f'PPF2NCDF exited with status {returncode} converting {run_name}.otf in {run_dir}')
+    run_cdf = os.path.join(run_dir, run_name + '.cdf')
+    cdf_path = os.path.join(output_path, run_name + '_' + str(index) + '.cdf')
+
+    if output_mode == 'netcdf':
+        shutil.move(run_cdf, cdf_path)
+        shutil.copyfile(final_path, os.path.splitext(cdf_path)[0] + '.inf')  # HyadesOutput needs the matching .inf
+        write_arrays(cdf_path, os.path.splitext(cdf_path)[0] + '.npz', variables)
+
+        fileExt = r".otf"
+        for otf_file in [_ for _ in os.listdir(run_dir) if _.endswith(fileExt)]:
+            os.remove(os.path.join(run_dir, otf_file))
+        if sandbox:
+            shutil.rmtree(run_dir)
+        return cdf_path
+
+    excel_variables = variables
+    excel_filename = os.path.join(run_dir, run_name + ".xlsx")
+    write_excel(run_cdf, excel_filename, excel_variables)
+
+    # Keep a per-run copy of the .cdf so process_output.read_output can find the results of this index
+    shutil.copyfile(run_cdf, cdf_path)
+    return cdf_path
+
+
+def hyades_run_pool(indices, n_workers=None, timeout=None, **kwargs):
+    """Runs several Hyades simulations at once, each in its own HyadesRuns/run_{index} sandbox
+
+    Note:
+        Hyades and PPF2NCDF are external processes, so a thread per worker is enough to keep n_workers of them busy.
+        A run that exceeds its timeout is killed and reported without stopping the other runs.
+
+    Args:
+        indices (list): Indices of the InputFiles/hyades_input_{index}.inf to run
+        n_workers (int, optional): Number of simulations running at once. Defaults to the number of cores
+        timeout (float, optional): Seconds allowed for each run
+        **kwargs: Passed on to hyades_run, such as output_mode or variables
+
+    Returns:
+        results (dict): Keys are indices, values are the path of the run's .cdf or the exception the run raised
+
+    """
+    n_workers = n_workers or os.cpu_count()
+    results = {}
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(hyades_run, index, sandbox=True, timeout=timeout, **kwargs): index
+                   for index in indices}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f'Hyades run #{index} failed: {e!r}')
+                results[index] = e
+
+    return results
+
+
+def remaining_time(deadline):
+    """Seconds left before deadline, a time.monotonic() value, or None if there is no deadline"""
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def run_command(command, cwd=None, timeout=None, stdout=None, label=None):
+    """Runs an external command, recording its resource usage, and kills it if it outlives the timeout
+
+    Args:
+        command (list): Program and arguments
+        cwd (string, optional): Working directory of the command
+        timeout (float, optional): Seconds before the command is killed and subprocess.TimeoutExpired is raised
+        stdout (file, optional): Where to send the terminal output instead of the screen
+        label (string, optional): Name of the run in the process log, defaults to the program name
+
+    Returns:
+        returncode (int): Exit status of the command
 
-    fileExt = r".cdf"
-    cdf_files = [_ for _ in os.listdir(current_dir) if _.endswith(fileExt)]
-    write_excel(cdf_files[0], excel_filename, excel_variables)
+    """
+    completed = run_monitored(command, label=label, cwd=cwd, timeout=timeout, stdout=stdout)
+    return completed.returncode
 
 
-def otf2cdf(otf_name, quiet=False):
+def otf2cdf(otf_name, quiet=False, command='PPF2NCDF', cwd=None, timeout=None):
     """Runs the PPF2NCDF command to convert Hyades output (.otf) to a netcdf (.cdf) file
 
         Args:
         otf_name (string): Name of the .otf (should match name of .inf)
         quiet (bool, optional): Toggle to save the terminal output to a text file instead of printing on screen
+        command (string, optional): Command that runs PPF2NCDF, replaceable by a stand-in script for testing
+        cwd (string, optional): Directory containing the .otf
+        timeout (float, optional): Seconds before PPF2NCDF is killed
 
         Returns:
-        log_string (string): status of the PPF2NCDF command
+        returncode (int): status of the PPF2NCDF command
 
         """
+    command = shlex.split(command) + [os.path.splitext(otf_name)[0]]
     if quiet:
         txt_file = os.path.splitext(otf_name)[0] + '_PPF2NCDF_terminal.txt'
-        command = f'PPF2NCDF {os.path.splitext(otf_name)[0]} > {txt_file}'
-    else:
-        command = f'PPF2NCDF {os.path.splitext(otf_name)[0]}'
-    os.system(command)
+        with open(os.path.join(cwd or os.getcwd(), txt_file), 'w') as f:
+            return run_command(command, cwd=cwd, timeout=timeout, stdout=f, label='PPF2NCDF')
+    return run_command(command, cwd=cwd, timeout=timeout, label='PPF2NCDF')
+
+
+def write_arrays(cdf_path, array_fname, variables):
+    """Write the time and a list of variables from a .cdf to a compact .npz array file
+
+    Note:
+        The .npz holds 'time' in nanoseconds and one array per variable in SI units, with len(time) rows.
+        It is written uncompressed so process_output.read_output can load single variables cheaply.
+
+    Args:
+        cdf_path (string): Path to the .cdf
+        array_fname (string): Name of the .npz file to write to
+        variables (list): List of abbreviated variable names to include in the array file
+
+    Returns:
+        array_fname (string): Name of the written array file
+    """
+    if not array_fname.endswith('.npz'):
+        array_fname += '.npz'
+
+    time, outputs = HyadesOutput.get_vars_from_cdf(cdf_path, variables)
+    np.savez(array_fname, time=time, **outputs)
+
+    return array_fname
 
 
 def write_excel(cdf_path, excel_fname, variables, coordinate_system='Lagrangian'):
@@ -1,9 +1,35 @@
-def read_output(index):
-    from openpyxl import load_workbook
-    
-    wb = load_workbook(filename='hyades_input.xlsx')
-    densities = wb.worksheets[3]['B2:ADU202']
-    pressures = wb.worksheets[1]['B2:ADU202']
-    
-    return (densities, pressures)
+import os
+import numpy as np
+from hyades_reader import HyadesOutput
 
+
+def read_output(index, variables=('Rho', 'Pres')):
+    """Reads the variables of a single Hyades run as compact, read-only float arrays
+
+    Note:
+        Reads OutputFiles/hyades_input_{index}.npz when hyades_runner.hyades_run was in netcdf mode, otherwise
+        OutputFiles/hyades_input_{index}.cdf, so parallel runs never read each other's results.
+
+    Args:
+        index (int): Index of the run assigned by UQpy RunModel
+        variables (tuple, optional): Abbreviated names of the variables to return, in order
+
+    Returns:
+        outputs (tuple): One read-only numpy array per variable with len(time) rows, in SI units
+    """
+    array_name = os.path.join('OutputFiles', f'hyades_input_{index}.npz')
+    if os.path.exists(array_name):
+        outputs = []
+        with np.load(array_name) as arrays:  # only the requested members of the .npz are read
+            for var in variables:
+                if var.capitalize() not in arrays.files:
+                    raise ValueError(f'{var.capitalize()} is not in {array_name}, which holds {arrays.files}')
+                output = arrays[var.capitalize()]
+                output.setflags(write=False)
+                outputs.append(output)
+        return tuple(outputs)
+
+    cdf_name = os.path.join('OutputFiles', f'hyades_input_{index}.cdf')
+    time, outputs = HyadesOutput.get_vars_from_cdf(cdf_name, variables)
+
+    return tuple(outputs[var.capitalize()] for var in variables)
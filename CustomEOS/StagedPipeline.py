@@ -0,0 +1,185 @@
+import time
+import queue
+import threading
+
+
+class PipelineStage:
+    """A named step of a StagedPipeline and the number of threads that run it
+
+    Attributes:
+        name (string): Name used in the throughput report
+        function (callable): Called as function(index, item) and returns the item handed to the next stage
+        n_workers (int): Number of threads running this stage at once
+        wait (callable): Called as wait(index, item) before function and returns the item function is called with,
+                         or None. Time spent in it, such as waiting for a shared resource, is not busy time
+        n_completed (int): Number of items this stage finished
+        n_failed (int): Number of items this stage raised an exception on
+        busy_time (float): Seconds spent inside function, summed over all workers
+        start_time (float): time.perf_counter() when the first item entered this stage
+        stop_time (float): time.perf_counter() when the last item left this stage
+
+    """
+    def __init__(self, name, function, n_workers=1, wait=None) -> None:
+        if n_workers < 1:
+            raise ValueError(f'Stage {name!r} needs at least one worker, got {n_workers}')
+        self.name = name
+        self.function = function
+        self.n_workers = n_workers
+        self.wait = wait
+        self.n_completed = 0
+        self.n_failed = 0
+        self.busy_time = 0.0
+        self.start_time = None
+        self.stop_time = None
+
+    @property
+    def wall_time(self):
+        """Seconds between the first item entering and the last item leaving this stage"""
+        if self.start_time is None or self.stop_time is None:
+            return 0.0
+        return self.stop_time - self.start_time
+
+    def summary(self):
+        """Per-stage throughput report as a dictionary"""
+        wall_time = self.wall_time
+        return {
+            'Stage': self.name,
+            'Workers': self.n_workers,
+            'Completed': self.n_completed,
+            'Failed': self.n_failed,
+            'Busy Time (s)': self.busy_time,
+            'Wall Time (s)': wall_time,
+            'Throughput (items/s)': self.n_completed / wall_time if wall_time > 0 else float('nan'),
+            'Utilization': self.busy_time / (wall_time * self.n_workers) if wall_time > 0 else float('nan'),
+        }
+
+
+class StagedPipeline:
+    """Runs items through a chain of stages, each on its own threads, with bounded queues in between
+
+    Note:
+        Stages overlap, so item k+1 can be in an early stage while item k is in a later one.
+        The queue in front of each stage holds at most queue_size items. A stage that falls behind therefore blocks
+        the stages before it instead of letting finished work pile up in memory.
+        An item that raises in any stage is recorded in failures and does not reach the later stages.
+
+    Attributes:
+        stages (list): PipelineStage objects in the order items pass through them
+        queue_size (int): Capacity of each queue between stages
+        results (dict): Keys are item indices, values are what the last stage returned
+        failures (dict): Keys are item indices, values are (stage name, exception)
+        metrics (CampaignMetrics): Receives the progress of every item and stage, or None
+
+    """
+    _DONE = object()
+
+    def __init__(self, stages, queue_size=2, metrics=None) -> None:
+        if not stages:
+            raise ValueError('A StagedPipeline needs at least one stage')
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in self.stages]
+        self.results = {}
+        self.failures = {}
+        self.metrics = metrics
+        if metrics is not None and metrics.queue_depths is None:
+            metrics.queue_depths = self.queue_depths
+        self._lock = threading.Lock()
+
+    def run(self, items):
+        """Pushes every item through all the stages and waits for the pipeline to drain
+
+        Args:
+            items (iterable): Inputs of the first stage. Each is passed as function(index, item)
+
+        Returns:
+            results (list): Output of the last stage for each item that made it through, ordered by index
+        """
+        threads = []
+        remaining_workers = [stage.n_workers for stage in self.stages]
+        for position, stage in enumerate(self.stages):
+            for _ in range(stage.n_workers):
+                thread = threading.Thread(target=self._work, args=(position, remaining_workers), daemon=True,
+                                          name=f'{stage.name}-worker')
+                thread.start()
+                threads.append(thread)
+
+        for index, item in enumerate(items):
+            if self.metrics is not None:
+                self.metrics.sample_started()
+            self.queues[0].put((index, item))  # blocks while the first stage is saturated
+        for _ in range(self.stages[0].n_workers):
+            self.queues[0].put(self._DONE)
+
+        for thread in threads:
+            thread.join()
+
+        return [self.results[index] for index in sorted(self.results)]
+
+    def queue_depths(self):
+        """Number of items waiting in front of each stage, keyed by stage name"""
+        return {stage.name: q.qsize() for stage, q in zip(self.stages, self.queues)}
+
+    def summary(self):
+        """Throughput report of every stage as a list of dictionaries"""
+        return [stage.summary() for stage in self.stages]
+
+    def print_summary(self):
+        """Prints one line of throughput information per stage"""
+        for report in self.summary():
+            print(f"{report['Stage']}: {report['Completed']} completed, {report['Failed']} failed, "
+                  f"{report['Throughput (items/s)']:.3g} items/s with {report['Workers']} worker(s), "
+                  f"{100 * report['Utilization']:.0f}% utilization")
+
+    def _work(self, position, remaining_workers):
+        stage = self.stages[position]
+        is_last = position == len(self.stages) - 1
+        while True:
+            entry = self.queues[position].get()
+            if entry is self._DONE:
+                break
+            index, item = entry
+            if stage.wait is not None:
+                item = stage.wait(index, item)
+
+            start = time.perf_counter()
+            with self._lock:
+                if stage.start_time is None:
+                    stage.start_time = start
+            if self.metrics is not None:
+                self.metrics.stage_started(stage.name)
+            try:
+                result = stage.function(index, item)
+            except Exception as e:
+                with self._lock:
+                    stage.n_failed += 1
+                    self.failures[index] = (stage.name, e)
+                if self.metrics is not None:
+                    self.metrics.stage_finished(stage.name, time.perf_counter() - start, failed=True)
+                    self.metrics.sample_finished(failed=True)
+                print(f'Sample #{index} failed in stage {stage.name!r}: {e!r}')
+                continue
+            finally:
+                stop = time.perf_counter()
+                with self._lock:
+                    stage.busy_time += stop - start
+                    stage.stop_time = stop
+
+            with self._lock:
+                stage.n_completed += 1
+            if self.metrics is not None:
+                self.metrics.stage_finished(stage.name, stop - start)
+                if is_last:
+                    self.metrics.sample_finished()
+            if is_last:
+                with self._lock:
+                    self.results[index] = result
+            else:
+                self.queues[position + 1].put((index, result))  # blocks while the next stage is saturated
+
+        with self._lock:
+            remaining_workers[position] -= 1
+            last_worker = remaining_workers[position] == 0
+        if last_worker and not is_last:
+            for _ in range(self.stages[position + 1].n_workers):
+                self.queues[position + 1].put(self._DONE)
@@ -0,0 +1,191 @@
+"""Benchmarks of the EosTablesIO and HyadesOutput hot paths, compared against a stored baseline
+
+Run from the CustomEOS folder so the EosTablesIO and HyadesRunners packages can be imported:
+    python -m benchmarks.run_benchmarks                      # time everything and compare with benchmarks/baseline.json
+    python -m benchmarks.run_benchmarks --save_baseline      # store this machine's timings as the new baseline
+    python -m benchmarks.run_benchmarks --only=write_eos     # run the benchmarks whose name contains 'write_eos'
+
+The exit status is 1 when any benchmark is slower than its baseline median by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import tempfile
+import statistics
+import fire
+import numpy as np
+from EosTablesIO.EosTable import EosTable
+from EosTablesIO.readingEOS import EOSTable
+from HyadesRunners.StrengthRunner.hyades_reader import HyadesOutput, ShockVelocity
+from benchmarks.synthetic_data import write_synthetic_eos, write_synthetic_cdf, synthetic_eos_table
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BENCHMARK_DIR), 'EosTablesIO', 'data')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+
+
+def time_function(function, repeats=5, warmup=1):
+    """Times repeated calls of function and returns the timings in seconds
+
+    Args:
+        function (callable): Called with no arguments
+        repeats (int, optional): Number of timed calls
+        warmup (int, optional): Number of untimed calls made first to warm caches
+
+    Returns:
+        result (dict): min, median and max time of a call and the number of repeats
+    """
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'max_s': max(timings),
+            'repeats': repeats}
+
+
+def collect_benchmarks(work_dir, scale=220):
+    """Builds the named benchmark callables, writing any synthetic inputs they need into work_dir
+
+    Args:
+        work_dir (string): Scratch directory for synthetic tables, NetCDF dumps and written tables
+        scale (int, optional): Number of densities and temperatures of the scaled-up synthetic table.
+                               The default is the largest square table Hyades accepts.
+
+    Returns:
+        benchmarks (dict): Keys are benchmark names, values are callables that take no arguments
+    """
+    eos_341 = os.path.join(DATA_DIR, 'eos_341.dat')
+    eos_fe = os.path.join(DATA_DIR, 'eos_Fe_182.dat')
+    hyadlibm_fe = os.path.join(DATA_DIR, 'hyadlibm_Fe_182.txt')
+    excel_341 = os.path.join(DATA_DIR, 'eos_341.xlsx')
+    large_table = write_synthetic_eos(os.path.join(work_dir, 'synthetic_large.dat'), scale, scale)
+    run = write_synthetic_cdf(os.path.join(work_dir, 'cdf'), 'synthetic', n_times=201, n_zones=800)
+    table_341 = EosTable.from_fixed_width_hyades_eos(eos_341)
+    large_eos_table = synthetic_eos_table(scale, scale)
+
+    return {
+        'read_fixed_width/eos_341': lambda: EOSTable(eos_341),
+        'read_fixed_width/eos_Fe_182': lambda: EOSTable(eos_fe),
+        'read_fixed_width/synthetic_large': lambda: EOSTable(large_table),
+        'EosTable.from_fixed_width/eos_341': lambda: EosTable.from_fixed_width_hyades_eos(eos_341),
+        'EosTable.from_fixed_width/synthetic_large': lambda: EosTable.from_fixed_width_hyades_eos(large_table),
+        'read_hyadlibm/Fe_182': lambda: EOSTable(hyadlibm_fe),
+        'read_excel/eos_341': lambda: EOSTable(excel_341),
+        'write_eos/eos_341': lambda: table_341.write_eos(os.path.join(work_dir, 'written_341.dat')),
+        'write_eos/synthetic_large': lambda: large_eos_table.write_eos(os.path.join(work_dir, 'written_large.dat')),
+        'HyadesOutput/Pres': lambda: HyadesOutput(run, 'Pres'),
+        'HyadesOutput/U': lambda: HyadesOutput(run, 'U'),
+        'ShockVelocity/calculate_shock_velocity': lambda: ShockVelocity(run, mode='Cubic'),
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance=0.2):
+    """Flags every benchmark whose median time grew by more than tolerance relative to the baseline
+
+    Args:
+        results (dict): Benchmark results, keyed by name, from this run
+        baseline (dict): Benchmark results, keyed by name, from the stored baseline
+        tolerance (float, optional): Allowed fractional slowdown, 0.2 allows 20% slower
+
+    Returns:
+        comparison (dict): Keys are benchmark names, values hold the baseline median, the ratio and a status of
+                           ok, regression, improvement, new, or error
+    """
+    comparison = {}
+    for name, result in results.items():
+        if 'error' in result:
+            comparison[name] = {'status': 'error'}
+            continue
+        if name not in baseline or 'median_s' not in baseline[name]:
+            comparison[name] = {'status': 'new'}
+            continue
+        ratio = result['median_s'] / baseline[name]['median_s']
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        comparison[name] = {'baseline_median_s': baseline[name]['median_s'], 'ratio': ratio, 'status': status}
+
+    return comparison
+
+
+def run_benchmarks(output='benchmark_results.json', baseline=DEFAULT_BASELINE, save_baseline=False,
+                   tolerance=0.2, repeats=5, scale=220, only=''):
+    """Runs the benchmark suite, writes the results as JSON and compares them with the baseline
+
+    Args:
+        output (string, optional): JSON file the results are written to
+        baseline (string, optional): JSON file holding the baseline results
+        save_baseline (bool, optional): Toggle to overwrite the baseline with the results of this run
+        tolerance (float, optional): Allowed fractional slowdown before a benchmark counts as a regression
+        repeats (int, optional): Number of timed calls per benchmark
+        scale (int, optional): Number of densities and temperatures of the scaled-up synthetic table
+        only (string, optional): Only run benchmarks whose name contains this string
+
+    Returns:
+        n_regressions (int): Number of benchmarks slower than the baseline by more than the tolerance
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmarks = collect_benchmarks(work_dir, scale=scale)
+        for name, function in benchmarks.items():
+            if only and only not in name:
+                continue
+            try:
+                results[name] = time_function(function, repeats=repeats)
+                print(f"{name:<45} median {1e3 * results[name]['median_s']:10.2f} ms")
+            except Exception as e:  # an unavailable reader, e.g. no openpyxl, should not stop the suite
+                results[name] = {'error': repr(e)}
+                print(f"{name:<45} error  {e!r}")
+
+    report = {
+        'metadata': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'scale': scale,
+            'repeats': repeats,
+        },
+        'benchmarks': results,
+    }
+
+    n_regressions = 0
+    if os.path.exists(baseline) and not save_baseline:
+        with open(baseline) as f:
+            baseline_results = json.load(f)['benchmarks']
+        report['comparison'] = compare_with_baseline(results, baseline_results, tolerance=tolerance)
+        for name, comparison in report['comparison'].items():
+            if comparison['status'] in ('regression', 'improvement'):
+                print(f"{comparison['status'].upper()}: {name} is {comparison['ratio']:.2f}x its baseline time")
+        n_regressions = sum(c['status'] == 'regression' for c in report['comparison'].values())
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved: {output}')
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline: {baseline}')
+
+    return n_regressions
+
+
+def main(**kwargs):
+    """Command line entry point, exits with status 1 if any benchmark regressed"""
+    n_regressions = run_benchmarks(**kwargs)
+    sys.exit(1 if n_regressions else 0)
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
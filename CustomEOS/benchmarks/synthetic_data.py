@@ -0,0 +1,104 @@
+"""Synthetic inputs for the benchmark suite: scaled-up EOS tables and Hyades-like NetCDF dumps"""
+import os
+import numpy as np
+import pandas as pd
+from scipy.io import netcdf_file
+from EosTablesIO.EosTable import EosTable
+
+INF_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'HyadesRunners', 'StrengthRunner', 'hyades_input.inf')
+
+
+def synthetic_eos_table(n_densities, n_temperatures, eos_number=999):
+    """Builds an EosTable with smooth, physically shaped pressures and energies on a log-spaced grid
+
+    Args:
+        n_densities (int): Number of densities in the table
+        n_temperatures (int): Number of temperatures in the table
+        eos_number (int, optional): EOS Number written in the table header
+
+    Returns:
+        eos_table (EosTable)
+    """
+    densities = np.geomspace(0.1, 30.0, n_densities)  # g/cc
+    temperatures = np.concatenate(([0.0], np.geomspace(1.0, 1e8, n_temperatures - 1)))  # K
+    rho, temp = np.meshgrid(densities, temperatures)
+    pressures = 400.0 * ((rho / 3.5) ** 3 - 1.0) + 1e-6 * rho * temp  # GPa
+    energies = 1e10 * (rho / 3.5) ** 2 + 1e7 * temp  # erg/g
+
+    info = {
+        'Ambient Density': 3.5,
+        'Average Atomic Mass': 12.011,
+        'Average Atomic Number': 6.0,
+        'Date Created': '',
+        'EOS Number': eos_number,
+        'Material Name': 'SYNTHETIC',
+        'Notes': f'Synthetic {n_densities}x{n_temperatures} benchmark table',
+    }
+    pressure_eos = pd.DataFrame(data=pressures, columns=densities, index=temperatures)
+    energy_eos = pd.DataFrame(data=energies, columns=densities, index=temperatures)
+    return EosTable(material_name=info['Material Name'], info=info,
+                    pressure_eos=pressure_eos, energy_eos=energy_eos,
+                    temperatures=temperatures, densities=densities)
+
+
+def write_synthetic_eos(filename, n_densities, n_temperatures):
+    """Writes a synthetic fixed-width Hyades EOS table and returns its filename"""
+    synthetic_eos_table(n_densities, n_temperatures).write_eos(filename)
+    return filename
+
+
+def write_synthetic_cdf(directory, run_name='synthetic', n_times=201, n_zones=800, shock_speed=20.0):
+    """Writes a Hyades-like .cdf, and the matching .inf, with a steady shock running through the mesh
+
+    Note:
+        Pressure, Density and Particle Velocity are written in the cgs units PPF2NCDF uses, so HyadesOutput and
+        ShockVelocity convert them exactly as they would a real simulation.
+
+    Args:
+        directory (string): Directory to write the .cdf and .inf to
+        run_name (string, optional): Name of the run, without extension
+        n_times (int, optional): Number of dump times
+        n_zones (int, optional): Number of zones, there is one more mesh point
+        shock_speed (float, optional): Shock velocity in km/s
+
+    Returns:
+        filename (string): Path of the run without extension, as HyadesOutput expects
+    """
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, run_name)
+
+    times = np.linspace(0.0, 20e-9, n_times)  # s
+    mesh = np.linspace(0.0, 0.0225, n_zones + 1)  # cm
+    zones = (mesh[1:] + mesh[:-1]) / 2
+    front = shock_speed * 1e5 * times + mesh[n_zones // 50]  # cm, starts a little into the sample
+    shocked_zones = zones[np.newaxis, :] < front[:, np.newaxis]
+    shocked_mesh = mesh[np.newaxis, :] < front[:, np.newaxis]
+
+    cdf = netcdf_file(filename + '.cdf', 'w')
+    cdf.createDimension('NumTimes', n_times)
+    cdf.createDimension('NumMeshs', n_zones + 1)
+    cdf.createDimension('NumZones', n_zones)
+    dump_times = cdf.createVariable('DumpTimes', 'd', ('NumTimes',))
+    dump_times[:] = times
+    r = cdf.createVariable('R', 'd', ('NumTimes', 'NumMeshs'))
+    r[:] = np.tile(mesh, (n_times, 1))
+    r.long_name, r.units = b'Eulerian Position', b'cm'
+
+    variables = {
+        'Pres': ('NumZones', np.where(shocked_zones, 1e12, 1e9), b'Pressure', b'dyn/cm2'),  # 100 GPa behind front
+        'Rho': ('NumZones', np.where(shocked_zones, 5.0, 3.5), b'Density', b'g/cm3'),
+        'U': ('NumMeshs', np.where(shocked_mesh, 6e5, 0.0), b'Particle Velocity', b'cm/s'),
+        'Te': ('NumZones', np.where(shocked_zones, 1e-4, 2.58e-5), b'Electron Temperature', b'keV'),
+    }
+    for name, (dimension, data, long_name, units) in variables.items():
+        var = cdf.createVariable(name, 'd', ('NumTimes', dimension))
+        var[:] = data
+        var.long_name, var.units = long_name, units
+    cdf.close()
+
+    with open(INF_TEMPLATE) as f:
+        inf = f.read().replace('<P>', '1.00e+12')  # fill the drive pressure placeholder of the UQpy template
+    with open(filename + '.inf', 'w') as f:
+        f.write(inf)
+    return filename
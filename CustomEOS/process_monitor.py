@@ -0,0 +1,280 @@
+"""Resource monitoring for the external programs the pipeline launches: REODP-v4.exe, hyades, PPF2NCDF and hyadlibm
+
+Every monitored run appends one JSON line to a log with its wall time, CPU time, peak resident memory and exit status.
+The log is $CUSTOMEOS_PROCESS_LOG if it is set, otherwise process_runs.jsonl in the working directory.
+Use an absolute $CUSTOMEOS_PROCESS_LOG to collect the runs of every UQpy run directory in one file.
+
+Note:
+    psutil is optional. Without it the CPU time and peak memory come from resource.getrusage(RUSAGE_CHILDREN), which
+    covers every child the process has reaped and is unavailable on Windows. The CPU time of a run is the growth of
+    the children's CPU time while it ran. ru_maxrss is the largest peak of any child so far, so it is the peak of a
+    run only if it grew while the run was going. Both are recorded only for a run that no other monitored run
+    overlapped, and the peak only if it grew; otherwise they are left as None, as they cannot be told apart from
+    those of the other runs.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import datetime
+import threading
+import subprocess
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LOG_ENVIRONMENT_VARIABLE = 'CUSTOMEOS_PROCESS_LOG'
+DEFAULT_LOG_FILE = 'process_runs.jsonl'
+_log_lock = threading.Lock()
+_usage_lock = threading.Lock()
+_usage_runs = set()  # monitors measuring with getrusage whose runs have not finished
+
+
+class ProcessMonitor:
+    """Samples the CPU time and memory of a running process and its children
+
+    Attributes:
+        pid (int): Process ID of the monitored process
+        label (string): Short name used to group runs in the log, such as hyades or REODP
+        command (list): Program and arguments of the monitored process
+        cwd (string): Working directory of the monitored process
+        sample_interval (float): Seconds between samples
+        peak_rss (int): Largest resident memory seen, in bytes, summed over the process and its children. None if
+                        it could not be measured
+        cpu_user (float): User CPU seconds of the process and its children, None if they could not be measured
+        cpu_system (float): System CPU seconds of the process and its children, None if they could not be measured
+        n_samples (int): Number of samples taken
+
+    """
+    def __init__(self, pid, label, command, cwd=None, sample_interval=0.05) -> None:
+        self.pid = pid
+        self.label = label
+        self.command = [str(c) for c in command] if isinstance(command, (list, tuple)) else [str(command)]
+        self.cwd = os.path.abspath(cwd or os.getcwd())
+        self.sample_interval = sample_interval
+        self.peak_rss = None
+        self.cpu_user = None
+        self.cpu_system = None
+        self.n_samples = 0
+
+        self.start_date = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self._children = {}
+        try:
+            self._process = psutil.Process(pid) if psutil else None
+        except psutil.Error:
+            self._process = None
+
+        self._rusage_start = None
+        self._overlapped = False
+        if self._process is None and resource is not None:
+            with _usage_lock:
+                self._rusage_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+                for monitor in _usage_runs:  # the runs share the children's usage, none of them can claim it
+                    monitor._overlapped = True
+                self._overlapped = bool(_usage_runs)
+                _usage_runs.add(self)
+
+    def sample(self):
+        """Records the current memory and CPU time of the process and its children"""
+        if self._process is None:
+            return
+        try:
+            processes = [self._process] + self._process.children(recursive=True)
+            rss = 0
+            for process in processes:
+                memory = process.memory_info()
+                rss += getattr(memory, 'peak_wset', memory.rss)  # Windows keeps its own peak working set
+                self._children[process.pid] = process.cpu_times()
+        except psutil.Error:  # the process ended between listing and sampling
+            return
+        self.peak_rss = rss if self.peak_rss is None else max(self.peak_rss, rss)
+        self.cpu_user = sum(times.user for times in self._children.values())
+        self.cpu_system = sum(times.system for times in self._children.values())
+        self.n_samples += 1
+
+    def sample_until(self, finished):
+        """Samples every sample_interval seconds until the threading.Event finished is set"""
+        while not finished.is_set():
+            self.sample()
+            finished.wait(self.sample_interval)
+
+    async def sample_until_async(self, process):
+        """Samples every sample_interval seconds until the asyncio subprocess has exited"""
+        while process.returncode is None:
+            self.sample()
+            await asyncio.sleep(self.sample_interval)
+
+    def finish(self, returncode, timed_out=False, log_file=None):
+        """Completes the record of the run and appends it to the log
+
+        Args:
+            returncode (int): Exit status of the process, None if it never exited
+            timed_out (bool, optional): Whether the process was killed for exceeding its timeout
+            log_file (string, optional): JSON lines log to append to, defaults to $CUSTOMEOS_PROCESS_LOG
+
+        Returns:
+            record (dict): The logged record
+        """
+        wall_time = time.perf_counter() - self._start
+        if self._rusage_start is not None:
+            with _usage_lock:
+                usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+                _usage_runs.discard(self)
+            if not self._overlapped and returncode is not None:
+                self.cpu_user = usage.ru_utime - self._rusage_start.ru_utime
+                self.cpu_system = usage.ru_stime - self._rusage_start.ru_stime
+                if usage.ru_maxrss > self._rusage_start.ru_maxrss:
+                    scale = 1 if sys.platform == 'darwin' else 1024  # bytes on macOS, kilobytes on Linux
+                    self.peak_rss = usage.ru_maxrss * scale
+
+        cpu_time = None if self.cpu_user is None else self.cpu_user + self.cpu_system
+        record = {
+            'label': self.label,
+            'command': self.command,
+            'cwd': self.cwd,
+            'host': socket.gethostname(),
+            'pid': self.pid,
+            'start': self.start_date.isoformat(timespec='milliseconds'),
+            'wall_time_s': wall_time,
+            'cpu_time_s': cpu_time,
+            'cpu_user_s': self.cpu_user,
+            'cpu_system_s': self.cpu_system,
+            'peak_rss_bytes': self.peak_rss,
+            'returncode': returncode,
+            'timed_out': timed_out,
+            'n_samples': self.n_samples,
+        }
+        write_record(record, log_file)
+        return record
+
+
+def write_record(record, log_file=None):
+    """Appends a record as a single JSON line to the process log"""
+    log_file = log_file or os.environ.get(LOG_ENVIRONMENT_VARIABLE, DEFAULT_LOG_FILE)
+    line = json.dumps(record) + '\n'
+    with _log_lock:
+        with open(log_file, 'a') as f:
+            f.write(line)
+
+
+def run_monitored(command, label=None, input=None, timeout=None, log_file=None, sample_interval=0.05,
+                  **popen_kwargs):
+    """Runs an external command like subprocess.run while recording its resource usage to the process log
+
+    Args:
+        command (list or string): Program and arguments, as for subprocess.Popen
+        label (string, optional): Short name used to group runs in the log, defaults to the program name
+        input (bytes, optional): Data sent to the standard input of the command, requires stdin=subprocess.PIPE
+        timeout (float, optional): Seconds before the command is killed and subprocess.TimeoutExpired is raised
+        log_file (string, optional): JSON lines log to append to, defaults to $CUSTOMEOS_PROCESS_LOG
+        sample_interval (float, optional): Seconds between resource samples
+        **popen_kwargs: Passed on to subprocess.Popen, such as cwd, stdin, stdout or stderr
+
+    Returns:
+        completed (subprocess.CompletedProcess): Command, exit status and any captured output
+    """
+    label = label or _program_name(command)
+    process = subprocess.Popen(command, **popen_kwargs)
+    monitor = ProcessMonitor(process.pid, label, command, cwd=popen_kwargs.get('cwd'),
+                             sample_interval=sample_interval)
+    finished = threading.Event()
+    sampler = threading.Thread(target=monitor.sample_until, args=(finished,), daemon=True)
+    sampler.start()
+
+    timed_out = False
+    try:
+        stdout, stderr = process.communicate(input=input, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        process.kill()
+        process.communicate()
+        raise
+    finally:
+        finished.set()
+        sampler.join()
+        monitor.finish(process.poll(), timed_out=timed_out, log_file=log_file)
+
+    return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+
+
+async def run_monitored_async(command, label=None, timeout=None, log_file=None, sample_interval=0.05, **kwargs):
+    """Runs an external command as an asyncio subprocess while recording its resource usage to the process log
+
+    Note:
+        The process is killed if it outlives timeout, raising TimeoutError, or if the awaiting task is cancelled.
+
+    Args:
+        command (list): Program and arguments
+        label (string, optional): Short name used to group runs in the log, defaults to the program name
+        timeout (float, optional): Seconds before the command is killed
+        log_file (string, optional): JSON lines log to append to, defaults to $CUSTOMEOS_PROCESS_LOG
+        sample_interval (float, optional): Seconds between resource samples
+        **kwargs: Passed on to asyncio.create_subprocess_exec, such as cwd or stdout
+
+    Returns:
+        returncode (int): Exit status of the command
+    """
+    label = label or _program_name(command)
+    process = await asyncio.create_subprocess_exec(*command, **kwargs)
+    monitor = ProcessMonitor(process.pid, label, command, cwd=kwargs.get('cwd'), sample_interval=sample_interval)
+    sampler = asyncio.create_task(monitor.sample_until_async(process))
+
+    timed_out = False
+    try:
+        return await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+        process.kill()
+        await process.wait()
+        raise TimeoutError(f'{command[0]} in {kwargs.get("cwd") or os.getcwd()} did not finish before the timeout')
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    finally:
+        sampler.cancel()
+        monitor.finish(process.returncode, timed_out=timed_out, log_file=log_file)
+
+
+def read_process_log(log_file=None):
+    """Loads the process log and summarizes it per label, for sizing worker pools and spotting slow samples
+
+    Args:
+        log_file (string, optional): JSON lines log to read, defaults to $CUSTOMEOS_PROCESS_LOG
+
+    Returns:
+        runs (pandas.DataFrame): One row per run
+        summary (pandas.DataFrame): One row per label with run counts, failures, and wall time, CPU time and
+                                    peak memory statistics
+    """
+    import pandas as pd
+
+    log_file = log_file or os.environ.get(LOG_ENVIRONMENT_VARIABLE, DEFAULT_LOG_FILE)
+    runs = pd.read_json(log_file, lines=True)
+    runs['failed'] = (runs['returncode'] != 0) | runs['timed_out']
+    summary = runs.groupby('label').agg(runs=('wall_time_s', 'size'),
+                                        failed=('failed', 'sum'),
+                                        wall_time_mean_s=('wall_time_s', 'mean'),
+                                        wall_time_p95_s=('wall_time_s', lambda t: t.quantile(0.95)),
+                                        wall_time_max_s=('wall_time_s', 'max'),
+                                        cpu_time_mean_s=('cpu_time_s', 'mean'),
+                                        peak_rss_max_bytes=('peak_rss_bytes', 'max'))
+    return runs, summary
+
+
+def _program_name(command):
+    """Name of the program of a command given as a list, a string or bytes"""
+    program = command[0] if isinstance(command, (list, tuple)) else command
+    if isinstance(program, bytes):
+        program = program.decode('utf-8')
+    return os.path.splitext(os.path.basename(str(program).split()[0]))[0]
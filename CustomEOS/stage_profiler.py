@@ -0,0 +1,226 @@
+"""Opt-in cProfile hooks for the stages of a sampling campaign: EOS generation, hyadlibm installs and Hyades runs
+
+Profiling is off unless $CUSTOMEOS_PROFILE_DIR is set, or a profile_dir keyword argument is given to
+EosCustomizer.run_customized_hyades or EosCustomizer.run_pipelined_hyades, which sets the variable for the scripts
+UQpy launches during that call only. Every profiled call of a stage writes {stage}__{pid}_{n}.prof to that
+directory. write_report merges the files of each stage into a text report of its total time, the share spent waiting
+on external programs and its top-N hot functions:
+    python stage_profiler.py path/to/profile_dir --top_n=30
+
+Note:
+    A stage nested inside another profiled stage, such as reodp.emulate inside generate, is profiled separately. The
+    profile of the outer stage is paused while the nested stage runs, so it leaves out the functions and the time of
+    its nested stages, while its wall_time still includes them. On Python 3.12 and later only one cProfile profiler
+    can be active at a time, so a stage that starts while another thread is being profiled is only timed.
+"""
+import os
+import re
+import time
+import pstats
+import cProfile
+import contextlib
+import functools
+import itertools
+import threading
+import fire
+
+PROFILE_ENVIRONMENT_VARIABLE = 'CUSTOMEOS_PROFILE_DIR'
+REPORT_FILENAME = 'profile_report.txt'
+
+# Functions in which a stage sits idle while an external program, another thread or a queue does the work
+WAIT_FUNCTIONS = re.compile(r"waitpid|\bwait\b|communicate|select|poll|sleep|acquire|_wait_for_tstate_lock|"
+                            r"method 'join'|method 'get' of '_queue")
+
+_counter = itertools.count()
+_active = threading.local()  # stages being profiled in this thread, innermost last
+
+
+@contextlib.contextmanager
+def enable_profiling(profile_dir=None):
+    """Context manager that turns on profiling for the enclosed block and the scripts it launches
+
+    Note:
+        Sets $CUSTOMEOS_PROFILE_DIR on entry and restores its previous value, or removes it, on exit. With no
+        profile_dir the environment is left as it is.
+
+    Args:
+        profile_dir (string, optional): Directory the .prof files are written to, created if needed
+
+    Yields:
+        profile_dir (string): Absolute path of the directory, or $CUSTOMEOS_PROFILE_DIR without a profile_dir
+    """
+    if not profile_dir:
+        yield get_profile_dir()
+        return
+
+    profile_dir = os.path.abspath(profile_dir)
+    os.makedirs(profile_dir, exist_ok=True)
+    previous = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE)
+    os.environ[PROFILE_ENVIRONMENT_VARIABLE] = profile_dir
+    try:
+        yield profile_dir
+    finally:
+        if previous is None:
+            os.environ.pop(PROFILE_ENVIRONMENT_VARIABLE, None)
+        else:
+            os.environ[PROFILE_ENVIRONMENT_VARIABLE] = previous
+
+
+def get_profile_dir(profile_dir=None):
+    """The directory profiles are written to, or None when profiling is off"""
+    return profile_dir or os.environ.get(PROFILE_ENVIRONMENT_VARIABLE) or None
+
+
+class profile_stage:
+    """Context manager that profiles the enclosed block as one call of a named stage
+
+    Note:
+        Does nothing but time the block when profiling is off, so it can stay in production code.
+
+    Attributes:
+        name (string): Name of the stage, used to group its profiles in the report
+        profile_dir (string): Directory the .prof file is written to, None when profiling is off
+        filename (string): Path of the .prof file written on exit, None if the block was only timed
+        wall_time (float): Seconds spent in the block
+
+    """
+    def __init__(self, name, profile_dir=None) -> None:
+        self.name = name
+        self.profile_dir = get_profile_dir(profile_dir)
+        self.filename = None
+        self.wall_time = None
+        self._profile = None
+
+    def __enter__(self):
+        if self.profile_dir is not None:
+            stack = _stage_stack()
+            if stack:
+                stack[-1]._profile.disable()  # the outer stage resumes when this one exits
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # Python 3.12+: another thread is already being profiled
+                profile = None
+            if profile is not None:
+                self._profile = profile
+                stack.append(self)
+            elif stack:
+                _resume(stack[-1])
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time = time.perf_counter() - self._start
+        if self._profile is None:
+            return False
+
+        self._profile.disable()
+        stack = _stage_stack()
+        stack.remove(self)
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.filename = os.path.join(self.profile_dir, f'{self.name}__{os.getpid()}_{next(_counter)}.prof')
+        self._profile.dump_stats(self.filename)
+        if stack:
+            _resume(stack[-1])
+        return False
+
+
+def _stage_stack():
+    """The stages being profiled in this thread, innermost last"""
+    if not hasattr(_active, 'stages'):
+        _active.stages = []
+    return _active.stages
+
+
+def _resume(stage):
+    """Re-enables the profile of an outer stage, it stays paused if another thread took the profiler meanwhile"""
+    try:
+        stage._profile.enable()
+    except ValueError:  # Python 3.12+
+        pass
+
+
+def profiled(name):
+    """Decorator that runs every call of the function inside profile_stage(name)"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_stage_stats(profile_dir=None):
+    """Merges the .prof files of each stage
+
+    Args:
+        profile_dir (string, optional): Directory holding the .prof files, defaults to $CUSTOMEOS_PROFILE_DIR
+
+    Returns:
+        stage_stats (dict): Keys are stage names, values are (pstats.Stats, number of profiled calls)
+    """
+    profile_dir = get_profile_dir(profile_dir)
+    if profile_dir is None:
+        raise ValueError(f'No profile directory given and ${PROFILE_ENVIRONMENT_VARIABLE} is not set')
+
+    filenames = {}
+    for filename in sorted(os.listdir(profile_dir)):
+        if filename.endswith('.prof') and '__' in filename:
+            stage = filename.rsplit('__', 1)[0]
+            filenames.setdefault(stage, []).append(os.path.join(profile_dir, filename))
+
+    return {stage: (pstats.Stats(*paths), len(paths)) for stage, paths in filenames.items()}
+
+
+def split_wait_time(stats):
+    """Splits the time of a profile into time spent waiting and time spent running Python
+
+    Args:
+        stats (pstats.Stats): Merged profile of a stage
+
+    Returns:
+        total_time (float): Seconds covered by the profile
+        wait_time (float): Seconds spent inside functions that wait on external programs, threads or queues
+    """
+    wait_time = 0.0
+    for (filename, line, function), (_, _, self_time, _, _) in stats.stats.items():
+        if WAIT_FUNCTIONS.search(function):
+            wait_time += self_time
+    return stats.total_tt, wait_time
+
+
+def write_report(profile_dir=None, top_n=20, sort_by='cumulative', output=None):
+    """Writes the per-stage summary and top-N hot functions of every profiled stage
+
+    Args:
+        profile_dir (string, optional): Directory holding the .prof files, defaults to $CUSTOMEOS_PROFILE_DIR
+        top_n (int, optional): Number of functions listed per stage
+        sort_by (string, optional): pstats sort key for the listing, such as cumulative or tottime
+        output (string, optional): Text file the report is written to, defaults to profile_report.txt in
+                                   profile_dir
+
+    Returns:
+        output (string): Path of the report
+    """
+    profile_dir = get_profile_dir(profile_dir)
+    stage_stats = load_stage_stats(profile_dir)
+    output = output or os.path.join(profile_dir, REPORT_FILENAME)
+
+    with open(output, 'w') as f:
+        f.write(f'{"Stage":<30}{"Calls":>8}{"Total (s)":>12}{"Waiting (s)":>14}{"Python (s)":>12}\n')
+        for stage, (stats, n_calls) in stage_stats.items():
+            total_time, wait_time = split_wait_time(stats)
+            f.write(f'{stage:<30}{n_calls:>8}{total_time:>12.3f}{wait_time:>14.3f}{total_time - wait_time:>12.3f}\n')
+
+        for stage, (stats, n_calls) in stage_stats.items():
+            f.write(f'\n{"=" * 30} {stage}: top {top_n} functions by {sort_by} {"=" * 30}\n')
+            stats.stream = f
+            stats.sort_stats(sort_by).print_stats(top_n)
+
+    print(f'Saved: {output}')
+    return output
+
+
+if __name__ == '__main__':
+    fire.Fire(write_report)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules import each other relative to the CustomEOS folder
+CUSTOM_EOS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CUSTOM_EOS_DIR not in sys.path:
+    sys.path.insert(0, CUSTOM_EOS_DIR)
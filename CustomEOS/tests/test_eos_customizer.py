@@ -0,0 +1,54 @@
+import time
+import pytest
+from EosCustomizer import EosCustomizer
+from EosDataGenerators.EosGenerator import EosGenerator
+from HyadesRunners.HyadesRunner import HyadesRunner
+
+
+class NoFileGenerator(EosGenerator):
+    def run_once_and_generate_eos_file(self):
+        return None
+
+
+class FileGenerator(EosGenerator):
+    def run_once_and_generate_eos_file(self):
+        return 'eos.dat'
+
+
+class SleepingRunner(HyadesRunner):
+    def run_and_retrieve_output(self, index):
+        time.sleep(0.1)
+        return None, None, {}
+
+
+class UnusedRunner(HyadesRunner):
+    def run_and_retrieve_output(self, index):
+        raise AssertionError('nothing should be simulated')
+
+
+def test_generator_without_file_stops_before_install(monkeypatch):
+    installed = []
+    monkeypatch.setattr(EosCustomizer, 'add_eos_to_hyades', lambda self, filename: installed.append(filename))
+    customizer = EosCustomizer(eos_generator=NoFileGenerator(), hyades_runner=UnusedRunner(), eos_id=345)
+    summary = customizer.run_pipelined_hyades(n_runs=1, verbose=False)
+    assert [stage['Failed'] for stage in summary] == [1, 0, 0]
+    with pytest.raises(RuntimeError, match='NoFileGenerator'):
+        customizer.run_customized_hyades(n_runs=1)
+    assert installed == []
+
+
+def test_parallel_simulation_is_rejected():
+    customizer = EosCustomizer(eos_generator=NoFileGenerator(), hyades_runner=UnusedRunner(), eos_id=345)
+    with pytest.raises(ValueError, match='n_simulate_workers=2'):
+        customizer.run_pipelined_hyades(n_runs=2, n_simulate_workers=2, verbose=False)
+
+
+def test_waiting_for_the_eos_id_is_not_install_busy_time(monkeypatch):
+    monkeypatch.setattr(EosCustomizer, 'add_eos_to_hyades', lambda self, filename: None)
+    monkeypatch.setattr(EosCustomizer, 'remove_eos_from_hyades', staticmethod(lambda eos_id: None))
+    customizer = EosCustomizer(eos_generator=FileGenerator(), hyades_runner=SleepingRunner(), eos_id=345)
+    install, simulate = customizer.run_pipelined_hyades(n_runs=4, verbose=False)[1:]
+    assert install['Completed'] == simulate['Completed'] == 4
+    # Samples 2 to 4 wait about 0.1 s each for the previous simulation to free the EOS ID
+    assert simulate['Busy Time (s)'] >= 0.4
+    assert install['Busy Time (s)'] < 0.05
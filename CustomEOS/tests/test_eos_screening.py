@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from EosTablesIO.EosTable import EosTable
+from EosTablesIO.eosScreening import passes_screening, screen_eos_arrays, screen_tables
+from EosTablesIO.regridEOS import regrid_eos
+from EosDataGenerators.ReodpEosGenerator.ReodpModel import REODP_VOLUME_RANGE, ReodpModel, read_reodp_table
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'EosTablesIO', 'data')
+SESAME_TABLES = ['eos_341.dat', 'eos_Fe_182.dat', 'eos_MgO_750.dat', 'eos_Cu_112.dat']
+
+# Nominal liquid parameters of ReodpEosGenerator
+LIQUID = {'phi0': -7.5, 'B0': 51.11, 'V0': 8.596, 'Bprime': 5.848,
+          'Vb1': 3.9, 'a1': -5.0, 'b1': 5.0, 'n1': 3.0, 'Vb2': 2.7, 'a2': 10.0, 'b2': 3.0, 'n2': 3.0,
+          'Vb3': 1.9, 'a3': -40.0, 'b3': 5.0, 'n3': 2.0, 'Vb4': 1.13, 'a4': 80.0, 'b4': 5.0, 'n4': 3.0,
+          'Vp': 6.695, 'thetA': 520.0, 'AA': 0.0, 'BA': 0.84, 'thetB': 520.0, 'AB': 0.0, 'BB': 0.84,
+          'thet1': 520.0, 'A1': 0.0, 'B1': 0.84}
+
+
+def read_table(name):
+    return EosTable.from_fixed_width_hyades_eos(os.path.join(DATA_DIR, name))
+
+
+@pytest.mark.parametrize('name', SESAME_TABLES)
+def test_sesame_tables_pass_with_defaults(name):
+    summary, masks = screen_tables(read_table(name))
+    assert summary['passed'].iloc[0], summary.to_string()
+    assert not masks['compressibility'].any() and not masks['heat_capacity'].any()
+
+
+@pytest.mark.parametrize('name', ['eos_341.dat', 'eos_Fe_182.dat', 'eos_MgO_750.dat'])
+def test_tension_region_is_exempt_not_dropped(name):
+    table = read_table(name)
+    _, masks = screen_tables(table)
+    pressures = table.pressure_eos.to_numpy()
+    assert masks['expanded'][0][pressures < 0].all()
+    assert not masks['expanded'][0][:, -1].any()
+
+
+def test_negative_pressures_in_compression_are_not_exempt():
+    # The nominal liquid with a deep third breakpoint turns to tension above 11.5 g/cc and stays there
+    model = ReodpModel({**LIQUID, 'a3': -200.0})
+    densities = np.sort(model.densities_to_volumes(np.linspace(*REODP_VOLUME_RANGE, 46)))
+    temperatures = np.linspace(300.0, 20000.0, 40)
+    pressures, energies = model.evaluate_eos(densities, temperatures)
+    masks, _ = screen_eos_arrays(densities, temperatures, pressures, energies)
+    assert (pressures < 0).any()
+    assert not masks['expanded'].any()
+    assert masks['compressibility'].any()
+
+
+def test_splices_pass_with_defaults():
+    base = read_table('eos_341.dat')
+    window = regrid_eos(base, base.densities[40:70], base.temperatures[3:15])
+    assert passes_screening(base.splice(window))
+
+    reodp = read_reodp_table(os.path.join(DATA_DIR, 'REODP', 'REODP_diamond_eos.txt'))
+    assert passes_screening(base.splice(reodp))
+
+
+def test_compressed_failures_are_still_caught():
+    table = read_table('eos_341.dat')
+    pressures = table.pressure_eos.to_numpy().copy()
+    energies = table.energy_eos.to_numpy().copy()
+    pressures[10, 80] = 0.5 * pressures[10, 79]
+    energies[12, 85] = 0.5 * energies[11, 85]
+    index, columns = table.pressure_eos.index, table.pressure_eos.columns
+    corrupted = EosTable(material_name=table.material_name, info=dict(table.info),
+                         pressure_eos=pd.DataFrame(pressures, index=index, columns=columns),
+                         energy_eos=pd.DataFrame(energies, index=index, columns=columns),
+                         temperatures=table.temperatures, densities=table.densities)
+    summary, masks = screen_tables(corrupted)
+    assert not summary['passed'].iloc[0]
+    assert masks['compressibility'][0, 10, 80] and masks['heat_capacity'][0, 12, 85]
@@ -0,0 +1,51 @@
+import os
+import shutil
+import numpy as np
+import pytest
+from EosTablesIO.fixedWidthEOS import FixedWidthEosFile, patch_eos_file
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'EosTablesIO', 'data')
+BASE_TABLE = os.path.join(DATA_DIR, 'eos_341.dat')
+TEMPERATURE_RANGE = (1000, 30000)
+DENSITY_RANGE = (2.0, 6.0)
+
+
+def read_bytes(filename):
+    with open(filename, 'rb') as f:
+        return f.read()
+
+
+def test_patch_window_writes_both_fields(tmp_path):
+    filename = patch_eos_file(BASE_TABLE, str(tmp_path / 'patched.dat'), TEMPERATURE_RANGE, DENSITY_RANGE,
+                              pressures=lambda p: 2 * p, energies=lambda e: e + 1e9, reflink=False)
+    with FixedWidthEosFile(BASE_TABLE) as base, FixedWidthEosFile(filename) as patched:
+        _, _, base_pressures, base_energies = base.read_window(TEMPERATURE_RANGE, DENSITY_RANGE)
+        _, _, pressures, energies = patched.read_window(TEMPERATURE_RANGE, DENSITY_RANGE)
+    np.testing.assert_allclose(pressures.to_numpy(), 2 * base_pressures.to_numpy(), rtol=1e-7)
+    np.testing.assert_allclose(energies.to_numpy(), base_energies.to_numpy() + 1e9, rtol=1e-7)
+
+
+@pytest.mark.parametrize('bad_energies', ['shape', 'nan'])
+def test_failed_patch_leaves_file_untouched(tmp_path, bad_energies):
+    filename = str(tmp_path / 'table.dat')
+    shutil.copyfile(BASE_TABLE, filename)
+    original = read_bytes(filename)
+    with FixedWidthEosFile(filename, writable=True) as table:
+        _, _, pressures, energies = table.read_window(TEMPERATURE_RANGE, DENSITY_RANGE)
+        energies = energies.to_numpy().copy()
+        if bad_energies == 'shape':
+            energies = energies[:, :-1]
+        else:
+            energies[-1, -1] = np.nan  # the last cell written
+        with pytest.raises(ValueError):
+            table.patch_window(TEMPERATURE_RANGE, DENSITY_RANGE, pressures=2 * pressures.to_numpy(),
+                               energies=energies)
+    assert read_bytes(filename) == original
+
+
+def test_failed_patch_eos_file_leaves_no_copy(tmp_path):
+    filename = str(tmp_path / 'patched.dat')
+    with pytest.raises(ValueError):
+        patch_eos_file(BASE_TABLE, filename, TEMPERATURE_RANGE, DENSITY_RANGE, pressures=np.zeros((1, 1)),
+                       reflink=False)
+    assert not os.path.exists(filename)
@@ -0,0 +1,48 @@
+import queue
+import numpy as np
+import pytest
+from EosCustomizer import EosCustomizer
+from HyadesRunners.HyadesRunner import HyadesRunner
+from HyadesRunners.OutputAggregator import OutputAggregator
+
+
+class LinearFieldRunner(HyadesRunner):
+    """Runs whose outputs are linear in time and initial position, each on its own dump times and mesh"""
+    def __init__(self, grids):
+        self.grids = grids
+
+    def run_and_retrieve_output(self, index):
+        n_dumps, n_mesh = self.grids[index]
+        time = np.linspace(0.0, 10.0, n_dumps)
+        mesh = np.linspace(0.0, 50.0, n_mesh)
+        zones = (mesh[1:] + mesh[:-1]) / 2
+        rho = (1.0 + index) * (2.0 + 0.1 * time[:, np.newaxis] + 0.01 * zones[np.newaxis, :])
+        u = (1.0 + index) * (0.5 * time[:, np.newaxis] - 0.02 * mesh[np.newaxis, :])
+        return time, mesh, (rho, u)
+
+
+def test_runs_on_different_dumps_and_meshes_are_resampled(monkeypatch):
+    monkeypatch.setattr(EosCustomizer, 'remove_eos_from_hyades', staticmethod(lambda eos_id: None))
+    grids = [(21, 41), (33, 41), (21, 61), (17, 26)]
+    aggregator = OutputAggregator(variables=('Rho', 'U'))
+    customizer = EosCustomizer(eos_generator=None, hyades_runner=LinearFieldRunner(grids), eos_id=345,
+                               output_aggregator=aggregator)
+    customizer._free_eos_ids = queue.Queue()
+    for index in range(len(grids)):
+        assert customizer._simulate_stage(index, 345) is None
+
+    time, mesh, (rho, u) = LinearFieldRunner(grids).run_and_retrieve_output(0)
+    scale = np.mean([1.0 + index for index in range(len(grids))])
+    np.testing.assert_allclose(aggregator.time, time)
+    np.testing.assert_allclose(aggregator.mesh, mesh)
+    # Coarser meshes have their end zone centres inside those of the first run, where the end values are held
+    np.testing.assert_allclose(aggregator.mean['Rho'][:, 1:-1], scale * rho[:, 1:-1], rtol=1e-12)
+    np.testing.assert_allclose(aggregator.mean['U'], scale * u, rtol=1e-12, atol=1e-12)
+    assert aggregator.n_runs == len(grids) and customizer.custom_hyades_output == []
+
+
+def test_columns_matching_neither_mesh_nor_zones_are_rejected():
+    aggregator = OutputAggregator(variables=('Rho',))
+    aggregator.add((np.ones((3, 4)),), time=np.arange(3.0), mesh=np.arange(5.0))
+    with pytest.raises(ValueError, match='columns'):
+        aggregator.add((np.ones((3, 4)),), time=np.arange(3.0), mesh=np.arange(7.0))
@@ -0,0 +1,46 @@
+import sys
+import json
+import asyncio
+import pytest
+import process_monitor
+from process_monitor import run_monitored, run_monitored_async
+
+pytestmark = pytest.mark.skipif(process_monitor.psutil is not None or process_monitor.resource is None,
+                                reason='tests the getrusage fallback used without psutil on POSIX')
+
+
+def allocate(megabytes):
+    return [sys.executable, '-c', f'x = bytearray({megabytes} * 2 ** 20); sum(range(10 ** 6))']
+
+
+def last_record(log_file):
+    with open(log_file) as f:
+        return json.loads(f.readlines()[-1])
+
+
+def test_peak_is_only_recorded_when_it_is_the_run_own(tmp_path):
+    log_file = str(tmp_path / 'runs.jsonl')
+    run_monitored(allocate(300), log_file=log_file)
+    large = last_record(log_file)
+    assert large['peak_rss_bytes'] >= 300 * 2 ** 20
+    assert large['cpu_time_s'] is not None and large['cpu_time_s'] > 0
+
+    run_monitored(allocate(1), log_file=log_file)
+    small = last_record(log_file)
+    assert small['peak_rss_bytes'] is None  # the lifetime maximum still belongs to the earlier run
+    assert small['cpu_time_s'] is not None
+
+
+def test_overlapping_runs_are_not_measured(tmp_path):
+    log_file = str(tmp_path / 'runs.jsonl')
+
+    async def run_two():
+        return await asyncio.gather(run_monitored_async(allocate(400), log_file=log_file),
+                                    run_monitored_async(allocate(1), log_file=log_file))
+
+    assert asyncio.run(run_two()) == [0, 0]
+    with open(log_file) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 2
+    assert all(record['peak_rss_bytes'] is None and record['cpu_time_s'] is None for record in records)
+    assert not process_monitor._usage_runs
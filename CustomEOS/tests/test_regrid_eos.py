@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import pytest
+from EosTablesIO.EosTable import EosTable
+from EosTablesIO.regridEOS import (adaptive_grid, adaptive_regrid_eos, data_length, hyades_grid, interpolation_error,
+                                   regrid_eos)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'EosTablesIO', 'data')
+ZERO_DENSITY_TABLES = ['eos_Fe_182.dat', 'eos_MgO_750.dat']  # both have a 0 g/cc column and a 0 K row
+
+
+def read_table(name):
+    return EosTable.from_fixed_width_hyades_eos(os.path.join(DATA_DIR, name))
+
+
+@pytest.mark.parametrize('name', ZERO_DENSITY_TABLES)
+def test_regrid_onto_own_grid_keeps_zero_density_column(name):
+    table = read_table(name)
+    assert table.densities[0] == 0
+    regridded = regrid_eos(table, table.densities, table.temperatures)
+    np.testing.assert_allclose(regridded.pressure_eos.to_numpy(), table.pressure_eos.to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(regridded.energy_eos.to_numpy(), table.energy_eos.to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('name', ZERO_DENSITY_TABLES)
+def test_regrid_onto_hyades_grid_is_finite(name):
+    table = read_table(name)
+    regridded = regrid_eos(table, max_data_length=4000)
+    assert regridded.densities[0] == 0
+    assert np.isfinite(regridded.pressure_eos.to_numpy()).all()
+    assert np.isfinite(regridded.energy_eos.to_numpy()).all()
+
+
+@pytest.mark.parametrize('name', ZERO_DENSITY_TABLES)
+def test_adaptive_grid_and_splice_with_zero_density_column(name):
+    table = read_table(name)
+    densities, temperatures = adaptive_grid(table, n_densities=30, n_temperatures=20)
+    assert densities[0] == 0 and temperatures[0] == 0
+    assert np.isfinite(adaptive_regrid_eos(table, n_densities=30, n_temperatures=20).pressure_eos.to_numpy()).all()
+
+    window = regrid_eos(table, table.densities[20:60], table.temperatures[5:40])
+    spliced = table.splice(window)
+    assert np.isfinite(spliced.pressure_eos.to_numpy()).all()
+    np.testing.assert_array_equal(spliced.pressure_eos.to_numpy()[:, 0], table.pressure_eos.to_numpy()[:, 0])
+
+
+@pytest.mark.parametrize('name, n_densities, n_temperatures', [
+    ('eos_341.dat', 46, 12), ('eos_341.dat', 31, 8), ('eos_Fe_182.dat', 31, 8), ('eos_MgO_750.dat', 31, 8),
+    ('eos_Cu_112.dat', 20, 10)])
+def test_adaptive_grid_beats_uniform_grid(name, n_densities, n_temperatures):
+    table = read_table(name)
+    densities, temperatures = adaptive_grid(table, n_densities, n_temperatures)
+    assert data_length(len(densities), len(temperatures)) <= data_length(n_densities, n_temperatures)
+
+    adaptive = interpolation_error(table, regrid_eos(table, densities, temperatures))
+    uniform = interpolation_error(table, regrid_eos(table, *hyades_grid(table, n_densities, n_temperatures)))
+    assert max(adaptive['max_P'], adaptive['max_E']) < 0.5 * max(uniform['max_P'], uniform['max_E'])
+    assert adaptive['rms_P'] + adaptive['rms_E'] < uniform['rms_P'] + uniform['rms_E']
+
+
+def test_adaptive_grid_bounds_largest_error_on_large_budget():
+    # With 60 x 20 the uniform grid already resolves the smooth regions, the adaptive grid trades some RMS pressure
+    # error there for a several times smaller largest error
+    table = read_table('eos_341.dat')
+    adaptive = interpolation_error(table, adaptive_regrid_eos(table, n_densities=60, n_temperatures=20))
+    uniform = interpolation_error(table, regrid_eos(table, *hyades_grid(table, 60, 20)))
+    assert max(adaptive['max_P'], adaptive['max_E']) < 0.5 * max(uniform['max_P'], uniform['max_E'])
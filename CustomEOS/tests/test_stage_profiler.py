@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import pstats
+import pytest
+from stage_profiler import PROFILE_ENVIRONMENT_VARIABLE, enable_profiling, profile_stage
+
+CUSTOM_EOS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def inner_work():
+    return sum(i * i for i in range(20000))
+
+
+def outer_work():
+    return sorted(range(20000), key=lambda i: -i)
+
+
+def profiled_functions(filename):
+    return {function for _, _, function in pstats.Stats(filename).stats}
+
+
+def test_nested_stage_is_profiled_separately(tmp_path):
+    with profile_stage('outer', profile_dir=str(tmp_path)) as outer:
+        outer_work()
+        with profile_stage('inner', profile_dir=str(tmp_path)) as inner:
+            inner_work()
+        outer_work()
+
+    assert inner.filename is not None and outer.filename is not None
+    assert 'inner_work' in profiled_functions(inner.filename)
+    assert 'inner_work' not in profiled_functions(outer.filename)
+    assert 'outer_work' in profiled_functions(outer.filename)
+    assert outer.wall_time >= inner.wall_time
+
+
+def test_enable_profiling_restores_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv(PROFILE_ENVIRONMENT_VARIABLE, raising=False)
+    with enable_profiling(str(tmp_path / 'a')) as profile_dir:
+        assert os.environ[PROFILE_ENVIRONMENT_VARIABLE] == profile_dir
+        with enable_profiling(str(tmp_path / 'b')):
+            assert os.environ[PROFILE_ENVIRONMENT_VARIABLE] == str(tmp_path / 'b')
+        assert os.environ[PROFILE_ENVIRONMENT_VARIABLE] == profile_dir
+    assert PROFILE_ENVIRONMENT_VARIABLE not in os.environ
+
+    with pytest.raises(RuntimeError):
+        with enable_profiling(str(tmp_path / 'c')):
+            raise RuntimeError
+    assert PROFILE_ENVIRONMENT_VARIABLE not in os.environ
+
+
+def test_hyades_runner_imports_from_its_own_folder(tmp_path):
+    # UQpy launches the script with only its own folder on the path, so its imports fall back on the CustomEOS folder
+    script_dir = os.path.join(CUSTOM_EOS_DIR, 'HyadesRunners', 'StrengthRunner')
+    environment = {key: value for key, value in os.environ.items() if key != 'PYTHONPATH'}
+    completed = subprocess.run([sys.executable, '-c', 'import hyades_runner; print(hyades_runner.hyades_run.__name__)'],
+                               cwd=str(tmp_path), env={**environment, 'PYTHONPATH': script_dir},
+                               capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == 'hyades_run'